@@ -0,0 +1,420 @@
+# 
+#
+# Copyright and User License
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Copyright 2006-2019 CERN and INFN
+# 
+#
+# Please consult the LICENSE file for the license 
+#
+# DISCLAIMER
+# ~~~~~~~~~~
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT
+# NOT LIMITED TO, IMPLIED WARRANTIES OF MERCHANTABILITY, OF
+# SATISFACTORY QUALITY, AND FITNESS FOR A PARTICULAR PURPOSE
+# OR USE ARE DISCLAIMED. THE COPYRIGHT HOLDERS AND THE
+# AUTHORS MAKE NO REPRESENTATION THAT THE SOFTWARE AND
+# MODIFICATIONS THEREOF, WILL NOT INFRINGE ANY PATENT,
+# COPYRIGHT, TRADE SECRET OR OTHER PROPRIETARY RIGHT.
+#
+# LIMITATION OF LIABILITY
+# ~~~~~~~~~~~~~~~~~~~~~~~
+# THE COPYRIGHT HOLDERS AND THE AUTHORS SHALL HAVE NO
+# LIABILITY FOR DIRECT, INDIRECT, SPECIAL, INCIDENTAL,
+# CONSEQUENTIAL, EXEMPLARY, OR PUNITIVE DAMAGES OF ANY
+# CHARACTER INCLUDING, WITHOUT LIMITATION, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES, LOSS OF USE, DATA OR PROFITS,
+# OR BUSINESS INTERRUPTION, HOWEVER CAUSED AND ON ANY THEORY
+# OF CONTRACT, WARRANTY, TORT (INCLUDING NEGLIGENCE), PRODUCT
+# LIABILITY OR OTHERWISE, ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGES.
+#
+# Date:	18-Oct-2026
+
+__author__ = "Vasilis Vlachoudis"
+__email__  = "Paola.Sala@mi.infn.it"
+
+import os
+import sys
+import json
+import time
+import getopt
+import traceback
+from fnmatch import fnmatch
+from concurrent.futures import ProcessPoolExecutor
+
+import log
+import Project
+import Scheduler
+
+# Exit codes
+RC_OK    = 0	# everything completed
+RC_ERROR = 1	# command completed with errors
+RC_FATAL = 2	# wrong arguments or project cannot be loaded
+
+COMMANDS = ("validate", "write", "run", "merge", "plot", "status")
+
+#-------------------------------------------------------------------------------
+# show short help
+#-------------------------------------------------------------------------------
+def usage(rc=0):
+	sys.stdout.write("\n")
+	sys.stdout.write("Usage: flair batch <command> [options] project [project ...]\n")
+	sys.stdout.write("\n")
+	sys.stdout.write("Headless execution without the graphical interface\n")
+	sys.stdout.write("\n")
+	sys.stdout.write("Commands:\n")
+	sys.stdout.write("\tvalidate\tValidate the input for the selected runs\n")
+	sys.stdout.write("\twrite\t\tWrite the input files of the selected runs\n")
+	sys.stdout.write("\trun\t\tWrite the input files and start the selected runs\n")
+	sys.stdout.write("\tmerge\t\tMerge the USRxxx data of the selected runs\n")
+	sys.stdout.write("\tplot\t\tGenerate the selected plots with gnuplot\n")
+	sys.stdout.write("\tstatus\t\tProgress, speed and ETA of the selected runs\n")
+	sys.stdout.write("\n")
+	sys.stdout.write("Options:\n")
+	sys.stdout.write("\t-r | --run pattern\tSelect runs matching the pattern (default all)\n")
+	sys.stdout.write("\t-p | --plot pattern\tSelect plots matching the pattern (default all)\n")
+	sys.stdout.write("\t-f | --format ext\tPlot file format (default png)\n")
+	sys.stdout.write("\t-t | --timing\t\tReport the time spent on every validation rule\n")
+	sys.stdout.write("\t-w | --wait\t\tWait for the started runs to finish\n")
+	sys.stdout.write("\t-j | --jobs #\t\tNumber of projects processed concurrently\n")
+	sys.stdout.write("\t-o | --output file\tWrite the JSON summary to file (default stdout)\n")
+	sys.stdout.write("\n")
+	sys.stdout.write("Exit code: %d success, %d errors in a command, %d fatal error\n" \
+			% (RC_OK, RC_ERROR, RC_FATAL))
+	return rc
+
+#===============================================================================
+# Batch command on a single project
+#===============================================================================
+class Batch:
+	def __init__(self, filename, options):
+		self.filename = filename
+		self.options  = options
+		self.project  = Project.Project()
+		self.summary  = {"project" : os.path.abspath(filename),
+				 "rc"      : RC_OK }
+
+	# ----------------------------------------------------------------------
+	def log(self, s):
+		sys.stderr.write("[%s] %s\n"%(os.path.basename(self.filename), s))
+
+	# ----------------------------------------------------------------------
+	# Load project or input file
+	# ----------------------------------------------------------------------
+	def load(self):
+		name, ext = os.path.splitext(self.filename)
+		if ext in (".inp", ".fluka"):
+			self.project.loadInput(self.filename)
+		else:
+			if ext == "": self.filename = name+".flair"
+			self.project.load(self.filename)
+
+	# ----------------------------------------------------------------------
+	# Execute command and return summary
+	# ----------------------------------------------------------------------
+	def execute(self, command):
+		self.summary["command"] = command
+		start = time.time()
+		log.set(self.log)
+		try:
+			self.load()
+		except (IOError, OSError):
+			self.error(RC_FATAL, "Cannot load project: %s"%(sys.exc_info()[1]))
+		else:
+			try:
+				getattr(self, command)()
+			except Exception:
+				self.log(traceback.format_exc())
+				self.error(RC_FATAL, "%s: %s"%(command, sys.exc_info()[1]))
+		self.summary["time"] = time.time() - start
+		return self.summary
+
+	# ----------------------------------------------------------------------
+	def error(self, rc, msg):
+		self.log("Error: %s"%(msg))
+		self.summary.setdefault("messages",[]).append(msg)
+		self.summary["rc"] = max(self.summary["rc"], rc)
+
+	# ----------------------------------------------------------------------
+	# Return selected runs, by default all but the default input if
+	# other runs exist
+	# @param expand	replace runs with a family by their children
+	# ----------------------------------------------------------------------
+	def runs(self, expand=False):
+		patterns = self.options.get("runs")
+		if patterns:
+			runs = [r for r in self.project.runs
+				if any(fnmatch(r.name,p) for p in patterns)]
+		elif len(self.project.runs) > 1:
+			runs = [r for r in self.project.runs[1:] if r.parent == ""]
+		else:
+			runs = self.project.runs[:]
+		if not expand: return runs
+
+		expanded = []
+		for run in runs:
+			if run.family:
+				for child in run.family:
+					r = self.project.getRunByName(child, run.name)
+					if r is not None and r not in expanded:
+						expanded.append(r)
+			elif run not in expanded:
+				expanded.append(run)
+		return expanded
+
+	# ----------------------------------------------------------------------
+	@staticmethod
+	def cardErrors(errors):
+		lst = []
+		for card, msg in errors:
+			if card is None:
+				lst.append({"message" : str(msg)})
+			else:
+				lst.append({"card"    : card.tag,
+					    "name"    : str(card.sdum()),
+					    "pos"     : card.pos(),
+					    "message" : str(msg)})
+		return lst
+
+	# ----------------------------------------------------------------------
+	# Validate input for every selected run
+	# ----------------------------------------------------------------------
+	def validate(self):
+		import Validate
+		result = []
+		for run in self.runs():
+			validate = Validate.Validate(self.project, self.log)
+			validate.timing = self.options.get("timing", False)
+			if run.name == Project.DEFAULT_INPUT:
+				validate.check()
+			else:
+				validate.check(run)
+			result.append({	"run"      : run.name,
+					"errors"   : self.cardErrors(validate.errors),
+					"warnings" : self.cardErrors(validate.warnings)})
+			if validate.timer is not None:
+				result[-1]["time"] = validate.timer.total()
+			if validate.errors:
+				self.error(RC_ERROR, "Run %s: %d errors" \
+					% (run.name, len(validate.errors)))
+		self.summary["runs"] = result
+
+	# ----------------------------------------------------------------------
+	# Write input files of selected runs
+	# ----------------------------------------------------------------------
+	def write(self):
+		runs = self.runs(True)
+		if self.project.inputName == "":
+			self.error(RC_FATAL, "Input file not defined")
+			return
+		errors = self.project.writeInputs(runs)
+		result = []
+		for run, err in zip(runs, errors):
+			# the project input file (err is None) is never rewritten
+			result.append({	"run"    : run.name,
+					"input"  : os.path.join(run.getDir(),
+							run.getInputBaseName()+".inp"),
+					"written": err is not None,
+					"errors" : self.cardErrors(err or [])})
+			if err:
+				self.error(RC_ERROR, "Run %s: %d errors writing input" \
+					% (run.name, len(err)))
+		self.summary["runs"] = result
+		return runs, errors
+
+	# ----------------------------------------------------------------------
+	# Write inputs and start runs
+	# ----------------------------------------------------------------------
+	def run(self):
+		written = self.write()
+		if written is None: return
+		result = self.summary["runs"]
+		started = []
+		with Scheduler.transaction(self.project.submit):
+			for info, run, err in zip(result, *written):
+				if run.status in (Project.STATUS_WAIT2ATTACH, Project.STATUS_RUNNING):
+					info["status"] = "running"
+					continue
+				if run.status == Project.STATUS_QUEUED:
+					info["status"] = "queued"
+					continue
+				try:
+					run.start(log=self.log, errors=err)
+				except (Project.RunException, OSError, IOError):
+					info["status"] = "error"
+					self.error(RC_ERROR, "Run %s: %s"%(run.name, sys.exc_info()[1]))
+				else:
+					if run.status == Project.STATUS_QUEUED:
+						info["status"] = "queued"
+						info["job"]    = run.job
+					else:
+						info["status"] = "started"
+					started.append((info, run))
+
+		if not self.options.get("wait"): return
+		for info, run in started:
+			rc = run.wait()
+			info["exitcode"] = rc
+			info["status"]   = "finished"
+			if rc:
+				self.error(RC_ERROR, "Run %s: exit code %s"%(run.name, rc))
+
+	# ----------------------------------------------------------------------
+	# Report the progress of the runs, stalled or straggling runs are errors
+	# ----------------------------------------------------------------------
+	def status(self):
+		import RunAnalytics
+		runs = self.runs()
+		analytics = RunAnalytics.Analytics(self.project)
+		analytics.update(runs)
+		analytics.write(lambda s: self.log(s.rstrip()), runs)
+		self.summary["runs"] = analytics.report(runs)
+		for run in analytics.suspicious():
+			self.error(RC_ERROR, "Run %s: %s"%(run.name,
+					analytics.stats(run).state))
+
+	# ----------------------------------------------------------------------
+	# Merge USRxxx data
+	# ----------------------------------------------------------------------
+	def merge(self):
+		import DataProcess
+		usr = []
+		for run in self.runs():
+			if not run.usrinfo:
+				self.project.findRunUsrInfo(run)
+			usr.extend(run.usrinfo)
+
+		process = DataProcess.DataProcess(self.project)
+		process.setUsr(usr)
+		rc = process.execute()
+		out = process.output().strip()
+		if out: self.log(out)
+
+		self.summary["files"] = [u.name() for u in usr]
+		self.summary["message"] = " ".join(map(str, process.message))
+		if rc:
+			self.error(RC_ERROR, self.summary["message"])
+
+	# ----------------------------------------------------------------------
+	# Generate plots with gnuplot
+	# The GPPlot module imports tkinter but no window is ever created,
+	# therefore no display is needed
+	# ----------------------------------------------------------------------
+	def plot(self):
+		import Gnuplot
+		import GPPlot
+		patterns = self.options.get("plots")
+		plots = [p for p in self.project.plots
+				if not patterns or any(fnmatch(p.name,x) for x in patterns)]
+		if not plots:
+			self.error(RC_ERROR, "No plots selected")
+			return
+
+		try:
+			engine = GPPlot.start()
+		except (OSError, IOError):
+			engine = None
+		if engine is None:
+			self.error(RC_FATAL, "Cannot start gnuplot")
+			return
+		# Never open a plot window
+		Gnuplot.defaultTerminal = ""
+		engine("set terminal unknown")
+
+		ext = "."+self.options.get("format","png").lstrip(".")
+		result = []
+		for plot in plots:
+			plotter = GPPlot.GPPlot(engine, self.project, plot, self.log)
+			err = plotter.show()
+			if err:
+				if isinstance(err, tuple): err = err[0]
+				result.append({"plot": plot.name, "error": str(err)})
+				self.error(RC_ERROR, "Plot %s: %s"%(plot.name, err))
+			else:
+				filename = plotter.save(ext)
+				result.append({"plot": plot.name,
+					       "file": os.path.abspath(filename)})
+		engine.close()
+		self.summary["plots"] = result
+
+#-------------------------------------------------------------------------------
+# Execute command on a project, run also in the worker processes
+#-------------------------------------------------------------------------------
+def execute(command, filename, options):
+	return Batch(filename, options).execute(command)
+
+#-------------------------------------------------------------------------------
+# Main entry point
+# @return exit code
+#-------------------------------------------------------------------------------
+def main(arglist):
+	if not arglist or arglist[0] in ("-h", "-?", "--help"):
+		return usage(RC_OK)
+	command = arglist[0]
+	if command not in COMMANDS:
+		sys.stderr.write("Error: unknown command \"%s\"\n"%(command))
+		return usage(RC_FATAL)
+
+	try:
+		optlist, args = getopt.getopt(arglist[1:],
+			"?hr:p:f:twj:o:",
+			["help", "run=", "plot=", "format=", "timing", "wait", "jobs=", "output="])
+	except getopt.GetoptError:
+		sys.stderr.write("Error: %s\n"%(sys.exc_info()[1]))
+		return usage(RC_FATAL)
+
+	options = {}
+	jobs    = 1
+	output  = None
+	for opt, val in optlist:
+		if opt in ("-h", "-?", "--help"):
+			return usage(RC_OK)
+		elif opt in ("-r", "--run"):
+			options.setdefault("runs",[]).append(val)
+		elif opt in ("-p", "--plot"):
+			options.setdefault("plots",[]).append(val)
+		elif opt in ("-f", "--format"):
+			options["format"] = val
+		elif opt in ("-t", "--timing"):
+			options["timing"] = True
+		elif opt in ("-w", "--wait"):
+			options["wait"] = True
+		elif opt in ("-j", "--jobs"):
+			try:
+				jobs = max(1, int(val))
+			except ValueError:
+				return usage(RC_FATAL)
+		elif opt in ("-o", "--output"):
+			output = os.path.abspath(val)
+
+	if not args:
+		sys.stderr.write("Error: no project specified\n")
+		return usage(RC_FATAL)
+	args = [os.path.abspath(x) for x in args]
+
+	# Every project runs in its own process, projects change the
+	# working directory and the module settings
+	jobs = min(jobs, len(args))
+	if jobs > 1:
+		with ProcessPoolExecutor(jobs) as pool:
+			summaries = list(pool.map(execute,
+					[command]*len(args), args, [options]*len(args)))
+	else:
+		summaries = [execute(command, fn, options) for fn in args]
+
+	rc = max([s["rc"] for s in summaries])
+	summary = {"command" : command, "rc" : rc, "projects" : summaries}
+	if output is None:
+		json.dump(summary, sys.stdout, indent=1)
+		sys.stdout.write("\n")
+	else:
+		with open(output, "w") as f:
+			json.dump(summary, f, indent=1)
+	return rc
+
+#-------------------------------------------------------------------------------
+if __name__ == "__main__":
+	sys.exit(main(sys.argv[1:]))
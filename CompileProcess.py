@@ -38,21 +38,203 @@ __email__   = "Vasilis.Vlachoudis@cern.ch"
 __version__ = "1"
 
 import os
+import re
 import sys
+import json
 import time
+import shutil
 import string
+import hashlib
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
 from bFileDialog import _TIME_FORMAT
 
 import Project
 import Process
+import Scheduler
 import FlairProcess
 
+cacheDir = os.path.join(os.path.expanduser("~/.flair"), "objcache")
+
+_INCLUDE = re.compile(r"^[ \t]*#?[ \t]*include[ \t]*[\"'<]([^\"'>]+)[\"'>]",
+			re.IGNORECASE | re.MULTILINE)
+
+#===============================================================================
+# Scan the Fortran INCLUDE and C #include dependencies of the sources
+#===============================================================================
+class IncludeScanner:
+	def __init__(self):
+		self.path = []
+		if Project.flukaDir:
+			self.path.append(os.path.join(Project.flukaDir, "flukapro"))
+			self.path.append(Project.flukaDir)
+		self._deps = {}		# filename: direct includes
+
+	# ----------------------------------------------------------------------
+	# @return the filename of an include or None if not found
+	# ----------------------------------------------------------------------
+	def find(self, name, source):
+		names = [name]
+		if name.startswith("(") and name.endswith(")"):
+			names.append(name[1:-1]+".add")	# fluka (NAME) includes
+		for d in [os.path.dirname(source) or ".", "."] + self.path:
+			for n in names:
+				fn = os.path.normpath(os.path.join(d, n))
+				if os.path.isfile(fn): return fn
+		return None
+
+	# ----------------------------------------------------------------------
+	def _direct(self, filename):
+		deps = self._deps.get(filename)
+		if deps is not None: return deps
+		try:
+			with open(filename, "r", errors="ignore") as f:
+				text = f.read()
+		except (OSError, IOError):
+			text = ""
+		deps = []
+		for name in _INCLUDE.findall(text):
+			fn = self.find(name.strip(), filename)
+			if fn is not None and fn not in deps:
+				deps.append(fn)
+		self._deps[filename] = deps
+		return deps
+
+	# ----------------------------------------------------------------------
+	# @return sorted list of all files included recursively by filename
+	# ----------------------------------------------------------------------
+	def scan(self, filename):
+		found = set()
+		stack = [filename]
+		while stack:
+			for fn in self._direct(stack.pop()):
+				if fn not in found:
+					found.add(fn)
+					stack.append(fn)
+		found.discard(filename)
+		return sorted(found)
+
+#===============================================================================
+# Object cache addressed by the hash of the source, its includes and the
+# compile command. A manifest remembers which key produced every object.
+#===============================================================================
+class ObjectCache:
+	def __init__(self, directory=None):
+		self.dir      = directory or cacheDir
+		self.manifest = {}
+		self._modified = False
+		try:
+			with open(os.path.join(self.dir, "manifest.json"), "r") as f:
+				self.manifest = json.load(f)
+		except (OSError, IOError, ValueError):
+			pass
+
+	# ----------------------------------------------------------------------
+	# @return content hash of source for the compile command
+	# ----------------------------------------------------------------------
+	def key(self, source, cmd, deps):
+		h = hashlib.sha1()
+		# the command without the source name and the compiler version
+		for arg in cmd:
+			if arg != source: h.update(arg.encode()+b"\0")
+		try:
+			s = os.stat(cmd[0])
+			h.update(("%d %d"%(s.st_size, s.st_mtime_ns)).encode())
+		except OSError:
+			pass
+		for fn in [source] + deps:
+			h.update(b"\0")
+			if fn != source: h.update(os.path.basename(fn).encode())
+			try:
+				with open(fn, "rb") as f:
+					h.update(f.read())
+			except (OSError, IOError):
+				pass
+		return h.hexdigest()
+
+	# ----------------------------------------------------------------------
+	def _path(self, key):
+		return os.path.join(self.dir, key[:2], key+".o")
+
+	# ----------------------------------------------------------------------
+	@staticmethod
+	def _stamp(obj):
+		try:
+			s = os.stat(obj)
+		except OSError:
+			return None
+		return [s.st_size, s.st_mtime_ns]
+
+	# ----------------------------------------------------------------------
+	# Make the object of key available
+	# @return True if the object is up to date
+	# ----------------------------------------------------------------------
+	def restore(self, obj, key, files):
+		name  = os.path.abspath(obj)
+		entry = self.manifest.get(name)
+		stamp = self._stamp(obj)
+		if entry is not None and stamp is not None and entry == [key]+stamp:
+			return True
+
+		if entry is None and stamp is not None:
+			# object from a previous build, accept it if newer
+			try:
+				newest = max(os.stat(fn).st_mtime_ns for fn in files)
+			except OSError:
+				newest = None
+			if newest is not None and stamp[1] > newest:
+				self.store(obj, key)
+				return True
+
+		cached = self._path(key)
+		if not os.path.isfile(cached): return False
+		try:
+			shutil.copyfile(cached, obj)
+		except (OSError, IOError):
+			return False
+		self.manifest[name] = [key] + self._stamp(obj)
+		self._modified = True
+		return True
+
+	# ----------------------------------------------------------------------
+	# Store a freshly compiled object
+	# ----------------------------------------------------------------------
+	def store(self, obj, key):
+		stamp = self._stamp(obj)
+		if stamp is None: return
+		cached = self._path(key)
+		try:
+			os.makedirs(os.path.dirname(cached), exist_ok=True)
+			tmp = "%s.%d"%(cached, os.getpid())
+			shutil.copyfile(obj, tmp)
+			os.replace(tmp, cached)
+		except (OSError, IOError):
+			pass
+		self.manifest[os.path.abspath(obj)] = [key] + stamp
+		self._modified = True
+
+	# ----------------------------------------------------------------------
+	def save(self):
+		if not self._modified: return
+		fn  = os.path.join(self.dir, "manifest.json")
+		tmp = "%s.%d"%(fn, os.getpid())
+		try:
+			os.makedirs(self.dir, exist_ok=True)
+			with open(tmp, "w") as f:
+				json.dump(self.manifest, f)
+			os.replace(tmp, fn)
+		except (OSError, IOError):
+			return
+		self._modified = False
+
 #===============================================================================
 # Compile FLUKA project process
 #===============================================================================
 class CompileProcess(FlairProcess.FlairProcess):
+	_prefix = []		# nice/affinity command of the compiler processes
+	_slots  = 0		# maximum parallel compilations, 0=no limit
+
 	#----------------------------------------------------------------------
 	# Cleaning files in synchronous way
 	# @return rc (and output filled)
@@ -115,79 +297,162 @@ class CompileProcess(FlairProcess.FlairProcess):
 		return rc
 
 	#----------------------------------------------------------------------
-	# Compile executable
+	# Compile executable, sharing the slots of the local scheduler
+	# when the runs are submitted to it
 	#----------------------------------------------------------------------
 	def _execute(self):
-		# compile all sources that need compilation
-		try: exe_time = os.stat(self.project.exe).st_mtime
-		except: exe_time = 0
+		if self.project.submit != Scheduler.QUEUE:
+			return self._build()
 
-		libfluka = os.path.join(Project.flukaDir,Project.DEFAULT_LIB)
+		self.message = ("Queued", "Waiting for a free scheduler slot")
+		scheduler = Scheduler.scheduler()
+		job = scheduler.acquire("compile %s"%(self.project.exe),
+				killed=self.isKilled, slots=self._jobs())
+		if job is None:
+			self.message = ("Compilation Stopped",
+					"User killed the compilation")
+			return 3
+		# the compilers run from threads, apply nice/affinity with a
+		# command prefix and use only the slots granted
+		self._prefix = job.prefix()
+		self._slots  = job.slots
+		rc = None
 		try:
-			lib_time = os.stat(libfluka).st_mtime
+			rc = self._build()
+		finally:
+			self._prefix = []
+			self._slots  = 0
+			scheduler.release(job, rc)
+		return rc
+
+	#----------------------------------------------------------------------
+	# @return number of parallel compilations requested
+	#----------------------------------------------------------------------
+	@staticmethod
+	def _jobs():
+		return Project.compileJobs>0 and Project.compileJobs or (os.cpu_count() or 1)
+
+	#----------------------------------------------------------------------
+	# Compile the sources in parallel
+	# @return rc
+	#----------------------------------------------------------------------
+	def _compileAll(self, pending, cache):
+		if not pending: return 0
+		self.message = ("Compiling", "%d files"%(len(pending)))
+		workers = self._jobs()
+		if self._slots: workers = min(workers, self._slots)
+		workers = min(workers, len(pending))
+		rc   = 0
+		done = 0
+		with ThreadPoolExecutor(workers) as executor:
+			futures = [executor.submit(self._compile, f, obj, cmd, workers>1)
+					for f, obj, cmd, key in pending]
+			for (f, obj, cmd, key), future in zip(pending, futures):
+				if rc or self.isKilled():
+					future.cancel()
+					continue
+				err = future.result()
+				if err:
+					self.message = err
+					rc = 2
+				else:
+					cache.store(obj, key)
+				done += 1
+				self.percent = (done*100) // (len(pending)+1)
+
+		if self.isKilled():
+			self.message = ("Compilation Stopped",
+					"User killed the compilation")
+			return 3
+		return rc
+
+	#----------------------------------------------------------------------
+	# Compile one file, streaming the compiler output
+	# @return None or the error message tuple
+	#----------------------------------------------------------------------
+	def _compile(self, f, obj, cmd, prefix):
+		if self.isKilled(): return None
+		try: before = os.stat(obj).st_mtime_ns
+		except OSError: before = 0
+		self.output(">>> Compiling: "+" ".join(list(cmd)))
+		try:
+			p = subprocess.Popen(self._prefix+list(cmd),
+					stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
 		except:
-			lib_time = 0
+			return ("Error", sys.exc_info()[1])
+		name = os.path.basename(f)
+		for line in p.stdout:
+			line = line.decode(errors="replace").rstrip()
+			if prefix: line = "%s: %s"%(name, line)
+			self.output(line)
+		p.wait()
 
-		maxobj_time = 0
-		tot = len(self.project.sourceList) + 1
-		for i,f in enumerate(self.project.sourceList):
-			self.message = ("Compiling", f)
-			if self.status == Process.STATUS_KILLED:
-				self.output("*** Killed ***")
-				return 0
+		try: f_time = os.stat(f).st_mtime
+		except OSError: f_time = 0
+		try:
+			s = os.stat(obj)
+			o_time = s.st_mtime
+			if s.st_mtime_ns == before: o_time = 0	# not regenerated
+		except OSError:
+			o_time = 0
+		if o_time == 0:
+			return ("Error compiling",
+				"Error: compiling file: %s\n" \
+				"No object generated" %(f))
+		elif o_time < f_time:
+			return ("Error compiling",
+				"Error: file %s time: %s\n" \
+				"is newer than the object %s" \
+				%(f,
+				 time.strftime(_TIME_FORMAT, time.localtime(f_time)),
+				 time.strftime(_TIME_FORMAT, time.localtime(o_time))))
+		return None
+
+	#----------------------------------------------------------------------
+	def _build(self):
+		# compile all sources that need compilation
+		try: exe_time = os.stat(self.project.exe).st_mtime
+		except: exe_time = 0
+
+		cache   = ObjectCache()
+		scanner = IncludeScanner()
+		objects = []	# objects and libraries to link
+		pending = []	# (source, object, command, key) to compile
+		self.message = ("Checking", "Source dependencies")
+		for f in self.project.sourceList:
 			(fn, ext) = os.path.splitext(f)
 			if ext in (".a",".so",".o"):
 				# Check date of libraries
-				try: o_time = os.stat(f).st_mtime
-				except: o_time = 0
-			else:
-				# or object
-				try: o_time = os.stat(fn+".o").st_mtime
-				except: o_time = 0
-
-				try: f_time = os.stat(f).st_mtime
-				except:
-					self.message = ("File do not exist",
-							"Cannot find file %s" %(f))
-					return 1
-
-				if o_time <= f_time or o_time <= lib_time:
-					# Compile Fortran
-					cmd = self.project.compileCmd(f)
-					self.output(">>> Compiling: "+" ".join(list(cmd)))
-					#self.output(subprocess.check_output(cmd,
-					#		stderr=subprocess.STDOUT))
-					try:
-						p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-					except:
-						self.message = ("Error", sys.exc_info()[1])
-						return 2
-					out,err = p.communicate()
-					self.output(out)
-					try: o_time = os.stat(fn+".o").st_mtime
-					except: o_time = 0
-					if o_time < f_time:
-						if o_time == 0:
-							self.message = ("Error compiling",
-									"Error: compiling file: %s\n" \
-									"No object generated" %(f))
-						else:
-							self.message = ("Error compiling",
-									"Error: file %s time: %s\n" \
-									"is newer than the object %s" \
-									%(f,
-									 time.strftime(_TIME_FORMAT, time.localtime(f_time)),
-									 time.strftime(_TIME_FORMAT, time.localtime(o_time))))
-						return 2
-
-				if self.isKilled():
-					self.message = ("Compilation Stopped",
-							"User killed the compilation")
-					return 3
+				objects.append(f)
+				continue
+
+			obj = fn + ".o"
+			objects.append(obj)
+			if not os.path.isfile(f):
+				self.message = ("File do not exist",
+						"Cannot find file %s" %(f))
+				return 1
+			cmd  = self.project.compileCmd(f)
+			deps = scanner.scan(f)
+			key  = cache.key(f, cmd, deps)
+			if cache.restore(obj, key, [f]+deps):
+				continue
+			pending.append((f, obj, cmd, key))
+
+		try:
+			rc = self._compileAll(pending, cache)
+		finally:
+			cache.save()
+		if rc: return rc
+
+		# relink also when the fluka library is updated
+		objects.append(os.path.join(Project.flukaDir,Project.DEFAULT_LIB))
+		maxobj_time = 0
+		for obj in objects:
+			try: o_time = os.stat(obj).st_mtime
+			except OSError: o_time = 0
 			if o_time > maxobj_time:
 				maxobj_time = o_time
-			# Update percentage
-			self.percent = (i*100) // tot
 
 		# Link executable
 		if exe_time <= maxobj_time:
@@ -195,7 +460,8 @@ class CompileProcess(FlairProcess.FlairProcess):
 			self.output(">>> Linking: "+" ".join(list(cmd)))
 			#self.output(subprocess.check_output(cmd,
 			#			stderr=subprocess.STDOUT))
-			p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+			p = subprocess.Popen(self._prefix+list(cmd),
+					stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
 			out,err = p.communicate()
 			self.output(out)
 			try:
@@ -37,6 +37,7 @@
 __author__ = "Vasilis Vlachoudis"
 __email__  = "Paola.Sala@mi.infn.it"
 
+import os
 import re
 import math
 import bmath
@@ -53,6 +54,8 @@ try:
 except ImportError:
 	numpy = None
 
+MGDRAW_WINDOW = 1<<16	# words scanned at once when indexing MGDRAW events
+
 _detectorPattern = re.compile(r"^ ?# ?Detector ?n?:\s*\d*\s*(.*)\s*", re.MULTILINE)
 _blockPattern	 = re.compile(r"^ ?# ?Block ?n?:\s*\d*\s*(.*)\s*",    re.MULTILINE)
 
@@ -90,6 +93,8 @@ class Usrxxx:
 		self.detector = []
 		self.seekpos  = -1
 		self.statpos  = -1
+		self.index    = []	# file offset of each detector data record
+		self.statidx  = []	# file offset of each statistics record
 
 	# ----------------------------------------------------------------------
 	# Read information from USRxxx file
@@ -422,6 +427,7 @@ class Usrbdx(Usrxxx):
 				det.ngroup = 0
 				det.egroup = []
 
+			self.index.append(f.tell()+4)
 			size  = (det.ngroup+det.ne) * det.na * 4
 			if size != fortran.skip(f):
 				raise IOError("Invalid USRBDX file")
@@ -433,14 +439,7 @@ class Usrbdx(Usrxxx):
 	def readData(self, n):
 		"""Read detector n data structure"""
 		f = open(self.file, "rb")
-		fortran.skip(f)
-		for i in range(n):
-			fortran.skip(f)		# Detector Header
-			if self.detector[i].lowneu: fortran.skip(f)	# Detector low enetry neutron groups
-			fortran.skip(f)		# Detector data
-
-		fortran.skip(f)		# Detector Header
-		if self.detector[n].lowneu: fortran.skip(f)	# Detector low enetry neutron groups
+		f.seek(self.index[n]-4)
 		data = fortran.read(f)	# Detector data
 		f.close()
 		return data
@@ -486,6 +485,118 @@ class Usrbdx(Usrxxx):
 			say("Angle  : [", det.alow,"..",det.ahigh,"] na=", det.na, "da=",det.da)
 			say("Total  : ", det.total, "+/-", det.totalerror)
 
+#===============================================================================
+# Usrtrack/Usrcoll detector
+#===============================================================================
+class Usrtrack(Usrxxx):
+	# ----------------------------------------------------------------------
+	# Read information from a USRTRACK or USRCOLL file
+	# Fill the self.detector structure
+	# ----------------------------------------------------------------------
+	def readHeader(self, filename):
+		"""Read track length/collision detector information"""
+		f = Usrxxx.readHeader(self, filename)
+
+		for i in range(1000):
+			# Header
+			data = fortran.read(f)
+			if data is None: break
+			size = len(data)
+
+			# Statistics are present?
+			if size == 14 and data[:10] == b"STATISTICS":
+				# Same 7 records per detector as USRBDX
+				self.statpos = f.tell()
+				for det in self.detector:
+					data = unpackArray(fortran.read(f))
+					det.total = data[0]
+					det.totalerror = data[1]
+					for j in range(6):
+						fortran.skip(f)
+				break
+			if size != 50: raise IOError("Invalid USRTRACK file")
+
+			# Parse header
+			header = struct.unpack("=i10siiififfif", data)
+
+			det = Detector()
+			det.nb	    = header[ 0]		# mtc
+			det.name    = header[ 1].strip().decode()	# titutc
+			det.type    = header[ 2]		# itustc
+			det.dist    = header[ 3]		# idustc
+			det.reg     = header[ 4]		# nrustc
+			det.volume  = header[ 5]		# vusrtc
+			det.lowneu  = header[ 6]		# llnutc
+			det.elow    = header[ 7]		# etclow
+			det.ehigh   = header[ 8]		# etchgh
+			det.ne	    = header[ 9]		# netcbn
+			det.de	    = header[10]		# detcbn
+			det.na	    = 1
+
+			self.detector.append(det)
+
+			if det.lowneu:
+				data = fortran.read(f)
+				det.ngroup = struct.unpack("=i",data[:4])[0]
+				det.egroup = struct.unpack("=%df"%(det.ngroup+1), data[4:])
+			else:
+				det.ngroup = 0
+				det.egroup = []
+
+			self.index.append(f.tell()+4)
+			size  = (det.ngroup+det.ne) * 4
+			if size != fortran.skip(f):
+				raise IOError("Invalid USRTRACK file")
+		f.close()
+
+	# ----------------------------------------------------------------------
+	# Read detector data
+	# ----------------------------------------------------------------------
+	def readData(self, n):
+		"""Read detector n data structure"""
+		f = open(self.file, "rb")
+		f.seek(self.index[n]-4)
+		data = fortran.read(f)	# Detector data
+		f.close()
+		return data
+
+	# ----------------------------------------------------------------------
+	# Read detector statistical data
+	# ----------------------------------------------------------------------
+	def readStat(self, n):
+		"""Read detector n statistical data"""
+		if self.statpos < 0: return None
+		f = open(self.file,"rb")
+		f.seek(self.statpos)
+		for i in range(n):
+			for j in range(7):
+				fortran.skip(f)	# Detector Data
+
+		for j in range(6):
+			fortran.skip(f)	# Detector Data
+		data = fortran.read(f)
+		f.close()
+		return data
+
+	# ----------------------------------------------------------------------
+	def say(self, det=None):
+		"""print header/detector information"""
+		if det is None:
+			self.sayHeader()
+		else:
+			det = self.detector[det]
+			say("TRK    : ", det.nb)
+			say("Title  : ", det.name)
+			say("Type   : ", det.type)
+			say("Dist   : ", det.dist)
+			say("Reg    : ", det.reg)
+			say("Volume : ", det.volume)
+			say("LowNeu : ", det.lowneu)
+			say("Energy : [", det.elow,"..",det.ehigh,"] ne=", det.ne, "de=",det.de)
+			if det.lowneu:
+				say("LOWNeut : [",det.egroup[-1],"..",det.egroup[0],"] ne=",det.ngroup)
+			say("Total  : ", det.total, "+/-", det.totalerror)
+
 #===============================================================================
 # Usrbin detector
 #===============================================================================
@@ -554,9 +665,18 @@ class Usrbin(Usrxxx):
 
 			self.detector.append(bin)
 
+			self.index.append(f.tell()+4)
 			size  = bin.nx * bin.ny * bin.nz * 4
 			if fortran.skip(f) != size:
 				raise IOError("Invalid USRBIN file")
+
+		# Index the statistics records, one per detector
+		if self.statpos >= 0:
+			for bin in self.detector:
+				pos = f.tell()+4
+				if fortran.skip(f) != bin.nx * bin.ny * bin.nz * 4:
+					break
+				self.statidx.append(pos)
 		f.close()
 
 	# ----------------------------------------------------------------------
@@ -565,11 +685,7 @@ class Usrbin(Usrxxx):
 	def readData(self, n):
 		"""Read detector det data structure"""
 		f = open(self.file, "rb")
-		fortran.skip(f)
-		for i in range(n):
-			fortran.skip(f)		# Detector Header
-			fortran.skip(f)		# Detector data
-		fortran.skip(f)		# Detector Header
+		f.seek(self.index[n]-4)
 		data = fortran.read(f)	# Detector data
 		f.close()
 		return data
@@ -579,15 +695,40 @@ class Usrbin(Usrxxx):
 	# ----------------------------------------------------------------------
 	def readStat(self, n):
 		"""Read detector n statistical data"""
-		if self.statpos < 0: return None
+		if n >= len(self.statidx): return None
 		f = open(self.file,"rb")
-		f.seek(self.statpos)
-		for i in range(n):
-			fortran.skip(f)	# Detector Data
+		f.seek(self.statidx[n]-4)
 		data = fortran.read(f)
 		f.close()
 		return data
 
+	# ----------------------------------------------------------------------
+	# Map a detector record from the file as a (nz,ny,nx) float32 array
+	# ----------------------------------------------------------------------
+	def _map(self, pos, n):
+		if numpy is None:
+			raise ImportError("Numpy is not available. See http://numpy.scipy.org/ to download and install")
+		bin = self.detector[n]
+		return numpy.memmap(self.file, dtype=numpy.float32, mode="r",
+				offset=pos, shape=(bin.nz, bin.ny, bin.nx))
+
+	# ----------------------------------------------------------------------
+	# @return detector n data as a read-only (nz,ny,nx) array mapped
+	#         directly from the file, without copying
+	# ----------------------------------------------------------------------
+	def array(self, n):
+		"""Return detector n data as a memory mapped (nz,ny,nx) array"""
+		return self._map(self.index[n], n)
+
+	# ----------------------------------------------------------------------
+	# @return detector n relative errors as a (nz,ny,nx) array
+	#         or None if the file has no statistics
+	# ----------------------------------------------------------------------
+	def errors(self, n):
+		"""Return detector n errors as a memory mapped (nz,ny,nx) array"""
+		if n >= len(self.statidx): return None
+		return self._map(self.statidx[n], n)
+
 	# ----------------------------------------------------------------------
 	def say(self, det=None):
 		"""print header/detector information"""
@@ -714,6 +855,137 @@ class Mgdraw:
 		self.data = struct.unpack(fmt, data)
 		return ncase
 
+	# ----------------------------------------------------------------------
+	# Memory map the whole file as 32bit words
+	# ----------------------------------------------------------------------
+	def _words(self):
+		if numpy is None:
+			raise ImportError("Numpy is not available. See http://numpy.scipy.org/ to download and install")
+		nwords = os.path.getsize(self.file)//4
+		if nwords == 0: return numpy.zeros(0, numpy.int32)
+		return numpy.memmap(self.file, dtype=numpy.int32, mode="r", shape=(nwords,))
+
+	# ----------------------------------------------------------------------
+	# Scan the file and yield the word offsets of the event headers
+	# in arrays of up to nevents. An incomplete last event is ignored
+	# ----------------------------------------------------------------------
+	def index(self, nevents=65536, words=None):
+		"""Yield arrays with the word offset of every event"""
+		if words is None: words = self._words()
+		nwords = len(words)
+		pos    = 0
+		starts = []
+		while pos < nwords:
+			# Position of the next event for every candidate word in
+			# the window, from the header ndum, mdum
+			end = min(pos+MGDRAW_WINDOW, nwords)
+			w = numpy.zeros(end-pos+3, numpy.int64)
+			w[:min(end+3,nwords)-pos] = words[pos:min(end+3,nwords)]
+			nd = w[1:end-pos+1]
+			md = w[2:end-pos+2]
+			nxt = numpy.where(nd>0, 3*(nd+1)+md+1,
+					numpy.where(nd==0, 4, 9*md))
+			nxt += numpy.arange(pos+9, end+9)
+
+			p = pos
+			while p < end:
+				q = int(nxt[p-pos])
+				if q <= p: raise IOError("Invalid MGREAD file")
+				if q > nwords: break		# incomplete event
+				starts.append(p)
+				p = q
+				if len(starts) >= nevents:
+					yield numpy.array(starts, numpy.int64)
+					starts = []
+			if p < end: break
+			pos = p
+		if starts:
+			yield numpy.array(starts, numpy.int64)
+
+	# ----------------------------------------------------------------------
+	# Yield for every batch of nevents a tuple (tracking, energy, source)
+	# of numpy structured arrays, one row per track point, energy
+	# deposition or source particle. The types filtered out by type are
+	# never decoded and returned as None
+	# ----------------------------------------------------------------------
+	def batches(self, nevents=65536, type=None):
+		"""Read events in batches of structured arrays"""
+		words  = self._words()
+		floats = words.view(numpy.float32)
+		for s in self.index(nevents, words):
+			nd = words[s+1]
+			md = words[s+2]
+			length = numpy.where(nd>0, 3*(nd+1)+md+1,
+					numpy.where(nd==0, 4, 9*md))
+			if (words[s]!=20).any() or (words[s+6]!=20).any() or \
+			   (words[s+7]!=4*length).any() or \
+			   (words[s+8+length]!=4*length).any():
+				raise IOError("Invalid MGREAD file")
+			event = numpy.arange(self.nevent, self.nevent+len(s))
+			self.nevent += len(s)
+
+			tracking = energy = source = None
+			if type is None or type == 0:
+				sel = nd > 0
+				tracking = self._decode(MGDRAW_TRACKING,
+						s[sel], event[sel], nd[sel]+1, 3, words, floats)
+			if type is None or type == 1:
+				sel = nd == 0
+				energy = self._decode(MGDRAW_ENERGY,
+						s[sel], event[sel], 1, 4, words, floats)
+			if type is None or type == 2:
+				sel = nd < 0
+				source = self._decode(MGDRAW_SOURCE,
+						s[sel], event[sel], md[sel], 9, words, floats)
+				source["ncase"] *= -1
+			yield tracking, energy, source
+
+	# ----------------------------------------------------------------------
+	# Decode rows of nwords from the data record of the events starting
+	# at word offsets s. The first fields are filled from the event header
+	# ----------------------------------------------------------------------
+	@staticmethod
+	def _decode(dtype, s, event, nrows, nwords, words, floats):
+		nrows = numpy.broadcast_to(nrows, s.shape)
+		total = int(nrows.sum())
+		first = numpy.cumsum(nrows) - nrows
+		row   = numpy.arange(total) - numpy.repeat(first, nrows)
+		base  = numpy.repeat(s, nrows)
+		data  = base + 8 + nwords*row
+		out   = numpy.zeros(total, dtype)
+		out["event"] = numpy.repeat(event, nrows)
+		names = dtype.names[1:]
+		hdr   = len(names) - nwords
+		for i,name in enumerate(names):
+			if i < hdr:
+				# header ndum, mdum, jdum, edum, wdum
+				idx = base + 1 + MGDRAW_HEADER[name]
+			else:
+				idx = data + i - hdr
+			if out.dtype[name].kind == "i":
+				out[name] = words[idx]
+			else:
+				out[name] = floats[idx]
+		return out
+
+#-------------------------------------------------------------------------------
+# Structured types of the MGDRAW batches
+#-------------------------------------------------------------------------------
+if numpy is not None:
+	# position of the header fields ndum, mdum, jdum, edum, wdum
+	MGDRAW_HEADER = {"ntrack":0, "mtrack":1, "icode":1, "ncase":0, "npflka":1,
+			 "jtrack":2, "etrack":3, "wtrack":4 }
+	MGDRAW_TRACKING = numpy.dtype([("event","i8"), ("jtrack","i4"),
+			("etrack","f4"), ("wtrack","f4"),
+			("x","f4"), ("y","f4"), ("z","f4")])
+	MGDRAW_ENERGY = numpy.dtype([("event","i8"), ("icode","i4"),
+			("jtrack","i4"), ("etrack","f4"), ("wtrack","f4"),
+			("x","f4"), ("y","f4"), ("z","f4"), ("rull","f4")])
+	MGDRAW_SOURCE = numpy.dtype([("event","i8"), ("ncase","i4"),
+			("ptype","i4"), ("etot","f4"), ("weight","f4"),
+			("x","f4"), ("y","f4"), ("z","f4"),
+			("tx","f4"), ("ty","f4"), ("tz","f4")])
+
 #===============================================================================
 # 1D data from tab.lis format
 #===============================================================================
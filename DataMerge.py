@@ -0,0 +1,670 @@
+# 
+#
+# Copyright and User License
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Copyright 2006-2019 CERN and INFN
+# 
+#
+# Please consult the LICENSE file for the license 
+#
+# DISCLAIMER
+# ~~~~~~~~~~
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT
+# NOT LIMITED TO, IMPLIED WARRANTIES OF MERCHANTABILITY, OF
+# SATISFACTORY QUALITY, AND FITNESS FOR A PARTICULAR PURPOSE
+# OR USE ARE DISCLAIMED. THE COPYRIGHT HOLDERS AND THE
+# AUTHORS MAKE NO REPRESENTATION THAT THE SOFTWARE AND
+# MODIFICATIONS THEREOF, WILL NOT INFRINGE ANY PATENT,
+# COPYRIGHT, TRADE SECRET OR OTHER PROPRIETARY RIGHT.
+#
+# LIMITATION OF LIABILITY
+# ~~~~~~~~~~~~~~~~~~~~~~~
+# THE COPYRIGHT HOLDERS AND THE AUTHORS SHALL HAVE NO
+# LIABILITY FOR DIRECT, INDIRECT, SPECIAL, INCIDENTAL,
+# CONSEQUENTIAL, EXEMPLARY, OR PUNITIVE DAMAGES OF ANY
+# CHARACTER INCLUDING, WITHOUT LIMITATION, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES, LOSS OF USE, DATA OR PROFITS,
+# OR BUSINESS INTERRUPTION, HOWEVER CAUSED AND ON ANY THEORY
+# OF CONTRACT, WARRANTY, TORT (INCLUDING NEGLIGENCE), PRODUCT
+# LIABILITY OR OTHERWISE, ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGES.
+#
+# Date:	18-Oct-2026
+
+import os
+import time
+import json
+import shutil
+import struct
+import fortran
+import Data
+
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+	import numpy
+	from numpy.lib.format import open_memmap
+except ImportError:
+	numpy = None
+
+CHUNK = 1<<22		# number of bins processed at once per detector
+
+#-------------------------------------------------------------------------------
+# Write the header of a USRxxx file
+#-------------------------------------------------------------------------------
+def writeHeader(f, title, tim, weight, ncase, nbatch):
+	over1b, ncase = divmod(int(ncase), 1000000000)
+	fortran.write(f, struct.pack("=80s32sfiii",
+			title, tim, weight, ncase, over1b, nbatch))
+
+#-------------------------------------------------------------------------------
+# Reserve an empty fortran record of size bytes
+# @return the file offset of the record data
+#-------------------------------------------------------------------------------
+def reserve(f, size):
+	blen = struct.pack("=i", size)
+	f.write(blen)
+	pos = f.tell()
+	f.seek(size, 1)
+	f.write(blen)
+	return pos
+
+#-------------------------------------------------------------------------------
+# Outputs are written on a temporary name and renamed in place when complete,
+# an aborted or failed merge leaves the previous ones untouched
+#-------------------------------------------------------------------------------
+def tempName(filename):
+	return filename + ".tmp"
+
+#-------------------------------------------------------------------------------
+# Rename the complete temporary outputs in place
+#-------------------------------------------------------------------------------
+def commitFiles(files):
+	for fn in files:
+		os.replace(tempName(fn), fn)
+
+#-------------------------------------------------------------------------------
+# Remove the temporary outputs left by an aborted or failed merge
+#-------------------------------------------------------------------------------
+def cleanFiles(files):
+	for fn in files:
+		try:
+			os.remove(tempName(fn))
+		except OSError:
+			pass
+
+#-------------------------------------------------------------------------------
+# @return the (size, mtime) fingerprint of a file
+#-------------------------------------------------------------------------------
+def fingerprint(filename):
+	st = os.stat(filename)
+	return [st.st_size, st.st_mtime]
+
+#-------------------------------------------------------------------------------
+# Weighted Welford accumulation of one chunk of all new cycles
+# @param arrays		list of (array,weight) for every cycle
+# @param mean,m2	running mean and sum of squared deviations, updated
+# @return wsum, n	the new total weight and number of cycles
+#-------------------------------------------------------------------------------
+def accumulate(arrays, a, b, mean, m2, wsum, n):
+	for x, w in arrays:
+		x = x[a:b].astype(numpy.float64)
+		wsum += w
+		n    += 1
+		delta = x - mean
+		mean += (w/wsum)*delta
+		m2   += w*delta*(x - mean)
+	return wsum, n
+
+#-------------------------------------------------------------------------------
+# Convert running mean and sum of squares to mean and relative error
+#-------------------------------------------------------------------------------
+def finalize(mean, m2, wsum, n):
+	err = numpy.zeros_like(mean)
+	if n > 1 and wsum > 0.0:
+		numpy.sqrt(numpy.maximum(m2, 0.0) / wsum / (n-1), out=err)
+		nz = mean != 0.0
+		err[nz] /= numpy.abs(mean[nz])
+		err[~nz] = 0.0
+	return mean, err
+
+#-------------------------------------------------------------------------------
+# Merge the new cycles of detector n, updating the state file and writing
+# directly in the preallocated output.  Executed in a worker process
+#-------------------------------------------------------------------------------
+def _mergeUsrbinDetector(output, datapos, statpos, cycles, size, statefile, wsum, n):
+	arrays = [(numpy.memmap(fn, dtype=numpy.float32, mode="r",
+				offset=pos, shape=(size,)), w)
+			for fn, pos, w in cycles]
+	state = open_memmap(statefile, mode="r+")
+	out = numpy.memmap(output, dtype=numpy.float32, mode="r+",
+				offset=datapos, shape=(size,))
+	err = numpy.memmap(output, dtype=numpy.float32, mode="r+",
+				offset=statpos, shape=(size,))
+	for a in range(0, size, CHUNK):
+		b = min(a+CHUNK, size)
+		mean = numpy.array(state[0,a:b])
+		m2   = numpy.array(state[1,a:b])
+		ws, nn = accumulate(arrays, a, b, mean, m2, wsum, n)
+		state[0,a:b] = mean
+		state[1,a:b] = m2
+		out[a:b], err[a:b] = finalize(mean, m2, ws, nn)
+	state.flush()
+	out.flush()
+	err.flush()
+	del state, out, err, arrays
+	return size
+
+#===============================================================================
+# Persistent merge state, kept in a <output>.state directory next to the
+# merged file.  It holds the fingerprints of the cycles already folded in,
+# the totals of the header and per detector the running mean and sum of
+# squared deviations, so that a re-merge only reads the new cycles
+#===============================================================================
+class MergeState:
+	VERSION = 1
+
+	def __init__(self, output):
+		self.path = output + ".state"
+		self.reset()
+
+	# ----------------------------------------------------------------------
+	def reset(self):
+		self.files  = {}	# filename: [size, mtime]
+		self.first  = None	# file used as template for the headers
+		self.layout = None	# size of the state array of every detector
+		self.weight = 0.0
+		self.ncase  = 0
+		self.nbatch = 0
+		self.ncycle = 0
+
+	# ----------------------------------------------------------------------
+	def _json(self):
+		return os.path.join(self.path, "state.json")
+
+	# ----------------------------------------------------------------------
+	def arrayFile(self, n):
+		return os.path.join(self.path, "det%d.npy"%(n))
+
+	# ----------------------------------------------------------------------
+	# Load state, return False if missing, incomplete or of other version
+	# ----------------------------------------------------------------------
+	def load(self):
+		self.reset()
+		try:
+			f = open(self._json(), "r")
+			d = json.load(f)
+			f.close()
+		except (IOError, OSError, ValueError):
+			return False
+		if d.get("version") != MergeState.VERSION or d.get("dirty", True):
+			return False
+		self.files  = d["files"]
+		self.first  = d["first"]
+		self.layout = d["layout"]
+		self.weight = d["weight"]
+		self.ncase  = d["ncase"]
+		self.nbatch = d["nbatch"]
+		self.ncycle = d["ncycle"]
+		return True
+
+	# ----------------------------------------------------------------------
+	# Save state, a dirty state is never reused
+	# ----------------------------------------------------------------------
+	def save(self, dirty=False):
+		if not os.path.isdir(self.path): os.makedirs(self.path)
+		f = open(self._json(), "w")
+		json.dump({	"version": MergeState.VERSION,
+				"dirty"  : dirty,
+				"files"  : self.files,
+				"first"  : self.first,
+				"layout" : self.layout,
+				"weight" : self.weight,
+				"ncase"  : self.ncase,
+				"nbatch" : self.nbatch,
+				"ncycle" : self.ncycle }, f)
+		f.close()
+
+	# ----------------------------------------------------------------------
+	def remove(self):
+		self.reset()
+		shutil.rmtree(self.path, True)
+
+	# ----------------------------------------------------------------------
+	# Compare with the current list of files
+	# If any folded file was changed or removed the state is reset
+	# @return list of files to be merged
+	# ----------------------------------------------------------------------
+	def update(self, files):
+		current = {}
+		for fn in files:
+			try:
+				current[fn] = fingerprint(fn)
+			except OSError:
+				pass
+		for fn,fp in self.files.items():
+			if current.get(fn) != fp:
+				self.remove()
+				break
+		self.current = current
+		return [fn for fn in files if fn in current and fn not in self.files]
+
+	# ----------------------------------------------------------------------
+	# Running mean and m2 array of detector n, created if needed
+	# ----------------------------------------------------------------------
+	def array(self, n, size):
+		fn = self.arrayFile(n)
+		if self.ncycle == 0 or not os.path.isfile(fn):
+			if not os.path.isdir(self.path): os.makedirs(self.path)
+			a = open_memmap(fn, mode="w+", dtype=numpy.float64, shape=(2,size))
+			del a
+		return fn
+
+	# ----------------------------------------------------------------------
+	# Fold the header information of the merged cycles
+	# ----------------------------------------------------------------------
+	def add(self, usr):
+		self.weight += usr.weight
+		self.ncase  += usr.ncase
+		self.nbatch += usr.nbatch
+		self.ncycle += 1
+
+	# ----------------------------------------------------------------------
+	def commit(self, files):
+		for fn in files:
+			self.files[fn] = self.current[fn]
+		self.save()
+
+#===============================================================================
+# Base class of the in process mergers
+#===============================================================================
+class Merger:
+	reader = None
+	name   = ""
+
+	def __init__(self, files, output):
+		self.files  = files
+		self.output = output
+		self.state  = MergeState(output)
+		self.new    = []	# new files to merge
+		self.cycles = []	# headers of the new valid cycles
+		self.first  = None	# header template
+
+	# ----------------------------------------------------------------------
+	# Find the new cycles, read their headers and check their compatibility
+	# ----------------------------------------------------------------------
+	def scan(self):
+		self.state.load()
+		self.new = self.state.update(self.files)
+		self.cycles = []
+		self.first  = None
+		if self.state.first:
+			self.first = self.reader(self.state.first)
+		for fn in self.new:
+			usr = self.reader(fn)
+			if usr.weight <= 0.0: continue
+			if self.first is None:
+				self.first = usr
+			elif self.layout(usr) != self.layout(self.first):
+				raise IOError("Incompatible %s file %s"%(self.name, fn))
+			self.cycles.append(usr)
+		if self.first is None:
+			raise IOError("No valid %s files to merge"%(self.name))
+		return self.cycles
+
+	# ----------------------------------------------------------------------
+	# @return True if there is nothing new to merge
+	# ----------------------------------------------------------------------
+	def upToDate(self):
+		return not self.new and os.path.isfile(self.output)
+
+	# ----------------------------------------------------------------------
+	# Prepare the state for folding the new cycles
+	# ----------------------------------------------------------------------
+	def begin(self):
+		state = self.state
+		if state.first is None:
+			state.first  = self.first.file
+			state.layout = self.layout(self.first)
+		state.save(True)
+
+	# ----------------------------------------------------------------------
+	def end(self):
+		for usr in self.cycles:
+			self.state.add(usr)
+		self.state.commit(self.new)
+
+#===============================================================================
+# In process USRBIN merger, replacing the usbsuw program
+#===============================================================================
+class UsrbinMerger(Merger):
+	reader = Data.Usrbin
+	name   = "USRBIN"
+
+	# ----------------------------------------------------------------------
+	# Size of every detector, used to check the compatibility of the files
+	# ----------------------------------------------------------------------
+	def layout(self, usr):
+		return [d.nx*d.ny*d.nz for d in usr.detector]
+
+	# ----------------------------------------------------------------------
+	# Write the output file with headers and empty data/statistics records
+	# @return list of (datapos, statpos) for every detector
+	# ----------------------------------------------------------------------
+	def prepare(self, output):
+		state  = self.state
+		weight = state.weight + sum([u.weight for u in self.cycles])
+		ncase  = state.ncase  + sum([u.ncase  for u in self.cycles])
+		nbatch = state.nbatch + sum([u.nbatch for u in self.cycles])
+
+		first = self.first
+		fin  = open(first.file, "rb")
+		fout = open(output, "wb")
+		fortran.skip(fin)
+		writeHeader(fout, first.title.ljust(80), first.time.ljust(32),
+				weight, ncase, nbatch)
+		datapos = []
+		for det in first.detector:
+			fortran.write(fout, fortran.read(fin))	# Detector header
+			size = fortran.skip(fin)		# Detector data
+			datapos.append(reserve(fout, size))
+		fin.close()
+
+		fortran.write(fout, b"STATISTICS"+struct.pack("=i",1))
+		statpos = []
+		for det in first.detector:
+			statpos.append(reserve(fout, det.nx*det.ny*det.nz*4))
+		fout.close()
+		return list(zip(datapos, statpos))
+
+	# ----------------------------------------------------------------------
+	# Merge the new cycles in parallel, one detector per worker
+	# @param workers	number of processes, default the cpu count
+	# @param progress	optional callback(done, total)
+	# @param abort		optional callable returning True to stop
+	# ----------------------------------------------------------------------
+	def merge(self, workers=None, progress=None, abort=None):
+		if numpy is None:
+			raise ImportError("Numpy is not available. See http://numpy.scipy.org/ to download and install")
+		if self.first is None: self.scan()
+		if self.upToDate(): return True
+		self.begin()
+		outputs = [self.output]
+		output  = tempName(self.output)
+		try:
+			positions = self.prepare(output)
+			ndet = len(positions)
+			if workers is None: workers = os.cpu_count() or 1
+			workers = max(1, min(workers, ndet))
+			state = self.state
+
+			with ProcessPoolExecutor(workers) as pool:
+				futures = []
+				for n,(datapos, statpos) in enumerate(positions):
+					size = state.layout[n]
+					cycles = [(u.file, u.index[n], u.weight) for u in self.cycles]
+					futures.append(pool.submit(_mergeUsrbinDetector,
+							output, datapos, statpos,
+							cycles, size, state.array(n, size),
+							state.weight, state.ncycle))
+				for i,future in enumerate(futures):
+					if abort is not None and abort():
+						# wait for the running workers before
+						# removing the partial output
+						pool.shutdown(wait=True, cancel_futures=True)
+						return False
+					future.result()
+					if progress is not None: progress(i+1, ndet)
+			commitFiles(outputs)
+		finally:
+			cleanFiles(outputs)
+		self.end()
+		return True
+
+#-------------------------------------------------------------------------------
+# Return low and high edges of the energy bins in ascending order
+# and the index array to reorder the data record in ascending energy
+# The data record holds first the ne energy bins and then the ngroup
+# low energy neutron groups starting from the highest one
+#-------------------------------------------------------------------------------
+def energyBins(det):
+	if det.type < 0 and det.elow > 0.0:
+		edges = numpy.geomspace(det.elow, det.ehigh, det.ne+1)
+	else:
+		edges = numpy.linspace(det.elow, det.ehigh, det.ne+1)
+	low   = edges[:-1]
+	high  = edges[1:]
+	order = numpy.arange(det.ne)
+	if det.ngroup:
+		groups = numpy.array(det.egroup[::-1], numpy.float64)
+		low    = numpy.concatenate((groups[:-1], low))
+		high   = numpy.concatenate((groups[1:],  high))
+		order  = numpy.concatenate((
+				numpy.arange(det.ne+det.ngroup-1, det.ne-1, -1),
+				order))
+	return low, high, order
+
+#===============================================================================
+# In process merger for the 1D/2D estimators (USRBDX, USRTRACK, USRCOLL)
+# writing the binary sum file, the _tab.lis and _sum.lis
+#===============================================================================
+class EstimatorMerger(Merger):
+	def __init__(self, files, output):
+		Merger.__init__(self, files, output)
+		self.result = []
+
+	# ----------------------------------------------------------------------
+	# The state of every detector holds the data record followed by the
+	# spectrum integrated over solid angle, the cumulative and the total
+	# ----------------------------------------------------------------------
+	def layout(self, usr):
+		return [(d.ne+d.ngroup)*(d.na+2)+1 for d in usr.detector]
+
+	# ----------------------------------------------------------------------
+	# Solid angle bin widths, one for the angle-less estimators
+	# ----------------------------------------------------------------------
+	def angleBins(self, det):
+		return numpy.zeros(1), numpy.ones(1)
+
+	# ----------------------------------------------------------------------
+	# Fold the new cycles of detector n in the state and compute the results
+	# ----------------------------------------------------------------------
+	def mergeDetector(self, n):
+		det   = self.first.detector[n]
+		size  = self.state.layout[n]
+		state = open_memmap(self.state.array(n, size), mode="r+")
+		ne    = det.ne + det.ngroup
+		nd    = ne * det.na
+		elow, ehigh, order = energyBins(det)
+		alow, ahigh = self.angleBins(det)
+		de  = ehigh - elow
+		da  = ahigh - alow
+
+		# Per cycle quantities
+		wsum = self.state.weight
+		ncyc = self.state.ncycle
+		if self.cycles:
+			X = numpy.array([numpy.frombuffer(u.readData(n), numpy.float32)
+					for u in self.cycles], numpy.float64)
+			w = numpy.array([u.weight for u in self.cycles], numpy.float64)
+			nc   = X.shape[0]
+			dd   = X.reshape(nc, det.na, -1)[:,:,order]
+			diff = numpy.dot(dd.transpose(0,2,1), da)	# integrated over angle
+			cum  = numpy.cumsum(diff*de, axis=1)
+			F    = numpy.concatenate((X, diff, cum, cum[:,-1:]), axis=1)
+
+			# Combine the batch with the running state
+			wb    = w.sum()
+			meanb = numpy.dot(w, F) / wb
+			m2b   = numpy.dot(w, (F-meanb)**2)
+			delta = meanb - state[0]
+			wtot  = wsum + wb
+			state[1] += m2b + delta**2 * wsum * wb / wtot
+			state[0] += delta * wb / wtot
+			state.flush()
+			wsum  = wtot
+			ncyc += nc
+
+		mean, err = finalize(numpy.array(state[0]), numpy.array(state[1]), wsum, ncyc)
+		del state
+
+		res = Data.Detector()
+		res.det = det
+		res.elow, res.ehigh = elow, ehigh
+		res.alow, res.ahigh = alow, ahigh
+		res.data,  res.error   = mean[:nd], err[:nd]
+		res.dd     = mean[:nd].reshape(det.na, -1)[:,order]
+		res.dderr  = err[:nd].reshape(det.na, -1)[:,order]
+		res.diff,  res.differr = mean[nd:nd+ne],      err[nd:nd+ne]
+		res.cum,   res.cumerr  = mean[nd+ne:nd+2*ne], err[nd+ne:nd+2*ne]
+		res.total    = mean[-1]
+		res.totalerr = err[-1]
+		return res
+
+	# ----------------------------------------------------------------------
+	# Merge the detectors in process, workers is accepted for
+	# compatibility with UsrbinMerger
+	# ----------------------------------------------------------------------
+	def merge(self, workers=None, progress=None, abort=None):
+		if numpy is None:
+			raise ImportError("Numpy is not available. See http://numpy.scipy.org/ to download and install")
+		if self.first is None: self.scan()
+		if self.upToDate(): return True
+		self.begin()
+		ndet = len(self.first.detector)
+		self.result = []
+		for n in range(ndet):
+			if abort is not None and abort(): return False
+			self.result.append(self.mergeDetector(n))
+			if progress is not None: progress(n+1, ndet)
+		fn,ext = os.path.splitext(self.output)
+		outputs = [self.output, fn+"_tab.lis", fn+"_sum.lis"]
+		try:
+			self.writeBinary(tempName(outputs[0]))
+			self.writeTab(tempName(outputs[1]))
+			self.writeSum(tempName(outputs[2]))
+			commitFiles(outputs)
+		finally:
+			cleanFiles(outputs)
+		self.end()
+		return True
+
+	# ----------------------------------------------------------------------
+	# Write binary file with the same layout as the cycle files
+	# ----------------------------------------------------------------------
+	def writeBinary(self, filename):
+		state = self.state
+		first = self.first
+		fin  = open(first.file, "rb")
+		fout = open(filename, "wb")
+		fortran.skip(fin)
+		writeHeader(fout, first.title.ljust(80), first.time.ljust(32),
+				state.weight + sum([u.weight for u in self.cycles]),
+				state.ncase  + sum([u.ncase  for u in self.cycles]),
+				state.nbatch + sum([u.nbatch for u in self.cycles]))
+		for det,res in zip(first.detector, self.result):
+			fortran.write(fout, fortran.read(fin))	# Detector header
+			if det.lowneu:
+				fortran.write(fout, fortran.read(fin))	# Low energy groups
+			fortran.skip(fin)
+			fortran.write(fout, res.data.astype(numpy.float32).tobytes())
+		fin.close()
+
+		# Statistics, 7 records per detector
+		fortran.write(fout, b"STATISTICS"+struct.pack("=i",1))
+		for det,res in zip(first.detector, self.result):
+			for a in ([res.total, res.totalerr],
+				  None,
+				  res.diff, res.differr,
+				  res.cum,  res.cumerr,
+				  res.error):
+				if a is None:
+					d = struct.pack("=ii", det.ne, det.ngroup) + \
+						numpy.append(res.elow, res.ehigh[-1]).astype(numpy.float32).tobytes()
+				else:
+					d = numpy.asarray(a, numpy.float32).tobytes()
+				fortran.write(fout, d)
+		fout.close()
+
+	# ----------------------------------------------------------------------
+	# Write the tabulated data, errors in percent, with the layout of usxsuw:
+	# the integrated distribution of each detector followed, when there are
+	# angular bins, by the double differential one as a separate dataset.
+	# Datasets are separated by two empty lines and the angular intervals
+	# of the double differential by one (the index used by Usr2Plot)
+	# ----------------------------------------------------------------------
+	def writeTab(self, filename):
+		f = open(filename, "w")
+		for i,res in enumerate(self.result):
+			det = res.det
+			if i>0: f.write("\n\n")
+			f.write(" # Detector n: %2d %s (integrated over solid angle)\n" \
+					% (i+1, det.name))
+			f.write(" #  N. of energy intervals %d\n"%(len(res.elow)))
+			for row in zip(res.elow, res.ehigh, res.diff, 100.0*res.differr):
+				f.write(" %15.8e %15.8e %15.8e %15.8e\n"%row)
+			if det.na <= 1: continue
+			f.write("\n\n # double differential distributions\n")
+			f.write(" #  N. of energy intervals %d\n"%(len(res.elow)))
+			f.write(" #  N. of angular intervals %d\n"%(det.na))
+			for a in range(det.na):
+				if a>0: f.write("\n")
+				f.write(" # Block n: %d  Angle [%g, %g]\n" \
+						% (a+1, res.alow[a], res.ahigh[a]))
+				for e,v,err in zip(res.elow, res.dd[a], 100.0*res.dderr[a]):
+					f.write(" %15.8e %15.8e %15.8e %15.8e\n" \
+						% (e, res.alow[a], v, err))
+		f.close()
+
+	# ----------------------------------------------------------------------
+	# Write a human readable summary
+	# ----------------------------------------------------------------------
+	def writeSum(self, filename):
+		state = self.state
+		f = open(filename, "w")
+		f.write(" %s merged on %s\n"%(self.name, time.ctime()))
+		f.write(" Title   : %s\n"%(self.first.title.strip(b"\0 ").decode(errors="replace")))
+		f.write(" Cycles  : %d\n"%(state.ncycle + len(self.cycles)))
+		f.write(" Primaries: %d\n"%(state.ncase + sum([u.ncase for u in self.cycles])))
+		f.write(" Weight  : %g\n"%(state.weight + sum([u.weight for u in self.cycles])))
+		for i,res in enumerate(self.result):
+			det = res.det
+			f.write("\n Detector n: %d %s\n"%(i+1, det.name))
+			f.write("   Energy : [%g .. %g] ne=%d ngroup=%d\n" \
+				% (res.elow[0], res.ehigh[-1], det.ne, det.ngroup))
+			if det.na > 1:
+				f.write("   Angle  : [%g .. %g] na=%d\n" \
+					% (res.alow[0], res.ahigh[-1], det.na))
+			f.write("   Total  : %15.8e +/- %6.2f %%\n" \
+				% (res.total, 100.0*res.totalerr))
+		f.close()
+
+#===============================================================================
+class UsrbdxMerger(EstimatorMerger):
+	reader = Data.Usrbdx
+	name   = "USRBDX"
+
+	# ----------------------------------------------------------------------
+	def angleBins(self, det):
+		if abs(det.type)%10 == 2 and det.alow > 0.0:
+			edges = numpy.geomspace(det.alow, det.ahigh, det.na+1)
+		else:
+			edges = numpy.linspace(det.alow, det.ahigh, det.na+1)
+		return edges[:-1], edges[1:]
+
+#===============================================================================
+class UsrtrackMerger(EstimatorMerger):
+	reader = Data.Usrtrack
+	name   = "USRTRACK"
+
+#===============================================================================
+class UsrcollMerger(UsrtrackMerger):
+	name   = "USRCOLL"
+
+# Native mergers per USRxxx type, others use the FLUKA programs
+MERGERS = {	"b": UsrbinMerger,
+		"x": UsrbdxMerger,
+		"t": UsrtrackMerger,
+		"c": UsrcollMerger }
@@ -45,10 +45,11 @@ import select
 import subprocess
 
 from stat import *
+from concurrent.futures import ThreadPoolExecutor
 
-import tkFlair
 import Project
 import Process
+import DataMerge
 import FlairProcess
 
 #===============================================================================
@@ -79,36 +80,52 @@ class DataProcess(FlairProcess.FlairProcess):
 					except Exception as err:
 						self.output(str(err))
 						rc=1
+			# Remove merge state
+			state = DataMerge.MergeState(fn+ext)
+			if os.path.isdir(state.path):
+				state.remove()
+				self.output("Removing: "+state.path)
 			self.message = ("Data clean", "%d files removed" % (count))
 		return rc
 
 	#----------------------------------------------------------------------
-	# Compile executable
+	# Process all USRxxx units concurrently
 	#----------------------------------------------------------------------
 	def _execute(self):
 		Process.Process.execute(self)
 		files = []
 		errfiles = []
 		rc  = 0
-		for i,usr in enumerate(self.usr):
+		for usr in self.usr:
 			if usr is None:
 				self.message = ("Error", "Invalid detector. usr=None")
 				return 1
-			self.message = ("Processing", usr.name())
-			if self.status == Process.STATUS_KILLED:
-				self.output("*** Killed ***\n")
-				return rc
-			if usr is None:
-				self.message = ("Warning", "No USRxxx rules found")
-				return 1
-			if self._processUsrInfo(usr):
-				rc = 2
-				self.output("Error processing: %s\n"%(usr.name()))
-				errfiles.append(usr.name())
-			else:
-				files.append(usr.name())
-			# Update percentage
-			self.percent = (i*100) // len(self.usr)
+		if not self.usr:
+			self.message = ("Warning", "No USRxxx rules found")
+			return 1
+
+		self._progress = [0.0]*len(self.usr)
+		cpus = os.cpu_count() or 1
+		workers = min(len(self.usr), cpus)
+		# share the cpus among the merging processes of the units
+		self._workers = max(1, cpus // len(self.usr))
+		with ThreadPoolExecutor(workers) as pool:
+			futures = [pool.submit(self._processUnit, i, usr)
+					for i,usr in enumerate(self.usr)]
+			for usr,future in zip(self.usr, futures):
+				result = future.result()
+				if result is None:
+					continue	# skipped after a kill
+				elif result:
+					rc = 2
+					self.output("Error processing: %s\n"%(usr.name()))
+					errfiles.append(usr.name())
+				else:
+					files.append(usr.name())
+
+		if self.status == Process.STATUS_KILLED:
+			self.output("*** Killed ***\n")
+			return rc
 
 		if rc:
 			self.message = ("Warning",
@@ -123,7 +140,31 @@ class DataProcess(FlairProcess.FlairProcess):
 		return rc
 
 	# --------------------------------------------------------------------
-	def _processUsrInfo(self, usr):
+	# Process one unit, executed in the thread pool
+	# @return True on error, False on success, None if skipped
+	# --------------------------------------------------------------------
+	def _processUnit(self, i, usr):
+		if self.status == Process.STATUS_KILLED: return None
+		self.message = ("Processing", usr.name())
+		try:
+			return self._processUsrInfo(usr,
+				lambda done,total: self._setProgress(i, float(done)/float(total)))
+		finally:
+			self._setProgress(i, 1.0)
+
+	# --------------------------------------------------------------------
+	# Update the progress of unit i and the overall percentage
+	# --------------------------------------------------------------------
+	def _setProgress(self, i, fraction):
+		self._progress[i] = fraction
+		self.percent = int(100.0*sum(self._progress)) // len(self._progress)
+
+	# --------------------------------------------------------------------
+	def _processUsrInfo(self, usr, progress=None):
+		if usr.cmd is None and DataMerge.numpy is not None \
+		   and usr.type in DataMerge.MERGERS:
+			return self._merge(usr, progress)
+
 		startTime = time.time()-2.0
 		# command, input
 		cmd,inp = usr.command()
@@ -173,3 +214,39 @@ class DataProcess(FlairProcess.FlairProcess):
 			self.output("Processed file is older than some of the dependencies (%g). "\
 					"Maybe the run is still going on?")
 		return not verify
+
+	# --------------------------------------------------------------------
+	# Merge cycles in process
+	# --------------------------------------------------------------------
+	def _merge(self, usr, progress=None):
+		startTime = time.time()-2.0
+		files = usr.depends()
+		if len(files) == 0:
+			self.output("\nWARNING: No files found for %s"%(usr.name()))
+			return True
+
+		self.output("\nProcessing: %s"%(usr.name()))
+		for fn in files:
+			self.output(">>> %s"%(fn))
+
+		merger = DataMerge.MERGERS[usr.type](files, usr.name())
+		try:
+			merger.scan()
+			if merger.upToDate():
+				self.output("%s is up to date"%(usr.name()))
+				return False
+			self.output("Merging %d new cycles of %s, %d already merged" \
+				% (len(merger.cycles), usr.name(), merger.state.ncycle))
+			if not merger.merge(self._workers, progress, self.isKilled):
+				self.output("*** Killed ***")
+				return True
+		except (IOError, OSError, ValueError) as err:
+			self.output("ERROR merging %s: %s"%(usr.name(), str(err)))
+			self.message = ("Error", "ERROR merging %s"%(usr.name()))
+			return True
+
+		verify = usr.verify(startTime)
+		if not verify:
+			self.output("Processed file is older than some of the dependencies. "\
+					"Maybe the run is still going on?")
+		return not verify
@@ -37,7 +37,6 @@ __author__  = "Vasilis Vlachoudis"
 __email__   = "Vasilis.Vlachoudis@cern.ch"
 __version__ = "1"
 
-import tkFlair
 from Process import Process
 
 #===============================================================================
@@ -58,6 +57,7 @@ class FlairProcess(Process):
 			Process.clearStatus(self)
 			return self._clean()
 		except:
+			import tkFlair
 			tkFlair.addException()
 			return -1
 
@@ -74,6 +74,7 @@ class FlairProcess(Process):
 			Process.execute(self)
 			return self._execute()
 		except:
+			import tkFlair
 			tkFlair.addException()
 			raise
 #			return -1
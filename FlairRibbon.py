@@ -37,6 +37,7 @@ __author__ = "Vasilis Vlachoudis"
 __email__  = "Paola.Sala@mi.infn.it"
 
 import os
+import importlib
 #from log import say
 
 try:
@@ -603,3 +604,34 @@ class FlairPage(Ribbon.Page):		# <--- should be possible to be a toplevel as wel
 	# ----------------------------------------------------------------------
 	def configSave(self):
 		pass
+
+#===============================================================================
+# Placeholder of a page whose module is imported only when the page is
+# created or a page specific attribute is requested. The instance is then
+# converted to the real page class
+#===============================================================================
+class LazyPage(FlairPage):
+	#----------------------------------------------------------------------
+	def __init__(self, flair, module, classname, name, icon, show, **kw):
+		self._lazy = (module, classname)
+		FlairPage.__init__(self, flair, name, icon, show, **kw)
+
+	#----------------------------------------------------------------------
+	# Import the page module and convert to the real class
+	#----------------------------------------------------------------------
+	def load(self):
+		module, classname = self.__dict__.pop("_lazy")
+		self.__class__ = getattr(importlib.import_module(module), classname)
+		self.init()
+
+	#----------------------------------------------------------------------
+	def create(self, master):
+		self.load()
+		self.create(master)
+
+	#----------------------------------------------------------------------
+	def __getattr__(self, attr):
+		if attr.startswith("__") or "_lazy" not in self.__dict__:
+			raise AttributeError(attr)
+		self.load()
+		return getattr(self, attr)
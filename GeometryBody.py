@@ -1980,6 +1980,8 @@ class RepeatBodies(Frame):
 		pos = self.cardlist[-1].pos()+1
 
 		undoinfo = [self.flair.refreshUndo()]
+		clones   = []
+		matrices = []
 		for w in range(RepeatBodies.Nw):
 			v1 = w*bmath.Vector(RepeatBodies.W)
 			for v in range(RepeatBodies.Nv):
@@ -2008,10 +2010,13 @@ class RepeatBodies(Frame):
 								break
 							n += 1
 						bodynames[clone.sdum()] = True
+						clones.append(clone)
+						matrices.append(matrix)
 
-						undoinfo.append(self.flair.addCardUndo(clone, pos, True))
-						self.input.transformBody(clone, matrix)
-						pos += 1
+		# add all bodies at once and transform them in place
+		undoinfo.append(self.flair.addCardsUndo(clones, pos))
+		for clone, matrix in zip(clones, matrices):
+			self.input.transformBody(clone, matrix)
 
 		undoinfo.append(self.flair.refreshUndo())
 		self.flair.addUndo(undo.createListUndo(undoinfo,"Repeat bodies cards"))
@@ -5802,8 +5802,7 @@ class GeometryEditor(FlairRibbon.FlairPage):
 			try:
 				exp = csg.tokenize(region.extra())
 				csg.exp2rpn(exp)
-				csg.rpnorm(exp)
-				expnorm = csg.rpn2exp(exp)
+				expnorm = csg.normalize(exp)
 			except csg.CSGException:
 				self.flair.notify("Expansion Error",
 					"Region %s expansion error:\n%s"% \
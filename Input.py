@@ -43,7 +43,10 @@ import csg
 import sys
 import time
 import math
+import marshal
+import hashlib
 import struct
+import importlib.util
 import string
 from log import say
 from types import *
@@ -72,6 +75,16 @@ _useQUA    = True
 _useBOX    = False	# enable the use of BOX/ARB/WED
 _database  = "db/card.ini"
 
+# Parsed input cache
+CACHE_VERSION = 1
+_CACHE_MAGIC  = b"FLAIRINP"
+_CACHE_ATTR   = ("enable", "active", "invalid", "_what", "_sign", "_extra",
+		 "_comment", "_cindent", "_geo", "_type", "_userInvalid")
+
+# Precompiled card database, rebuilt whenever the database or this module change
+dbCache        = os.path.join(os.path.expanduser("~/.flair"), "card.cache")
+_DBCACHE_MAGIC = b"FLAIRDB"
+
 _NAMEPAT   = re.compile(r"^[A-Za-z_][A-Za-z0-9_.:!\$]*$")
 _REGIONPAT = re.compile(r"^\s*([A-Za-z_][A-Za-z0-9_.:!\$]*)\s*(-?\d+)\s*(.*)$")
 _VOXELPAT  = re.compile(r"^VOX[E]?[L]?(\d+)$")
@@ -133,6 +146,12 @@ _INDENT_DEC    = ("#elif", "#else", "#endif", "#endinclude",
 		  "$end_expansion", "$end_translat", "$end_transform")
 _PREPRO_BLOCK  = ("#if", "#ifdef", "#ifndef", "#elif", "#else", "#endif")
 
+# Cards that change the region/material numbering
+_NUMBERED_TAGS = ("REGION", "MATERIAL", "ASSIGNMA", "VOXELS")
+
+# First character of what expressions that must be evaluated
+_EXPR_START    = ("=", "(", "[", "{")
+
 # Region types
 REGION_NORMAL    = 0
 REGION_BLACKHOLE = 1
@@ -270,26 +289,99 @@ for name in dir(math):
 	if name[0]=="_": continue
 	_globalDict[name] = getattr(math, name)
 
+#-------------------------------------------------------------------------------
+# Compiled what expressions {what: (code, names, volatile)}
+# volatile expressions are calling functions that read other cards
+# and their value cannot be cached
+#-------------------------------------------------------------------------------
+_compiledWhat = {}
+_COMPILED_MAX = 20000
+_VOLATILE     = frozenset(("w", "W", "b", "C"))
+
+#-------------------------------------------------------------------------------
+def _codeNames(code, names):
+	names.update(code.co_names)
+	for c in code.co_consts:
+		if hasattr(c, "co_names"): _codeNames(c, names)
+	return names
+
+#-------------------------------------------------------------------------------
+def _compileWhat(w):
+	try:
+		return _compiledWhat[w]
+	except KeyError:
+		pass
+	if w[0]=="=":
+		expr = w[1:]
+	else:
+		expr = w
+	# Check for possible vector definitions
+	# replace any { to Vector( and } to )
+	expr = expr.replace("{","Vector(")
+	expr = expr.replace("}",")")
+	#expr = expr.replace("[[","Matrix(")
+	#expr = expr.replace("]]",")")
+	code  = compile(expr, "<what>", "eval")
+	names = frozenset(_codeNames(code, set()))
+	if len(_compiledWhat) >= _COMPILED_MAX: _compiledWhat.clear()
+	entry = _compiledWhat[w] = (code, names, not _VOLATILE.isdisjoint(names))
+	return entry
+
 #===============================================================================
 # Local Dictionary
 #===============================================================================
 class LocalDict(dict):
 	"""Implement the local dictionary"""
 	def __init__(self, input):
-		self.input = input
-		self.card  = None
+		self.input      = input
+		self.card       = None
+		self.generation = 0	# incremented when all values are invalid
+		self.version    = {}	# version of every variable {name:int}
+		self.deps       = []	# stack of variables used while evaluating
 		self.clear()
 
 	# ----------------------------------------------------------------------
 	# Clear dictionary and set default variables
 	# ----------------------------------------------------------------------
 	def clear(self):
+		self.generation += 1
 		dict.clear(self)
 		self["w"] = lambda w,s=self:     s.card.numWhat(w)
 		self["W"] = lambda w,s=self:     s.card.evalWhat(w)
 		self["b"] = lambda n,w,s=self:   s.bodyWhat(n,w)
 		self["C"] = lambda t,n,w,s=self: s.cardWhat(t,n,w)
 
+	# ----------------------------------------------------------------------
+	def __setitem__(self, item, value):
+		self.changed(item)
+		dict.__setitem__(self, item, value)
+
+	# ----------------------------------------------------------------------
+	def __delitem__(self, item):
+		self.changed(item)
+		dict.__delitem__(self, item)
+
+	# ----------------------------------------------------------------------
+	# Variable (or #define) item has changed, invalidate values using it
+	# ----------------------------------------------------------------------
+	def changed(self, item):
+		self.version[item] = self.version.get(item,0) + 1
+
+	# ----------------------------------------------------------------------
+	# Return a stamp with the versions of the variables in deps
+	# ----------------------------------------------------------------------
+	def stamp(self, deps):
+		version = self.version
+		return (self.generation, tuple([(x, version.get(x,0)) for x in deps]))
+
+	# ----------------------------------------------------------------------
+	def valid(self, stamp):
+		if stamp[0] != self.generation: return False
+		version = self.version
+		for x,v in stamp[1]:
+			if version.get(x,0) != v: return False
+		return True
+
 	# ----------------------------------------------------------------------
 	# Default getitem
 	# ----------------------------------------------------------------------
@@ -298,20 +390,17 @@ class LocalDict(dict):
 			return dict.__getitem__(self,item)
 		except:
 			# check defines
-			defines = self.input.cardsCache("#define")
-			# dummy linear search
-			for define in defines:
-				if define.ignore(): continue
-				if define.sdum().strip()==item:
-					# Convert to int or float if possible
-					val = define.evalWhat(1)
-					try:
-						f = float(val)
-						if float(int(f)) == f:
-							return int(f)
-						return f
-					except:
-						return val
+			define = self.input.define(item)
+			if define is not None:
+				# Convert to int or float if possible
+				val = define.evalWhat(1)
+				try:
+					f = float(val)
+					if float(int(f)) == f:
+						return int(f)
+					return f
+				except:
+					return val
 			if item not in _globalDict: return str(item)
 			# FIXME check for a card like BEAM(0,1)
 			#if cards: return lambda n,w,t=item,s=self: s.cardWhat(t,n,w)
@@ -326,17 +415,13 @@ class LocalDict(dict):
 
 	# ----------------------------------------------------------------------
 	def cardWhat(self, tag, name, what):
-		cards = self.input.cardsCache(tag)
-		if cards is None:
-			raise Exception("Card %s do not exist"%(tag))
 		if isinstance(name,str):
-			for card in cards:
-				if card.ignore(): continue
-				if card.sdum()==name:
-				#	return card.numWhat(what)
-					val = card.what(what)
-			raise Exception("No card %s with sdum=%s found\n"%(tag,name))
+			card = self.input.cardNamed(tag, name)
+			if card is None:
+				raise Exception("No card %s with sdum=%s found\n"%(tag,name))
+			val = card.what(what)
 		else:
+			cards = self.input.cardsCache(tag)
 			#return cards[name].numWhat(what)
 			val = cards[name].what(what)
 
@@ -410,8 +495,9 @@ class LowNeutMaterial:
 # CardInfo class
 #===============================================================================
 class CardInfo:
-	_db     = {}		# Card information dictionary
-	_funcs  = {}		# Caching compiled functions
+	_db      = {}		# Card information dictionary
+	_funcs   = {}		# Caching compiled functions
+	_lambdas = {}		# Functions of the compiled lambda expressions
 
 	def __init__(self, name, group, range_, extra, assert_, default, meaning):
 		if name[0] not in ("$","#"):
@@ -436,6 +522,7 @@ class CardInfo:
 		self.assertCode = []
 		self.whats      = []
 		self.useUnits   = False		# True if any case is using units
+		self._rules     = {}		# rule sets per case
 		if range_ is None: return
 		nwhats = 0
 		for r in range_:
@@ -582,8 +669,9 @@ class CardInfo:
 
 	# ----------------------------------------------------------------------
 	# Validate card: return a list of failing variables.
+	# @param timer	optional RuleTimer to accumulate the time of every rule
 	# ----------------------------------------------------------------------
-	def validate(self, card, case=None):
+	def validate(self, card, case=None, timer=None):
 		if self is CardInfo._db[None]:
 			return ["Error card"]
 
@@ -600,39 +688,142 @@ class CardInfo:
 		# 4. Check limits in USRxxx cards
 		# 5. Check logical units usage
 		# 6. Check duplicate name definition of bodies, regions...
-
-		# Check all fields
 		pb = []
+		if timer is None:
+			for name, rule in self.rules(case):
+				err = rule(card)
+				if err: pb.extend(err)
+		else:
+			timer.computed += 1
+			for name, rule in self.rules(case):
+				t0  = time.perf_counter()
+				err = rule(card)
+				timer.add(self.tag, name, time.perf_counter()-t0)
+				if err: pb.extend(err)
+		return pb
+
+	# ----------------------------------------------------------------------
+	# Validate a list of cards of this tag in one pass
+	# @return cards found invalid
+	# ----------------------------------------------------------------------
+	def validateCards(self, cards, timer=None):
+		invalid = []
+		for card in cards:
+			if card.ignore(): continue
+			if card.validate(timer=timer): invalid.append(card)
+		return invalid
+
+	# ----------------------------------------------------------------------
+	# Return the rule set of a case as a list of (name, rule) where
+	# rule(card) returns the list of problems or None
+	# The rules are created once on the first request
+	# ----------------------------------------------------------------------
+	def rules(self, case):
+		try:
+			return self._rules[case]
+		except KeyError:
+			pass
+
+		rules = []
 		for w,f,c in self.rangeCode[case]:
+			# Plain fields without condition cannot fail
+			if c is None and f not in ("i", "l", "r", "pi", "spi"): continue
+			rules.append(("w(%d) %s"%(w, self.range[case][w]),
+					CardInfo._rangeRule(w, f, CardInfo._function(c, globals()))))
+
+		# Check all assert statements
+		if self.assertTrue:
+			for i,(whats,code) in enumerate(self.assertCode[case]):
+				if not whats: continue
+				statement = self.assertTrue[case][i]
+				rules.append(("assert %s"%(statement),
+					CardInfo._assertRule(whats, statement,
+						CardInfo._function(code, _globalDict))))
+
+		# Special checks
+		if self.tag == "REGION":
+			rules.append(("expression", CardInfo._regionRule))
+		elif "Geometry" in self.group and len(self.tag) == 3 and self.tag!="END":
+			rules.append(("name", CardInfo._nameRule))
+		elif self.tag == "COMPOUND":
+			rules.append(("nesting", CardInfo._compoundRule))
+
+		self._rules[case] = rules
+		return rules
+
+	# ----------------------------------------------------------------------
+	# Return the function of a compiled lambda expression
+	# ----------------------------------------------------------------------
+	@staticmethod
+	def _function(code, globals_):
+		if code is None: return None
+		try:
+			return CardInfo._lambdas[code]
+		except KeyError:
+			func = eval(code, globals_)
+			CardInfo._lambdas[code] = func
+			return func
+
+	# ----------------------------------------------------------------------
+	# Rule checking the type and range of what w
+	# ----------------------------------------------------------------------
+	@staticmethod
+	def _rangeRule(w, f, func):
+		# Specialized versions of the most common rules
+		if f=='r' and func is None:
+			def rule(card):
+				x = card.evalWhat(w)
+				if x=="": return None	# Use default
+				try: float(x)
+				except:
+					try: float(re.sub("[dD]","e",x))
+					except: return [w]
+				return None
+			return rule
+
+		elif f=='i':
+			def rule(card):
+				x = card.evalWhat(w)
+				if x=="": return None	# Use default
+				try:
+					xi = int(float(x))
+					if abs(float(x)-float(xi))>1e-9:
+						return [w]
+				except:
+					return [w]
+				try:
+					if func and not func(xi):
+						return [w]
+				except:
+					return [w]
+				return None
+			return rule
+
+		def rule(card):
 			x = card.evalWhat(w)
-			if x=="": continue	# Use default
+			if x=="": return None	# Use default
 
+			pb = []
 			if f=='i':
 				try:
 					xi = int(float(x))
 					if abs(float(x)-float(xi))>1e-9:
-						pb.append(w)
-						continue
+						return [w]
 					x = xi
 				except:
-					#x = 0
-					pb.append(w)
-					continue
+					return [w]
 
 			elif f=='l':
 				try:
 					xi = int(float(x))
 					if abs(float(x)-float(xi))>1e-9:
-						pb.append(w)
-						continue
+						return [w]
 					x = xi
 					# Special patch for RADDECAY to restore
 					# the long type instead of float
 					card.setWhat(w, xi)
 				except:
-					#x = 0
-					pb.append(w)
-					continue
+					return [w]
 
 			elif f=='r':
 				try: x = float(x)
@@ -641,8 +832,7 @@ class CardInfo:
 					#try: x = float(re.sub("[dD]","e",x.replace(" ","")))
 					try: x = float(re.sub("[dD]","e",x))
 					except:
-						pb.append(w)
-						continue
+						return [w]
 
 			elif f=='f':
 				if x=="" and w>0: x = 0
@@ -662,63 +852,78 @@ class CardInfo:
 
 			# FIXME ri, mi, bi, di, vi
 			try:
-				if c and not eval(c)(x):
+				if func and not func(x):
 					pb.append(w)
 			except:
 				pb.append(w)
+			return pb
+		return rule
 
-		# Check all assert statements
-		if self.assertTrue:
-			for i,(whats,code) in enumerate(self.assertCode[case]):
-				if whats and not eval(code,_globalDict)(card):
-					pb.extend(whats)
-					pb.append("Assertion failed: %s"%(self.assertTrue[case][i]))
-
-		# Special check for regions
-		if card.tag == "REGION":
-			sdum = card.sdum()
-			if sdum!="&" and not _NAMEPAT.match(sdum):
-				pb.append(0)
-			exp = csg.tokenize(card.extra())
-			# Check expression
-			try:
-				csg.exp2rpn(exp)
-				if exp and not csg.check(exp):
-					pb.append(-1)
-					pb.append("Invalid expression")
-				else:
-					bodies = card.input.cardsCache("bodies")
-					notadded = True
-					for token in exp:
-						if token in ("-", "+", "|", "@"):
-							continue
-						elif _NAMEPAT.match(token):
-							# XXX Check in body list
-							if token not in bodies:
-								if notadded:
-									pb.append(-1)
-									notadded = False
-								pb.append("Invalid body %r"%(token))
-						else:
+	# ----------------------------------------------------------------------
+	@staticmethod
+	def _assertRule(whats, statement, func):
+		def rule(card):
+			if not func(card):
+				return whats + ["Assertion failed: %s"%(statement)]
+			return None
+		return rule
+
+	# ----------------------------------------------------------------------
+	# Special check for regions
+	# ----------------------------------------------------------------------
+	@staticmethod
+	def _regionRule(card):
+		pb = []
+		sdum = card.sdum()
+		if sdum!="&" and not _NAMEPAT.match(sdum):
+			pb.append(0)
+		exp = csg.tokenize(card.extra())
+		# Check expression
+		try:
+			csg.exp2rpn(exp)
+			if exp and not csg.check(exp):
+				pb.append(-1)
+				pb.append("Invalid expression")
+			else:
+				bodies = card.input.cardsCache("bodies")
+				notadded = True
+				for token in exp:
+					if token in ("-", "+", "|", "@"):
+						continue
+					elif _NAMEPAT.match(token):
+						# XXX Check in body list
+						if token not in bodies:
 							if notadded:
 								pb.append(-1)
 								notadded = False
-							pb.append("Invalid token %r"%(token))
-			except csg.CSGException:
-				pb.append(-1)
-				pb.append("Unbalanced parenthesis")
-
-		elif card.isGeo() and len(card.tag) == 3 and card.tag!="END":
-			if not _NAMEPAT.match(card.sdum()):
-				pb.append(0)
+							pb.append("Invalid body %r"%(token))
+					else:
+						if notadded:
+							pb.append(-1)
+							notadded = False
+						pb.append("Invalid token %r"%(token))
+		except csg.CSGException:
+			pb.append(-1)
+			pb.append("Unbalanced parenthesis")
+		return pb
 
-		elif card.tag == "COMPOUND":
-			# Check for nesting compounds
-			# XXX for them moment on level checking
-			for w in range(2,7,2):
-				if card.evalWhat(w) == card.sdum():
-					pb.append(w)
+	# ----------------------------------------------------------------------
+	@staticmethod
+	def _nameRule(card):
+		if not _NAMEPAT.match(card.sdum()):
+			return [0]
+		return None
 
+	# ----------------------------------------------------------------------
+	# Check for nesting compounds
+	# XXX for them moment on level checking
+	# ----------------------------------------------------------------------
+	@staticmethod
+	def _compoundRule(card):
+		pb = []
+		for w in range(2,7,2):
+			if card.evalWhat(w) == card.sdum():
+				pb.append(w)
 		return pb
 
 	# ----------------------------------------------------------------------
@@ -764,7 +969,7 @@ class CardInfo:
 					card.setWhat(i, "")
 					continue
 				# FIXME to correct treatment of defines...
-				lst = card.input.materialList()
+				lst = card.input._materialNumbers()[0]
 				aw -= 1
 				if aw >= len(lst):
 					card.setAbsWhat(i, "@LASTMAT")
@@ -893,6 +1098,41 @@ class CardInfo:
 	def none():
 		return CardInfo._db[None]
 
+#===============================================================================
+# Accumulate the number of calls and time spent on every validation rule
+#===============================================================================
+class RuleTimer:
+	def __init__(self):
+		self.rules    = {}	# {(tag, rule): [calls, time]}
+		self.cards    = 0	# cards validated
+		self.computed = 0	# cards validated without the cache
+
+	# ----------------------------------------------------------------------
+	def add(self, tag, rule, dt):
+		try:
+			item = self.rules[(tag, rule)]
+		except KeyError:
+			item = self.rules[(tag, rule)] = [0, 0.0]
+		item[0] += 1
+		item[1] += dt
+
+	# ----------------------------------------------------------------------
+	def total(self):
+		return sum([x[1] for x in self.rules.values()])
+
+	# ----------------------------------------------------------------------
+	# Return a report of the n slowest rules
+	# ----------------------------------------------------------------------
+	def report(self, n=20):
+		lines = ["Validation: %d cards, %d cached, %.1f ms in rules" \
+			% (self.cards, self.cards-self.computed, self.total()*1000.0),
+			"%10s %10s %8s  %-8s %s"%("Total[ms]", "Calls", "Avg[us]", "Tag", "Rule")]
+		items = sorted(self.rules.items(), key=lambda x:x[1][1], reverse=True)
+		for (tag, rule), (calls, t) in items[:n]:
+			lines.append("%10.2f %10d %8.1f  %-8s %s" \
+				% (t*1000.0, calls, t*1e6/calls, tag, rule))
+		return "\n".join(lines)
+
 #===============================================================================
 # Logical Units
 #===============================================================================
@@ -969,12 +1209,12 @@ class LogicalUnits:
 			if u is None: return i
 
 	#-----------------------------------------------------------------------
-	# FIXME needs optimisation, we should find all cards using units in the
-	# CardInfo and search only those cards
+	# Scan only the cards that are using units in their CardInfo
 	#-----------------------------------------------------------------------
 	def scan(self, input):
 		self.reset()
 		for card in input.cardlist:
+			if not card.info.useUnits: continue
 			# Ignore cards that use only as readonly SPECSOUR, OPEN is special
 			if card.tag in ("OPEN","SPECSOUR"): continue
 			for u in card.units():
@@ -1381,6 +1621,10 @@ class Card:
 	REGION  = 2
 	OBJECT  = 3
 
+	_evalCache = None	# cached evaluated whats {n:(what,stamp,value,deps)}
+	_strCache  = None	# cached card string (fmt,prefix,localDict,stamp,deps,str)
+	_validCache= None	# cached case and validation {key:(localDict,stamp,deps,bodies,value)}
+
 	# ----------------------------------------------------------------------
 	def __init__(self, tag, what=None, comment="", extra=""):
 		"""Initialise a fluka card
@@ -1397,9 +1641,9 @@ class Card:
 		self.enable  = True	# Enable or Disabled
 		self.active  = True	# Preprocessor activate/deactivate
 		#self.expand  = True	# Show or hide card and subcontents
+		self.input   = None	# input class holding card
 		self.invalid = None	# Valid or invalid card
 		self.prop    = None	# User properties
-		self.input   = None	# input class holding card
 		self.tag     = tag	# card tag
 		self._what   = what	# what list
 		self._owhat  = what	# original what list as read from input
@@ -1416,7 +1660,17 @@ class Card:
 	# ----------------------------------------------------------------------
 	def setModified(self):
 		"""set last time modified"""
-		self._modified = time.time()
+		self._modified   = time.time()
+		self._strCache   = None
+		self._validCache = None
+		input = self.input
+		if input is None: return
+		if self.tag[0] == "#":
+			input._preprocessed = None
+			if self.tag == "#define":
+				input.localDict.changed(self.sdum().strip())
+		elif self.tag in _NUMBERED_TAGS:
+			input._numbersChanged(self.tag)
 
 	# ----------------------------------------------------------------------
 	# Change tag of card, reduce the number of whats to the new card
@@ -1425,6 +1679,7 @@ class Card:
 	def changeTag(self, tag, truncate=True):
 		"""change tag of card"""
 		self.tag = tag
+		self._validCache = None
 		# find card information from _cardInfo dictionary
 		self.info = CardInfo.get(tag)
 		if self.info.name == ERROR: return
@@ -1706,19 +1961,67 @@ class Card:
 	# Return card's cardInfo case (range)
 	# ----------------------------------------------------------------------
 	def case(self):
-		return self.info.findCase(self)
+		info = self.info
+		if len(info.rangeCode)<=1: return 0
+		return self._cachedCheck("case", info.findCase, self)
 
 	# ----------------------------------------------------------------------
-	# Validate card values
+	# Validate card values, the result is cached until the card or the
+	# variables it depends on are modified
 	# ----------------------------------------------------------------------
-	def validate(self, case=None):
-		self.invalid = self.info.validate(self, case)
+	def validate(self, case=None, timer=None):
+		if timer is not None: timer.cards += 1
+		self.invalid = list(self._cachedCheck(case,
+					self.info.validate, self, case, timer))
 		if self._userInvalid:
 			for item in self._userInvalid:
 				if item not in self.invalid:
 					self.invalid.append(item)
 		return self.invalid
 
+	# ----------------------------------------------------------------------
+	# Return the cached result of func(*args) stored under key, or call it
+	# recording the variables used as in formatStr
+	# REGION results depend also on the bodies cache of the input
+	# ----------------------------------------------------------------------
+	def _cachedCheck(self, key, func, *args):
+		input = self.input
+		if input is None: return func(*args)
+
+		localDict = input.localDict
+		cache = self._validCache
+		if cache is not None:
+			try:
+				ld, stamp, deps, bodies, value = cache[key]
+			except KeyError:
+				pass
+			else:
+				if (bodies is None or bodies is input.cache.get("bodies")) and \
+				   (stamp is None or (ld is localDict and localDict.valid(stamp))):
+					if deps and localDict.deps: localDict.deps[-1].update(deps)
+					return value
+
+		deps = set()
+		localDict.deps.append(deps)
+		try:
+			value = func(*args)
+		finally:
+			localDict.deps.pop()
+			if localDict.deps: localDict.deps[-1].update(deps)
+
+		if None not in deps:
+			if self.tag == "REGION":
+				bodies = input.cache.get("bodies")
+			else:
+				bodies = None
+			if deps:
+				stamp = localDict.stamp(deps)
+			else:
+				stamp = None
+			if self._validCache is None: self._validCache = {}
+			self._validCache[key] = (localDict, stamp, deps, bodies, value)
+		return value
+
 	# ----------------------------------------------------------------------
 	# FIXME this check should be done in the invalid
 	# ----------------------------------------------------------------------
@@ -1795,6 +2098,30 @@ class Card:
 	def indent(self):	return max(0,self._indent)
 	name = sdum
 
+	# ----------------------------------------------------------------------
+	# Position and indent level in the input. They are renumbered lazily
+	# by the input after insertions or deletions, when first requested
+	# ----------------------------------------------------------------------
+	@property
+	def _pos(self):
+		if self.input is not None and self.input._renumberFrom is not None:
+			self.input._renumberPending()
+		return self._cpos
+
+	@_pos.setter
+	def _pos(self, pos):
+		self._cpos = pos
+
+	@property
+	def _indent(self):
+		if self.input is not None and self.input._renumberFrom is not None:
+			self.input._renumberPending()
+		return self._cindent
+
+	@_indent.setter
+	def _indent(self, indent):
+		self._cindent = indent
+
 	# ----------------------------------------------------------------------
 	# Compare position
 	# ----------------------------------------------------------------------
@@ -1859,25 +2186,33 @@ class Card:
 	# ----------------------------------------------------------------------
 	# Return evaluated what
 	# ----------------------------------------------------------------------
+	# The values of expressions are cached per card together with the
+	# versions of the variables/#defines they used
+	# ----------------------------------------------------------------------
 	def evalWhat(self, n, dollar=True):
 		"""return evaluated what if needed"""
 		w = self.what(n)
 		if isinstance(w,str) and w!="":
 			if w[0] in ("=","(","[","{"):
 				if self.input is None: return w
-				self.input.localDict.card = self
-				if w[0]=="=":
-					expr = w[1:]
-				else:
-					expr = w
-				# Check for possible vector definitions
-				# replace any { to Vector( and } to )
-				expr = expr.replace("{","Vector(")
-				expr = expr.replace("}",")")
-				#expr = expr.replace("[[","Matrix(")
-				#expr = expr.replace("]]",")")
+				localDict = self.input.localDict
+				cache = self._evalCache
+				if cache is not None:
+					try:
+						text, stamp, value, deps = cache[n]
+						if text == w and localDict.valid(stamp):
+							if localDict.deps: localDict.deps[-1].update(deps)
+							return value
+					except KeyError:
+						pass
+				localDict.card = self
+				deps = None
 				try:
-					value = eval(expr, _globalDict, self.input.localDict)
+					code, names, volatile = _compileWhat(w)
+					deps = set(names)
+					if volatile: deps.add(None)
+					localDict.deps.append(deps)
+					value = eval(code, _globalDict, localDict)
 				except:
 					say("\nERROR: "+self.rawStr())
 					say("ERROR: %s what(%d):%s"%(sys.exc_info()[1],n,str(w)))
@@ -1885,14 +2220,25 @@ class Card:
 						return self._owhat[n]
 					except:
 						return "?"
+				finally:
+					if deps is not None:
+						localDict.deps.pop()
+						if localDict.deps: localDict.deps[-1].update(deps)
 
 				try:
 					f = float(value)
 					if float(int(f)) == f:
-						return int(f)
-					return f
+						value = int(f)
+					else:
+						value = f
 				except:
-					return value
+					pass
+
+				# Cache only immutable values of non volatile expressions
+				if None not in deps and type(value) in (int, float, str):
+					if cache is None: cache = self._evalCache = {}
+					cache[n] = (w, localDict.stamp(deps), value, deps)
+				return value
 
 			elif dollar:
 				if w[0] == "$":
@@ -1908,23 +2254,22 @@ class Card:
 					return w
 
 				# check defines
-				defines = self.input.cardsCache("#define")
-				# dummy linear search
-				for define in defines:
-					if define.ignore(): continue
-					if define.sdum()==var:
-						val = define.evalWhat(1)
-						# Convert to int or float if possible
-						try:
-							f = sign*float(val)
-							if float(int(f)) == f:
-								return int(f)
-							return f
-						except:
-							if sign<0.0:
-								return "-"+str(val)
-							else:
-								return val
+				if self.input.localDict.deps:
+					self.input.localDict.deps[-1].add(var)
+				define = self.input.define(var)
+				if define is not None:
+					val = define.evalWhat(1)
+					# Convert to int or float if possible
+					try:
+						f = sign*float(val)
+						if float(int(f)) == f:
+							return int(f)
+						return f
+					except:
+						if sign<0.0:
+							return "-"+str(val)
+						else:
+							return val
 		return w
 
 	# ----------------------------------------------------------------------
@@ -2026,6 +2371,8 @@ class Card:
 	# Set the whats list
 	# ----------------------------------------------------------------------
 	def setWhats(self, whats):
+		if self.input is not None:
+			self.input._renameCard(self, whats[0] if whats else "")
 		self._what = whats
 		self.setModified()
 
@@ -2065,6 +2412,8 @@ class Card:
 				value = str(value)
 			else:
 				value = value.decode()
+			if w==0 and self.input is not None:
+				self.input._renameCard(self, value)
 			# Extend list if needed
 			if w>=len(self._what):
 				self._what.extend([""] * (w-len(self._what)+1))
@@ -2497,7 +2846,10 @@ class Card:
 				inext = i+6
 				imin  = min(inext, nwhats)
 				while i<imin:
-					w = self.evalWhat(i,False)
+					w = self._what[i]
+					# evaluate only expressions
+					if not isinstance(w, str) or w[:1] in _EXPR_START:
+						w = self.evalWhat(i,False)
 					if isinstance(w, int):	# for RADDECAY
 						w = str(w)
 					else:
@@ -2582,18 +2934,52 @@ class Card:
 	# return string with only the cards
 	# ----------------------------------------------------------------------
 	def toStr(self, fmt=None):
-		if not self.enable and (self.info.disableComment and commentedCards):
-			prefix = "*"
-		else:
-			prefix = ""
-
-		s = self._toStr(fmt, prefix)
+		s = self.formatStr(fmt)
 		#if not self.enable and self.info.disableComment: s = "*"+s
 		if isinstance(s,str):
 			return s.encode('utf-8')
 		else:
 			return s
 
+	# ----------------------------------------------------------------------
+	# return card string, reusing the one of the previous call if the card
+	# and the variables used in its expressions have not changed
+	# ----------------------------------------------------------------------
+	def formatStr(self, fmt=None):
+		if not self.enable and (self.info.disableComment and commentedCards):
+			prefix = "*"
+		else:
+			prefix = ""
+
+		# Expressions are evaluated only for cards in an input
+		if self.input is None: return self._toStr(fmt, prefix)
+
+		localDict = self.input.localDict
+		cache = self._strCache
+		if cache is not None and cache[0] == fmt and cache[1] == prefix:
+			if cache[2] is None:
+				return cache[5]
+			if cache[2] is localDict and localDict.valid(cache[3]):
+				if localDict.deps: localDict.deps[-1].update(cache[4])
+				return cache[5]
+
+		deps = set()
+		localDict.deps.append(deps)
+		try:
+			s = self._toStr(fmt, prefix)
+		finally:
+			localDict.deps.pop()
+			if localDict.deps: localDict.deps[-1].update(deps)
+
+		# GEOBEGIN depends on the ivopt and idbg set while writing
+		if self.tag != "GEOBEGIN":
+			if not deps:
+				self._strCache = (fmt, prefix, None, None, None, s)
+			elif None not in deps:
+				self._strCache = (fmt, prefix, localDict,
+						localDict.stamp(deps), deps, s)
+		return s
+
 	# ----------------------------------------------------------------------
 	def evalWhatStr(self):
 		"""return string for special evaluated whats"""
@@ -2930,9 +3316,16 @@ class Input:
 		self._prop           = []	# Commented card properties
 		self._comment        = ""	# Comment preceding card
 		self._nwhats         = 0	# Number of whats of last added card
+		self._fileSig        = {}	# Signature of files read {filename:(size,hash)}
 
 		# cache card lists
 		self.cache = {}
+		self._renumberFrom = None	# first card position to renumber
+		self._names   = {}		# name index {tag:{name:[cards]}}
+		self._numbers = {}		# region/material numbering
+		self._preprocessed = None	# state of last preprocess
+		self.preprocessChanges = None	# cards changed by last preprocess
+		self._spans = None		# {id(card):[spans]} recorded by writeCard
 		self.setModified()
 		self.localDict = LocalDict(self)
 		if filename is not None:
@@ -2942,6 +3335,7 @@ class Input:
 	def setModified(self):
 		"""set last time modified"""
 		self._modified = time.time()
+		self._numbers.clear()
 
 	# ----------------------------------------------------------------------
 	def clone(self):
@@ -3032,6 +3426,9 @@ class Input:
 			except:
 				say("ERROR: Cannot open file '%s'"%(filename))
 				f = open("/dev/null",mode)
+			else:
+				if mode=="r":
+					self._fileSig[filename] = _fileSignature(filename)
 		else:
 			f = filename
 
@@ -3048,6 +3445,14 @@ class Input:
 			self._lineNo.pop()
 			self._filesType.pop()
 
+	#-----------------------------------------------------------------------
+	# write the contents of an in memory buffer to file
+	#-----------------------------------------------------------------------
+	def _writeBuffer(self, filename, buf, backup=True):
+		f = self._openFile(filename, "w", backup=backup)
+		f.write(buf.getvalue())
+		self._closeFile()
+
 	#-----------------------------------------------------------------------
 	# read line from the last opened file
 	#-----------------------------------------------------------------------
@@ -3937,9 +4342,75 @@ class Input:
 
 		# Check if #include contains already imported cards
 		fromid = self.cardlist.index(includecard)
-		# Finding ending of #include
-		toid   = fromid+1
-		level  = 1
+		toid   = self._includeEnd(fromid)
+
+		# If range is not empty then return
+		if toid-fromid>1: return False
+
+		inp = self._parseInclude(fromid, includecard.sdum())
+		self._spliceCards(fromid+1, fromid+1, inp.cardlist)
+
+		self.scanUnits()
+		self.renumber(fromid)
+		self.setModified()
+
+		return True
+
+	#-----------------------------------------------------------------------
+	# Re-parse only the #include files that have changed since they were read
+	# @return	list of (from,to) card ranges that were replaced
+	#		None if the input or geometry file has changed and
+	#		the whole input has to be read again
+	#-----------------------------------------------------------------------
+	def reload(self):
+		for fn in (self.filename, self.geoFile):
+			if fn and (fn not in self._fileSig or \
+				   _fileSignature(fn) != self._fileSig[fn]):
+				return None
+
+		# Find the outermost changed includes, nested ones are
+		# re-parsed together with their parent
+		changed = []
+		end = -1
+		for card in sorted(self["#include"], key=attrgetter("_pos")):
+			if card._pos <= end or not card.enable: continue
+			fn = card.sdum()
+			if fn not in self._fileSig: continue
+			sig = _fileSignature(fn)
+			if sig == self._fileSig[fn]: continue
+			end = self._includeEnd(card._pos)
+			changed.append((card, end))
+
+		# Splice from the end so the positions in front remain valid
+		ranges = []
+		for card, end in reversed(changed):
+			fromid = card._pos
+			fn     = card.sdum()
+			if os.path.exists(fn):
+				inp = self._parseInclude(fromid, fn)
+				cards = inp.cardlist
+				if end < len(self.cardlist) and inp._comment:
+					self.cardlist[end].setComment(inp._comment)
+			else:
+				self._fileSig[fn] = None
+				cards = []
+			self._spliceCards(fromid+1, end, cards)
+			delta = len(cards) - (end-fromid-1)
+			ranges = [(f+delta, t+delta) for f,t in ranges]
+			ranges.insert(0, (fromid+1, fromid+1+len(cards)))
+
+		if ranges:
+			self.scanUnits()
+			self.setModified()
+			self.setFileTime()
+		return ranges
+
+	#-----------------------------------------------------------------------
+	# Return the position of the #endinclude matching the #include at pos
+	#-----------------------------------------------------------------------
+	def _includeEnd(self, pos):
+		toid  = pos+1
+		level = 1
 		while toid<len(self.cardlist):
 			card = self.cardlist[toid]
 			if card.tag == "#include":
@@ -3948,10 +4419,13 @@ class Input:
 				level -= 1
 				if level==0: break
 			toid += 1
+		return toid
 
-		# If range is not empty then return
-		if toid-fromid>1: return False
-
+	#-----------------------------------------------------------------------
+	# Parse the include filename as it appears at card position fromid
+	# @return a temporary input with the included cards
+	#-----------------------------------------------------------------------
+	def _parseInclude(self, fromid, filename):
 		# Create a temporary input to load the included lines
 		inp = Input()
 		location = 0	# 0=input, 1=bodies, 2=regions
@@ -3984,7 +4458,7 @@ class Input:
 			elif card.tag == "GEOEND":
 				location = 0
 
-		f = inp._openFile(includecard.sdum(),"r")
+		f = inp._openFile(filename,"r")
 		if location==0:
 			inp.parse()
 		elif location==1:
@@ -3996,18 +4470,38 @@ class Input:
 		else:
 			assert False
 		assert len(self._files)==0
+		self._fileSig.update(inp._fileSig)
+		return inp
 
-		pos = fromid+1
-		for card in inp.cardlist:
-			card.input = self
-			self.addCard(card, pos)
-			pos += 1
+	#-----------------------------------------------------------------------
+	# Replace the cards in the range [fromPos:toPos] with the cards list
+	#-----------------------------------------------------------------------
+	def _spliceCards(self, fromPos, toPos, cards):
+		removed = self.cardlist[fromPos:toPos]
+		for card in removed: self._names.pop(card.tag, None)
+		for card in cards:   self._names.pop(card.tag, None)
+		if removed:
+			ids = set(map(id, removed))
+			for tag in set([x.tag for x in removed]):
+				taglist = [x for x in self.cards[tag] if id(x) not in ids]
+				if taglist:
+					self.cards[tag] = taglist
+				else:
+					del self.cards[tag]
+			for card in removed:
+				card.input = None
+				card._pos  = -1
 
-		self.scanUnits()
-		self.renumber(fromid)
-		self.setModified()
+		for card in cards:
+			card.input = self
+			try:
+				self.cards[card.tag].append(card)
+			except KeyError:
+				self.cards[card.tag] = [card]
 
-		return True
+		self.cardlist[fromPos:toPos] = cards
+		self.clearCache()
+		self.renumber(fromPos)
 
 	#-----------------------------------------------------------------------
 	def writeWithInclude(self, filename, backup=True):
@@ -4156,7 +4650,8 @@ class Input:
 		if isinstance(filename, io.IOBase):
 			finp = filename
 		else:
-			finp = self._openFile(filename, "w", backup=backup)
+			# Format everything in memory and write it at once
+			finp = io.StringIO()
 
 		# Expressions
 		exprNotGeo = lambda x: not x._geo
@@ -4206,7 +4701,7 @@ class Input:
 		# if there is no geometry... then exit
 		if begin_ == len(self.cardlist):
 			if finp is not filename:
-				self._closeFile()
+				self._writeBuffer(filename, finp, backup)
 
 			self.setFileTime()
 			return False
@@ -4274,7 +4769,7 @@ class Input:
 		if self.cardlist[-1].tag != "STOP":
 			self.writeCard(finp, Card("STOP"), self.format)
 
-		if finp is not filename: self._closeFile()
+		if finp is not filename: self._writeBuffer(filename, finp, backup)
 
 		self.setFileTime()
 		return False
@@ -4411,24 +4906,64 @@ class Input:
 	# write a single card
 	#-----------------------------------------------------------------------
 	def writeCard(self, f, card, fmt):
+		spans = self._spans
+		if spans is not None:
+			spans = spans.get(id(card))
+			if spans is not None: start = f.tell()
+
+		# Build the whole card text and write it at once
 		if not card.enable and (not card.info.disableComment or not commentedCards):
 			if0 = True
-			f.write("#if 0\n")
+			lines = ["#if 0\n"]
 		else:
 			if0 = False
+			lines = []
 
-		if card.comment()!="":
-			utfWrite(f, card.commentStr())
-		es = card.evalWhatStr()
-		if es!="": utfWrite(f, es)
-		s = card.toStr(fmt)
-#		try:
-#			f.write("%s\n"%(s))
-#		except (UnicodeDecodeError, UnicodeEncodeError):
-#			f.write("%s\n"%(s.encode("utf-8")))
-		utfWriteln(f, s)
+		if card._comment!="":
+			lines.append(card.commentStr())
+		lines.append(card.evalWhatStr())
+		lines.append(card.formatStr(fmt))
+		lines.append("\n")
+
+		if if0: lines.append("#endif\n")
+		utfWrite(f, "".join(lines))
+		if spans is not None: spans.append((start, f.tell(), card, fmt))
+
+	#-----------------------------------------------------------------------
+	# Write the input to a string, recording the text span of each of the
+	# cards so it can be patched later without writing again everything
+	# Return (text, [(start,end,card,fmt),...]) or None if the input
+	# cannot be written to a single string (#include or geometry file)
+	#-----------------------------------------------------------------------
+	def writeSpans(self, cards):
+		if "#include" in self.cards or self.geoFile != "": return None
+		self._spans = dict((id(card),[]) for card in cards)
+		f = io.StringIO()
+		try:
+			self.write(f)
+			spans = [x for lst in self._spans.values() for x in lst]
+		finally:
+			self._spans = None
+		spans.sort(key=lambda x: x[0])
+		return f.getvalue(), spans
 
-		if if0: f.write("#endif\n")
+	#-----------------------------------------------------------------------
+	# Return text with the spans written again from the present
+	# state of their cards
+	#-----------------------------------------------------------------------
+	def patchSpans(self, text, spans):
+		out  = []
+		prev = 0
+		f    = io.StringIO()
+		for start, end, card, fmt in spans:
+			out.append(text[prev:start])
+			f.seek(0)
+			f.truncate()
+			self.writeCard(f, card, fmt)
+			out.append(f.getvalue())
+			prev = end
+		out.append(text[prev:])
+		return "".join(out)
 
 	#-----------------------------------------------------------------------
 	# Write cards of that fulfill a given condition(lambda)
@@ -4580,11 +5115,126 @@ class Input:
 				break
 			self.addCard(card)
 
-	#-----------------------------------------------------------------------
-	# Cards
-	#-----------------------------------------------------------------------
-	# Return cards of a specific tag sorted with _pos
-	# Possibilities on which:
+	# ----------------------------------------------------------------------
+	# Binary cache of the parsed input.
+	# The cache holds the state of the cards and units after read() (and
+	# any conversion done by the caller) together with the size and the
+	# hash of every file the input was read from. It is used only if
+	# none of the files has changed and it was written by the same
+	# version of the card database.
+	# ----------------------------------------------------------------------
+	def saveCache(self, cachefile):
+		"""save the parsed input into a binary cache file"""
+		self._renumberPending()
+		files = []
+		for fn in self.filenames():
+			try:
+				files.append((fn, self._fileSig[fn]))
+			except KeyError:
+				files.append((fn, _fileSignature(fn)))
+
+		cards = []
+		for card in self.cardlist:
+			d = card.__dict__
+			if card.prop:
+				prop = [x for x in card.prop.items()
+					if type(x[1]) in (int, float, bool, str, bytes)]
+			else:
+				prop = None
+			cards.append((card.tag, prop) + tuple([d[x] for x in _CACHE_ATTR]))
+
+		header = (CACHE_VERSION, _cacheStamp(), self.filename, os.getcwd(), files)
+		body   = (self.geoFile, self.geoOutFile, self.format, self.geoFormat,
+			  self.units.list, cards)
+
+		tmp = "%s.%d"%(cachefile, os.getpid())
+		try:
+			with open(tmp, "wb") as f:
+				f.write(_CACHE_MAGIC)
+				pickle.dump(header, f, pickle.HIGHEST_PROTOCOL)
+				pickle.dump(body,   f, pickle.HIGHEST_PROTOCOL)
+			os.replace(tmp, cachefile)
+		except (IOError, OSError, pickle.PicklingError):
+			say("WARNING: Cannot write input cache %s"%(cachefile))
+			try: os.remove(tmp)
+			except OSError: pass
+			return False
+		return True
+
+	# ----------------------------------------------------------------------
+	def loadCache(self, cachefile, filename):
+		"""load the input filename from cachefile if it is up to date,
+		   return True on success, False if the input has to be parsed"""
+		try:
+			f = open(cachefile, "rb")
+		except (IOError, OSError):
+			return False
+
+		try:
+			with f:
+				if f.read(len(_CACHE_MAGIC)) != _CACHE_MAGIC: return False
+				version, stamp, fn, cwd, files = pickle.load(f)
+				if version != CACHE_VERSION or stamp != _cacheStamp() or \
+				   fn != filename or cwd != os.getcwd():
+					return False
+				for fn, sig in files:
+					if _fileSignature(fn) != sig: return False
+				geoFile, geoOutFile, fmt, geoFmt, units, cards = pickle.load(f)
+		except Exception:
+			say("WARNING: Ignoring corrupted input cache %s"%(cachefile))
+			return False
+
+		self.filename   = filename
+		self.geoFile    = geoFile
+		self.geoOutFile = geoOutFile
+		self.format     = fmt
+		self.geoFormat  = geoFmt
+		self.units.list = units
+		self._fileSig   = dict(files)
+
+		# Recreate the cards without going through the parser
+		cardlist = self.cardlist
+		tagcards = self.cards
+		new      = Card.__new__
+		info     = CardInfo.get
+		now      = time.time()
+		for pos,item in enumerate(cards):
+			card = new(Card)
+			card.__dict__.update(zip(_CACHE_ATTR, item[2:]))
+			card.tag       = item[0]
+			card.info      = info(item[0])
+			card.input     = self
+			card.prop      = None
+			card._owhat    = card._what
+			card._pos      = pos
+			card._modified = now
+			if item[1]:
+				for n,v in item[1]:
+					card[n] = v
+			try:
+				tagcards[card.tag].append(card)
+			except KeyError:
+				tagcards[card.tag] = [card]
+			cardlist.append(card)
+
+		for card in self["VOXELS"]:
+			try:
+				card.loadVoxel()
+			except:
+				say("ERROR: loading voxel file %s.vxl"%(card.sdum()))
+				say(sys.exc_info()[1])
+
+		self._names.clear()
+		self._preprocessed = None
+		self.setModified()
+		self.setFileTime()
+		return True
+
+	#-----------------------------------------------------------------------
+	# Cards
+	#-----------------------------------------------------------------------
+	# Return cards of a specific tag sorted with _pos
+	# Possibilities on which:
 	#	0: enabled and active	(requires a call to preprocess before)
 	#	1: enabled
 	#	2: all
@@ -4689,8 +5339,95 @@ class Input:
 		if tag is not None:
 			try: del self.cache[tag]
 			except KeyError: pass
+			if tag == "#define":
+				self.localDict.generation += 1
 		else:
 			self.cache.clear()
+			self._numbers.clear()
+			self.localDict.generation += 1
+
+	#-----------------------------------------------------------------------
+	# Return the first active #define card with name, or None
+	#-----------------------------------------------------------------------
+	def define(self, name):
+		return self.cardNamed("#define", name)
+
+	#-----------------------------------------------------------------------
+	# Name index {tag:{name:[cards]}}, created on demand for every tag
+	# and kept up to date when cards are added, deleted or renamed
+	#-----------------------------------------------------------------------
+	def _nameIndex(self, tag):
+		try:
+			return self._names[tag]
+		except KeyError:
+			index = {}
+			for card in self.cards.get(tag, ()):
+				index.setdefault(card.sdum(), []).append(card)
+			self._names[tag] = index
+			return index
+
+	#-----------------------------------------------------------------------
+	def _indexAdd(self, card):
+		index = self._names.get(card.tag)
+		if index is not None:
+			index.setdefault(card.sdum(), []).append(card)
+
+	#-----------------------------------------------------------------------
+	def _indexDel(self, card, name=None):
+		index = self._names.get(card.tag)
+		if index is None: return
+		if name is None: name = card.sdum()
+		cards = index.get(name)
+		if cards is None: return
+		try: cards.remove(card)
+		except ValueError: pass
+		if not cards: del index[name]
+
+	#-----------------------------------------------------------------------
+	# Card name (sdum) is going to change
+	#-----------------------------------------------------------------------
+	def _renameCard(self, card, name):
+		old  = card.sdum()
+		name = str(name)
+		if old == name: return
+		if card.tag == "#define":
+			self.localDict.changed(old.strip())
+		if card.tag in self._names:
+			self._indexDel(card, old)
+			self._names[card.tag].setdefault(name, []).append(card)
+
+	#-----------------------------------------------------------------------
+	# Return the list of cards with tag(s) and name sorted by position
+	#-----------------------------------------------------------------------
+	def cardsNamed(self, tag, name):
+		if isinstance(tag, str):
+			cards = self._nameIndex(tag).get(name, ())
+			if len(cards) < 2: return list(cards)
+		else:
+			cards = []
+			for t in tag:
+				cards.extend(self._nameIndex(t).get(name, ()))
+		return sorted(cards, key=attrgetter("_pos"))
+
+	#-----------------------------------------------------------------------
+	# Return the first active card with tag(s) and name, or None
+	#-----------------------------------------------------------------------
+	def cardNamed(self, tag, name):
+		for card in self.cardsNamed(tag, name):
+			if card.notIgnore(): return card
+		return None
+
+	#-----------------------------------------------------------------------
+	# Invalidate the region/material numbering after a change in tag cards
+	#-----------------------------------------------------------------------
+	def _numbersChanged(self, tag=None):
+		if tag == "REGION":
+			self._numbers.pop(("REGION",), None)
+		elif tag == "ASSIGNMA":
+			for key in [x for x in self._numbers if x[0]=="ASSIGNMA"]:
+				del self._numbers[key]
+		else:
+			self._numbers.clear()
 
 	#-----------------------------------------------------------------------
 	# Find best position from the sorting order in the file
@@ -4743,7 +5480,8 @@ class Input:
 
 	#-----------------------------------------------------------------------
 	# Add a card to list at position pos
-	# WARNING: renumber is False (on contrast with delCard, moveCard)
+	# Inserting before the end marks the following cards for a lazy
+	# renumbering, the renumber flag is kept for compatibility
 	#-----------------------------------------------------------------------
 	def addCard(self, card, pos=None, renumber=False):
 		card.input = self		# Keep input file link
@@ -4755,54 +5493,76 @@ class Input:
 			self.cards[card.tag] = taglist
 
 		taglist.append(card)		# Local (tag list)
+		self._indexAdd(card)
 
-		prevCard = None
-		if pos is None or pos>=len(self.cardlist):
-			if self.cardlist:
-				prevCard = self.cardlist[-1]	# Find prev card
-			self.cardlist.append(card)	# Global cardlist
-			card._pos = len(self.cardlist)-1
-		else:
-			if pos>0: prevCard = self.cardlist[pos-1]
-			self.cardlist.insert(pos, card)
-			card._pos = pos
-
-		# Check indent level of previous card
-		if prevCard and prevCard.enable:
-			if card.enable and prevCard.tag in _INDENT_INC:
-				card._indent = prevCard._indent + 1
+		cardlist = self.cardlist
+		if pos is None or pos>=len(cardlist):
+			cardlist.append(card)		# Global cardlist
+			card._cpos = len(cardlist)-1
+
+			# Check indent level of previous card
+			# (if a renumbering is pending it will be set then)
+			if self._renumberFrom is None:
+				prevCard = cardlist[-2] if len(cardlist)>1 else None
+				if prevCard and prevCard.enable:
+					indent = prevCard._cindent
+					if card.enable and prevCard.tag in _INDENT_INC:
+						indent += 1
+				else:
+					indent = 0
+				if card.enable and card.tag in _INDENT_DEC:
+					indent = max(0,indent-1)
+				card._cindent = indent
 			else:
-				card._indent = prevCard._indent
+				card._cindent = 0
 		else:
-			card._indent = 0
+			cardlist.insert(pos, card)
+			card._cpos    = pos
+			card._cindent = 0
+			self.renumber(pos)
 
-		if card.enable and card.tag in _INDENT_DEC:
-			card._indent = max(0,card._indent-1)
-
-		if renumber:
-			p = pos
-			if p is None: p = 0
-			self.renumber(p)
 		self.setModified()
 		return card
 
+	#-----------------------------------------------------------------------
+	# Add a list of cards at position pos (None to append) with a single
+	# list insertion and one lazy renumbering
+	#-----------------------------------------------------------------------
+	def addCards(self, cards, pos=None):
+		if pos is None or pos>len(self.cardlist):
+			pos = len(self.cardlist)
+		self._spliceCards(pos, pos, cards)
+		self.setModified()
+		return cards
+
+	#-----------------------------------------------------------------------
+	# Delete n cards starting from position pos
+	# @return list of deleted cards
+	#-----------------------------------------------------------------------
+	def delCards(self, pos, n):
+		cards = self.cardlist[pos:pos+n]
+		self._spliceCards(pos, pos+n, [])
+		self.setModified()
+		return cards
+
 	#-----------------------------------------------------------------------
 	# Delete card by position
 	#-----------------------------------------------------------------------
 	def delCard(self, pos, renumber=True):
 		card = self.cardlist[pos]
-		card._pos  = -1
 		card.input = None
+		card._pos  = -1
 		tag = card.tag
 
 		# Delete from the main list
 		del self.cardlist[pos]
-		if renumber: self.renumber(pos)
+		self.renumber(pos)
 
 		# Find tag list
 		taglist = self.cards[tag]
 		taglist.remove(card)
 		if len(taglist)==0: del self.cards[tag]
+		self._indexDel(card)
 		self.setModified()
 
 	#-----------------------------------------------------------------------
@@ -4810,15 +5570,18 @@ class Input:
 	#-----------------------------------------------------------------------
 	def delTag(self, tag, renumber=True):
 		try:
-			for card in self.cards[tag]:
-				card._pos  = -1
-				card.input = None
-				self.cardlist.remove(card)
-			del self.cards[tag]
+			cards = self.cards.pop(tag)
 		except KeyError:
 			return
+		self._names.pop(tag, None)
 
-		if renumber: self.renumber()
+		ids = set(map(id, cards))
+		self.cardlist[:] = [x for x in self.cardlist if id(x) not in ids]
+		for card in cards:
+			card.input = None
+			card._pos  = -1
+
+		self.renumber()
 		self.setModified()
 
 	#-----------------------------------------------------------------------
@@ -4843,9 +5606,11 @@ class Input:
 		# Remove from previous list
 		cl = self.cards[card.tag]
 		cl.remove(card)
+		self._indexDel(card)
 
 		# change the tag
 		card.changeTag(newtag)
+		self._indexAdd(card)
 
 		# Add to new list
 		try:
@@ -4854,6 +5619,7 @@ class Input:
 			taglist = []
 			self.cards[card.tag] = taglist
 		taglist.append(card)
+		self._preprocessed = None
 		self.setModified()
 
 	#-----------------------------------------------------------------------
@@ -4864,8 +5630,7 @@ class Input:
 		del self.cardlist[src]
 		if dest >= src: dest -= 1
 		self.cardlist.insert(dest, card)
-		if renumber:
-			self.renumber(min(dest, src), max(dest,src)+1)
+		self.renumber(min(dest, src))
 		self.setModified()
 
 	#-----------------------------------------------------------------------
@@ -4883,6 +5648,7 @@ class Input:
 		taglist = self.cards[old.tag]
 		taglist.remove(old)
 		if len(taglist)==0: del self.cards[old.tag]
+		self._indexDel(old)
 
 		# add the new to the taglist
 		try:
@@ -4891,8 +5657,10 @@ class Input:
 		except KeyError:
 			taglist = [card]
 			self.cards[card.tag] = taglist
-		card._pos  = pos
+		self._indexAdd(card)
 		card.input = self
+		card._pos  = pos
+		card._indent = old._cindent
 		self.setModified()
 
 		return old
@@ -5275,7 +6043,7 @@ class Input:
 	#-----------------------------------------------------------------------
 	# Convert input to names and check for obsolete and/or non-valid cards
 	#-----------------------------------------------------------------------
-	def convert2Names(self):
+	def convert2Names(self, fromPos=0, toPos=-1):
 		# Find materials for duplicate checking
 		self.clearCache()
 
@@ -5293,7 +6061,8 @@ class Input:
 			else:
 				matDict[n].append(i+1)
 
-		for card in self.cardlist:
+		if toPos<0: toPos = len(self.cardlist)
+		for card in self.cardlist[fromPos:toPos]:
 			if not card.enable: continue
 
 			# Check for obsolete cards
@@ -5357,12 +6126,16 @@ class Input:
 		self.setModified()
 
 	#-----------------------------------------------------------------------
-	# Validate all active cards
+	# Validate all active cards grouped by tag
+	# @param timer	optional RuleTimer to accumulate the time of every rule
+	# @return list of invalid cards sorted by position
 	#-----------------------------------------------------------------------
-	def validate(self):
-		for card in self.cardlist:
-			if card.ignore(): continue
-			card.validate()
+	def validate(self, timer=None):
+		invalid = []
+		for tag, cards in self.cards.items():
+			invalid.extend(CardInfo.get(tag).validateCards(cards, timer))
+		invalid.sort(key=attrgetter("_pos"))
+		return invalid
 
 	#-----------------------------------------------------------------------
 	# Changing all cards tag from old to new
@@ -5374,6 +6147,8 @@ class Input:
 			cl = self.cards[old]
 			self.cards[new] = cl
 			del self.cards[old]
+			self._names.pop(old, None)
+			self._names.pop(new, None)
 			for card in cl:
 				card.changeTag(new)
 		except KeyError:
@@ -5404,34 +6179,44 @@ class Input:
 		self.setModified()
 
 	#-----------------------------------------------------------------------
-	# Put the correct index to cards in the range given by fromPos:toPos
+	# Put the correct index to cards from fromPos (toPos is ignored)
+	# The renumbering is lazy, it only marks the first position to be
+	# renumbered. Positions and indents are recalculated from there to the
+	# end of the list the first time a card position or indent is requested
 	#-----------------------------------------------------------------------
 	def renumber(self, fromPos=0, toPos=-1):
+		fromPos = max(0, fromPos)
+		if self._renumberFrom is None or fromPos < self._renumberFrom:
+			self._renumberFrom = fromPos
+		self._preprocessed = None
+		self.setModified()
+
+	#-----------------------------------------------------------------------
+	def _renumberPending(self):
+		fromPos = self._renumberFrom
+		if fromPos is None: return
+		self._renumberFrom = None
+
 		cardlist = self.cardlist
-		if toPos<0 or toPos>len(cardlist):
-			toPos = len(cardlist)
 		if fromPos == 0:
 			indent = 0
 		else:
 			try:
 				card = cardlist[fromPos-1]
-				indent = cardlist[fromPos-1]._indent
+				indent = card._cindent
 				if card.enable and card.tag in _INDENT_INC:
 					indent += 1
 			except IndexError:
 				return
 
-		for i in range(fromPos, toPos):
+		for i in range(fromPos, len(cardlist)):
 			card = cardlist[i]
-			card._pos = i
+			card._cpos = i
 			tag = card.tag
 			if card.enable and tag in _INDENT_DEC: indent = max(0,indent-1)
-			card._indent = indent
+			card._cindent = indent
 			if card.enable and tag in _INDENT_INC: indent += 1
 
-		self.setModified()
-		self.checkNumbering()		# FIXME XXX (delete this)
-
 	#-----------------------------------------------------------------------
 	# Verify the internal order of the cards
 	#-----------------------------------------------------------------------
@@ -5466,33 +6251,102 @@ class Input:
 	#	 1: true  & active
 	#        2: false & active after else
 	#        3: true  & active after else
+	# The state of the last call is kept in _preprocessed, when the input
+	# structure is unchanged only the #if blocks that depend on a modified
+	# define are re-processed and preprocessChanges holds the list of cards
+	# that changed active state (None after a full processing)
 	# @return list of error cards
 	# FIXME values do not WORK!
 	#-----------------------------------------------------------------------
 	def preprocess(self, activeDefines=None):
-		self.clearCache()
-		define = {}
-		errors = []
-		self.localDict.clear()
-		#if activeDefines exists and has something
-		defs = {}
 		if activeDefines:
 			useInputDefines = False
-			for var,val in activeDefines:
-				define[var] = 1
-				if isinstance(val,str) and val!="" and val[0]=="=":
-					try: val = float(eval(val[1:], _globalDict, self.localDict))
-					except: pass
-				try: self.localDict[var] = float(val)
-				except: self.localDict[var] = val
-				defs[var] = val
+			define = dict.fromkeys([var for var,val in activeDefines], 1)
 		else:
 			# if none or empty list e.g. default run = []
 			useInputDefines = True
+			define = {}
+
+		state = self._preprocessed
+		if state is not None and state[0] == useInputDefines:
+			return self._preprocessIncremental(state, activeDefines, define)
+
+		self.clearCache()
+		self.localDict.clear()
+		errors = []
+		blocks = []
+		self._preprocessCards(0, len(self.cardlist), define,
+				useInputDefines, errors, blocks)
+		if errors:
+			# incremental processing requires a correct nesting
+			self._preprocessed = None
+		else:
+			self._preprocessed = (useInputDefines, frozenset(define), blocks)
+		if not useInputDefines:
+			self._preprocessDefines(activeDefines, {}, errors)
+			errors.sort(key=lambda x: x[0].pos())
+		self.preprocessChanges = None
+		return errors
+
+	#-----------------------------------------------------------------------
+	# Re-process only the top level #if..#endif blocks that depend on
+	# the defines that changed since the last preprocess
+	#-----------------------------------------------------------------------
+	def _preprocessIncremental(self, state, activeDefines, define):
+		self.cache.clear()
+		changes = []
+		if state[0]:
+			# the input defines depend only on the cards and any
+			# modification of them resets the state
+			modified = None
+		else:
+			modified = set(define).symmetric_difference(state[1])
+		if modified:
+			cardlist = self.cardlist
+			for start, end, names in state[2]:
+				if modified.isdisjoint(names): continue
+				before = [x.active for x in cardlist[start:end]]
+				self._preprocessCards(start, end, define, False, [])
+				for card,active in zip(cardlist[start:end], before):
+					if card.active != active:
+						changes.append(card)
+						if card.tag == "#define":
+							self.localDict.changed(card.sdum().strip())
+			self._preprocessed = (state[0], frozenset(define), state[2])
+			if changes: self._numbers.clear()
+
+		errors = []
+		if activeDefines:
+			# define cards are re-evaluated with the new values
+			for card in self.cardsCache("#define"):
+				card._evalCache = None
+			# remove the variables keeping the default functions
+			old = {}
+			for var in list(self.localDict):
+				if var in _VOLATILE: continue
+				old[var] = dict.pop(self.localDict, var)
+			self._preprocessDefines(activeDefines, old, errors)
+		self.preprocessChanges = changes
+		return errors
 
+	#-----------------------------------------------------------------------
+	# Set the active flag of cards in the range [start,end)
+	# nest[] contains the evaluation of the nesting
+	#	-1: inactive - do not include any subsequent #if..
+	#	 0: false & active - include substitute #if..
+	#	 1: true  & active
+	#        2: false & active after else
+	#        3: true  & active after else
+	# blocks if not None is filled with the top level #if..#endif blocks
+	# as (start, end, names) with the names of defines they depend on
+	#-----------------------------------------------------------------------
+	def _preprocessCards(self, start, end, define, useInputDefines, errors, blocks=None):
 		nest = [1]
 		active13 = True
-		for i,card in enumerate(self.cardlist):
+		names = None
+		cardlist = self.cardlist
+		for i in range(start, end):
+			card   = cardlist[i]
 			tag    = card.tag
 			var    = card.what(0)
 			active = nest[-1]
@@ -5507,30 +6361,21 @@ class Input:
 			if   active13 and tag == "#define":
 				if useInputDefines:
 					define[var] = 1
-				else:
-					if self.localDict.get(var,"") == "":
-						self.localDict[var] = card.numWhat(1)
-					elif var not in defs:
-						err = "Duplicate #define with same name is not permitted"
-						errors.append((card,err))
-						card.invalid.append(err)
-						say(str(card))
-						say(err)
 
 			elif active13 and tag == "#undef" and useInputDefines:
 				define[var] = 0
 
-			elif tag == "#if" or tag == "#ifdef":
-				if active13:
-					nest.append(define.get(var, 0))
-				else:
+			elif tag == "#if" or tag == "#ifdef" or tag == "#ifndef":
+				if len(nest)==1:
+					blockStart = i
+					names = set()
+				names.add(var)
+				if not active13:
 					nest.append(-1)	# ignore this nesting
-
-			elif tag == "#ifndef":
-				if active13:
+				elif tag == "#ifndef":
 					nest.append(1-define.get(var, 0))
 				else:
-					nest.append(-1)	# ignore this nesting
+					nest.append(define.get(var, 0))
 
 			elif tag == "#elif":
 				if len(nest)<=1:
@@ -5539,14 +6384,18 @@ class Input:
 					card.invalid.append(err)
 					say(err)
 				elif active==1:
+					names.add(var)
 					nest[-1] = -1	# terminate this nesting
 				elif active==0:
+					names.add(var)
 					nest[-1] = define.get(var, 0)
 				elif active>1:
 					err = "Misplaced #elif after #else, card: %d"%(i+1)
 					errors.append((card,err))
 					card.invalid.append(err)
 					say(err)
+				else:
+					names.add(var)
 				active = nest[-1]
 				active13 = active in (1,3)
 				card.setActive(active13)
@@ -5577,11 +6426,58 @@ class Input:
 					say(err)
 				else:
 					nest.pop()
+					if len(nest)==1 and blocks is not None:
+						blocks.append((blockStart, i+1, frozenset(names)))
 				active = nest[-1]
 				active13 = active in (1,3)
 				card.setActive(active13)
 
-		return errors
+		# unterminated block
+		if len(nest)>1 and blocks is not None:
+			blocks.append((blockStart, end, frozenset(names)))
+
+	#-----------------------------------------------------------------------
+	# Fill the local dictionary with the run defines and the active
+	# #define cards. Variables with the same value as in old are not
+	# marked as changed, to keep the cached evaluations
+	#-----------------------------------------------------------------------
+	def _preprocessDefines(self, activeDefines, old, errors):
+		localDict = self.localDict
+		defs = {}
+		for var,val in activeDefines:
+			if isinstance(val,str) and val!="" and val[0]=="=":
+				try: val = float(eval(val[1:], _globalDict, localDict))
+				except: pass
+			try: self._setDefine(old, var, float(val))
+			except: self._setDefine(old, var, val)
+			defs[var] = val
+
+		for card in self.cardsCache("#define"):
+			if not card.enable or not card.active: continue
+			var = card.what(0)
+			if localDict.get(var,"") == "":
+				self._setDefine(old, var, card.numWhat(1))
+			elif var not in defs:
+				err = "Duplicate #define with same name is not permitted"
+				errors.append((card,err))
+				card.invalid.append(err)
+				say(str(card))
+				say(err)
+
+		for var in old:
+			if var not in localDict:
+				localDict.changed(var)
+
+	#-----------------------------------------------------------------------
+	def _setDefine(self, old, var, value):
+		try:
+			o = old[var]
+			if type(o) is type(value) and o == value:
+				dict.__setitem__(self.localDict, var, value)
+				return
+		except KeyError:
+			pass
+		self.localDict[var] = value
 
 	#-----------------------------------------------------------------------
 	# Return the body properties as a dictionary of the active/enabled
@@ -5675,7 +6571,7 @@ class Input:
 	def regionProperties(self):
 		regionDict = {}
 		regionList = []
-		matList    = self.materialList(icru=True)
+		matIndex   = self._materialNumbers(icru=True)[1]
 		matDict    = {}
 		rotDefi    = {}
 
@@ -5686,8 +6582,8 @@ class Input:
 		# finally materials in voxels and input
 		for card in self.cardsSorted("MATERIAL"):
 			try:
-				card["@n"] = matList.index(card.sdum())+1
-			except ValueError:
+				card["@n"] = matIndex[card.sdum()]+1
+			except KeyError:
 				card["@n"] = 1
 			matDict[card.sdum()] = card
 
@@ -5932,7 +6828,7 @@ class Input:
 	# Convert material to name/number
 	#-----------------------------------------------------------------------
 	def material(self, mat, toName):
-		lst = self.materialList(0,False,True)
+		lst, index = self._materialNumbers(0,False,True)
 		if toName:
 			mat -= 1		# 1 based
 			if mat<0 or mat>=len(lst):
@@ -5942,7 +6838,7 @@ class Input:
 			return lst[mat]
 		else:
 			try:
-				return lst.index(mat)+1
+				return index[mat]+1
 			except:
 				return 0
 
@@ -5950,6 +6846,24 @@ class Input:
 	# Return material list
 	#-----------------------------------------------------------------------
 	def materialList(self, which=0, icru=False, assigned=False):
+		return list(self._materialNumbers(which, icru, assigned)[0])
+
+	#-----------------------------------------------------------------------
+	# Return the cached material list and a dictionary with the (0 based)
+	# index of the first occurrence of every name
+	#-----------------------------------------------------------------------
+	def _materialNumbers(self, which=0, icru=False, assigned=False):
+		if icru:
+			key = ("MATERIAL", which, True)
+		elif assigned:
+			key = ("ASSIGNMA", which)
+		else:
+			key = ("MATERIAL", which, False)
+		try:
+			return self._numbers[key]
+		except KeyError:
+			pass
+
 		lst = [m.sdum() for m in _defaultMaterials]
 
 		# Add first voxel materials
@@ -5958,38 +6872,54 @@ class Input:
 			if voxel.ignore() or voxel["@voxel"] is None: continue
 			lst.extend([m.sdum() for m in voxel["@voxel"].input["MATERIAL"]])
 
+		first = {}
+		for i,name in enumerate(lst):
+			first.setdefault(name, i)
+
 		# Add user defined materials
 		for card in self.cardsSorted("MATERIAL", which):
 			name  = card.sdum()
 			index = card.intWhat(4)-1	# 0 based!
 			if index<0:
-				try:    index = lst.index(name)
-				except: index = len(lst)
+				index = first.get(name, len(lst))
 			# Append or replace
 			if index == len(lst):
 				lst.append(name)
+				first.setdefault(name, index)
 			elif index < len(lst):
-				if lst[index] != "" and lst[index] != name:
+				old = lst[index]
+				if old != "" and old != name:
 					say("Warning: overriding material index %d=%s by %s" % \
-						(index, lst[index], name))
+						(index, old, name))
 				lst[index] = name
+				if old != name and first.get(old) == index:
+					try: first[old] = lst.index(old)
+					except ValueError: del first[old]
+				if first.get(name, index) >= index:
+					first[name] = index
 			else:
+				first.setdefault("", len(lst))
 				lst.extend([""] * (index-len(lst)+1))
 				lst[index] = name
+				first.setdefault(name, index)
 
 		if icru:
 			# Add all icru materials regardless of their order
-			lst.extend([m.sdum() for m in _icruMaterials])
+			for m in _icruMaterials:
+				first.setdefault(m.sdum(), len(lst))
+				lst.append(m.sdum())
 		elif assigned:
 			# Add all materials assigned, especially for the ICRU ones
 			# correct index assigned by FLUKA
 			# FIXME Not very intelligent.
 			for card in self.cardsSorted("ASSIGNMA", which):
 				mat = card.what(1)
-				if mat not in lst:
+				if mat not in first:
+					first[mat] = len(lst)
 					lst.append(mat)
 
-		return lst
+		self._numbers[key] = (lst, first)
+		return lst, first
 
 	#-----------------------------------------------------------------------
 	# Return material dictionary
@@ -6072,8 +7002,7 @@ class Input:
 	# Convert region to name/number
 	#-----------------------------------------------------------------------
 	def region(self, reg, toName):
-		# Regions removing continuation cards
-		regions = [x for x in self.cardsSorted("REGION") if x.name()!="&"]
+		regions, index = self._regionNumbers()
 		if len(regions) == 0: return None
 
 		if toName:
@@ -6082,10 +7011,26 @@ class Input:
 			return regions[reg-1].sdum()
 		else:
 			try:
-				return [x.what(0) for x in regions].index(reg)+1
+				return index[reg]
 			except:
 				return 0
 
+	#-----------------------------------------------------------------------
+	# Return the cached list of active regions, removing continuation
+	# cards, and a dictionary with the number of every name
+	#-----------------------------------------------------------------------
+	def _regionNumbers(self):
+		try:
+			return self._numbers[("REGION",)]
+		except KeyError:
+			pass
+		regions = [x for x in self.cardsSorted("REGION") if x.name()!="&"]
+		index = {}
+		for i,region in enumerate(regions):
+			index.setdefault(region.what(0), i+1)
+		self._numbers[("REGION",)] = (regions, index)
+		return regions, index
+
 	#-----------------------------------------------------------------------
 	# @param idx		rotation to return
 	#			Can be prefixed with "-"
@@ -6249,6 +7194,40 @@ class Input:
 #===============================================================================
 # Internal Utilities
 #===============================================================================
+#-------------------------------------------------------------------------------
+# Return the size and hash of a file, or None if it cannot be read
+#-------------------------------------------------------------------------------
+def _fileSignature(filename):
+	try:
+		with open(filename, "rb") as f:
+			h = hashlib.blake2b(digest_size=20)
+			size = 0
+			while True:
+				data = f.read(1<<20)
+				if not data: break
+				size += len(data)
+				h.update(data)
+	except (IOError, OSError):
+		return None
+	return size, h.digest()
+
+#-------------------------------------------------------------------------------
+# Return the size and modification time of a file, None if it doesn't exist
+#-------------------------------------------------------------------------------
+def _fileStamp(filename):
+	try:
+		st = os.stat(filename)
+	except OSError:
+		return None
+	return st.st_size, st.st_mtime_ns
+
+#-------------------------------------------------------------------------------
+# Cache stamp of the flair version: the card database and this module
+#-------------------------------------------------------------------------------
+def _cacheStamp():
+	return (_fileStamp(__file__),
+		_fileStamp(os.path.join(os.path.dirname(__file__), _database)))
+
 #-------------------------------------------------------------------------------
 def _str2num(w):
 	"""Check if argument w is a valid fortran number and
@@ -6292,38 +7271,20 @@ def _region2name(name):
 	return REGION_PREFIX + name
 
 #-------------------------------------------------------------------------------
-# Initialize classes:
-#	CardInfo
-#	Particle
+# Read the card database ini file into plain python structures
 #-------------------------------------------------------------------------------
-def init(filename=None):
-	global _defaultMaterials, _defaultMatDict, _icruMaterials, _icruMatDict
-	global _neutronGroups, _lowMaterials, _usermvax
-	global NGROUPS, BODY_TAGS, BODY_NOVXL_TAGS, FLAIR_TAGS, OBJECT_TAGS, TRANSFORM_TAGS
-
-	if filename is None:
-		filename = os.path.join(os.path.dirname(__file__), _database)
-
-	# read card database and prepare CardInfo classes
+def _readDatabase(filename):
 	cardini = configparser.RawConfigParser()
 	cardini.read(filename)
-
-	CardInfo._db[None] = CardInfo(ERROR, [None],
-			[["-"]*7], [["?"]*7],
-			[], None, "Error in tag...")
+	db = {}
 
 	# Go through all cards
+	cards = []
 	for name in cardini.sections():
 		# Ignore sections with lower case letters
 		# it does not include the '#xxx' sections
 		if name[0].islower(): continue
 
-		# name is complete, tag is only 8 characters max
-		if len(name)>8 and name[0] not in ("$","#"):
-			tag = name[0:8]
-		else:
-			tag = name
-
 		meaning = cardini.get(name, "meaning")
 
 		group = cardini.get(name, "group").split()
@@ -6389,40 +7350,15 @@ def init(filename=None):
 				break
 		if empty: assert_=[]
 
-		# append to CardInfo database
-		cinfo = CardInfo(name, group, range_,
-				extra, assert_, default, meaning)
 		try:
 			disable = cardini.get(name, "disable")
-			cinfo.setDisableComment(disable=="comment")
 		except:
-			pass
-		CardInfo._db[tag] = cinfo
-
-	# Create bodies cards
-	BODY_NOVXL_TAGS = [ x.tag for x in list(CardInfo._db.values())
-			if "Geometry" in x.group and len(x.tag)==3 and x.tag!="END" ]
-	BODY_TAGS = BODY_NOVXL_TAGS[:]
-	BODY_TAGS.append("VOXELS")
-
-	BODY_NOVXL_TAGS.sort()
-	BODY_TAGS.sort()
-
-	# Geometry transformation tags
-	TRANSFORM_TAGS = [ x.tag for x in list(CardInfo._db.values()) if x.tag[0]=="$" ]
-	TRANSFORM_TAGS.sort()
-
-	# Create flair tags
-	FLAIR_TAGS = [ x.tag for x in list(CardInfo._db.values()) if "Flair" in x.group ]
-	FLAIR_TAGS.sort()
-	FLAIR_TAGS.remove("!coffee")
-
-	# Object tags = Flair tags + ROT-DEFI
-	OBJECT_TAGS = FLAIR_TAGS[:]
-	OBJECT_TAGS.append("ROT-DEFI")
-	OBJECT_TAGS.append("BEAM")
+			disable = None
+		cards.append((name, group, range_, extra, assert_, default, meaning, disable))
+	db["cards"] = cards
 
 	# Particles
+	particles = []
 	section = "particles"
 	for pid, name in cardini.items(section):
 		if pid[:3] == "pid":
@@ -6433,55 +7369,40 @@ def init(filename=None):
 				pdg = int(cardini.get(section,"pdg."+id))
 			except:
 				pdg = 0
-			Particle.add(int(id), name, mass, comment, pdg)
-	Particle.makeLists()
+			particles.append((int(id), name, mass, comment, pdg))
+	db["particles"] = particles
 
-	# Read default materials and create fake MATERIAL card's
+	# Default materials (positive index) and special ICRU materials (negative)
+	materials = []
 	section = "materials"
-	i = 1
-	while True:
-		n = "mat.%d" % (i)
-		try: name = cardini.get(section, n)
-		except: break
-
-		desc  = cardini.get(     section, "desc.%d"  % (i))
-		Amass = cardini.getfloat(section, "Amass.%d" % (i))
-		Z     = cardini.getfloat(section, "Z.%d"     % (i))
-		rho   = cardini.getfloat(section, "rho.%d"   % (i))
-		mat   = Card("MATERIAL",[name, Z, Amass, rho, i],desc)
-		mat["@n"] = i
-		_defaultMaterials.append(mat)
-		_defaultMatDict[name] = mat
-		i += 1
-
-	# Read special ICRU materials
-	i = -1
-	while True:
-		n = "mat.%d" % (i)
-		try: name = cardini.get(section, n)
-		except: break
-
-		desc  = cardini.get(     section, "desc.%d"  % (i))
-		Amass = cardini.getfloat(section, "Amass.%d" % (i))
-		Z     = cardini.getfloat(section, "Z.%d"     % (i))
-		rho   = cardini.getfloat(section, "rho.%d"   % (i))
-		mat   = Card("MATERIAL",[name, Z, Amass, rho],desc)
-		mat["@n"] = i
-		_icruMaterials.append(mat)
-		_icruMatDict[name] = mat
-		i -= 1
+	for step in (1, -1):
+		i = step
+		while True:
+			n = "mat.%d" % (i)
+			try: name = cardini.get(section, n)
+			except: break
+
+			desc  = cardini.get(     section, "desc.%d"  % (i))
+			Amass = cardini.getfloat(section, "Amass.%d" % (i))
+			Z     = cardini.getfloat(section, "Z.%d"     % (i))
+			rho   = cardini.getfloat(section, "rho.%d"   % (i))
+			materials.append((i, name, desc, Amass, Z, rho))
+			i += step
+	db["materials"] = materials
 
 	# Low neutrons energy groups
 	section = "n-groups"
 	# Read number of groups
 	try:
 		groups = cardini.get(section,"groups")
-		NGROUPS = list(map(int, groups.split()))
+		ngroups = list(map(int, groups.split()))
 	except:
-		say("ERROR! No neutron energy groups defined")
+		ngroups = None
+	db["ngroups"] = ngroups
 
 	pat = re.compile(r"^(\S*) *(.*)$")
-	for g in NGROUPS:
+	energies = {}
+	for g in ngroups or []:
 		groupsList  = []
 		groupsListS = []
 		for i in range(1,g+2):
@@ -6491,11 +7412,12 @@ def init(filename=None):
 			m = pat.match(energy)
 			groupsList.append(float(m.group(1)))
 			groupsListS.append(m.group(2))
-		_neutronGroups[g]  = groupsList
-		_neutronGroupsS[g] = groupsListS
+		energies[g] = (groupsList, groupsListS)
+	db["energies"] = energies
 
 	# Low neutrons energy groups
-	for g in NGROUPS:
+	lowneut = {}
+	for g in ngroups or []:
 		section = "low-neut"
 		i = 1
 		materials = []
@@ -6504,27 +7426,168 @@ def init(filename=None):
 			try: elem = cardini.get(section, n)
 			except: break
 
-			mat = LowNeutMaterial()
-			mat.elem = elem
-			mat.desc = cardini.get(section, "mat.%d.%d"  % (g,i))
-			mat.temp = cardini.get(section, "temp.%d.%d" % (g,i))
-			mat.db   = cardini.get(section, "db.%d.%d" % (g,i))
-			mat.name = cardini.get(section, "name.%d.%d" % (g,i))
+			mat = {	"elem" : elem,
+				"desc" : cardini.get(section, "mat.%d.%d"  % (g,i)),
+				"temp" : cardini.get(section, "temp.%d.%d" % (g,i)),
+				"db"   : cardini.get(section, "db.%d.%d"   % (g,i)),
+				"name" : cardini.get(section, "name.%d.%d" % (g,i)) }
 			ids      = cardini.get(section, "ids.%d.%d" % (g,i)).split()
-			mat.id1  = int(ids[0])
-			mat.id2  = int(ids[1])
-			mat.id3  = int(ids[2])
-			mat.g    = cardini.get(section, "g.%d.%d" % (g,i))
+			mat["id1"] = int(ids[0])
+			mat["id2"] = int(ids[1])
+			mat["id3"] = int(ids[2])
+			mat["g"]   = cardini.get(section, "g.%d.%d" % (g,i))
 			materials.append(mat)
 			i += 1
+		lowneut[g] = materials
+	db["lowneut"] = lowneut
+
+	# Read user routines
+	db["usermvax"] = cardini.items("usermvax")
+
+	del cardini
+	return db
+
+#-------------------------------------------------------------------------------
+def _databaseStamp(filename):
+	# the marshaled code objects depend on the interpreter bytecode
+	return (CACHE_VERSION, importlib.util.MAGIC_NUMBER,
+			_fileStamp(__file__), _fileStamp(filename),
+			os.path.abspath(filename))
+
+#-------------------------------------------------------------------------------
+# Return the card database from the precompiled cache, None if out of date
+#-------------------------------------------------------------------------------
+def _loadDatabase(filename):
+	try:
+		with open(dbCache, "rb") as f:
+			if f.read(len(_DBCACHE_MAGIC)) != _DBCACHE_MAGIC or \
+			   pickle.load(f) != _databaseStamp(filename):
+				return None
+			db = pickle.load(f)
+			CardInfo._funcs.update(marshal.loads(db["funcs"]))
+			return db
+	except Exception:
+		return None
+
+#-------------------------------------------------------------------------------
+# Save the card database together with the compiled expressions
+#-------------------------------------------------------------------------------
+def _saveDatabase(filename, db):
+	db["funcs"] = marshal.dumps(CardInfo._funcs)
+	tmp = "%s.%d"%(dbCache, os.getpid())
+	try:
+		os.makedirs(os.path.dirname(dbCache), exist_ok=True)
+		with open(tmp, "wb") as f:
+			f.write(_DBCACHE_MAGIC)
+			pickle.dump(_databaseStamp(filename), f, pickle.HIGHEST_PROTOCOL)
+			pickle.dump(db, f, pickle.HIGHEST_PROTOCOL)
+		os.replace(tmp, dbCache)
+	except (IOError, OSError, ValueError, pickle.PicklingError):
+		try: os.remove(tmp)
+		except OSError: pass
+
+#-------------------------------------------------------------------------------
+# Initialize classes:
+#	CardInfo
+#	Particle
+#-------------------------------------------------------------------------------
+def init(filename=None):
+	global _defaultMaterials, _defaultMatDict, _icruMaterials, _icruMatDict
+	global _neutronGroups, _lowMaterials, _usermvax
+	global NGROUPS, BODY_TAGS, BODY_NOVXL_TAGS, FLAIR_TAGS, OBJECT_TAGS, TRANSFORM_TAGS
+
+	if filename is None:
+		filename = os.path.join(os.path.dirname(__file__), _database)
+
+	# read card database and prepare CardInfo classes
+	db = _loadDatabase(filename)
+	cached = db is not None
+	if not cached: db = _readDatabase(filename)
+
+	CardInfo._db[None] = CardInfo(ERROR, [None],
+			[["-"]*7], [["?"]*7],
+			[], None, "Error in tag...")
+
+	# Go through all cards
+	for name, group, range_, extra, assert_, default, meaning, disable in db["cards"]:
+		# name is complete, tag is only 8 characters max
+		if len(name)>8 and name[0] not in ("$","#"):
+			tag = name[0:8]
+		else:
+			tag = name
+
+		# append to CardInfo database
+		cinfo = CardInfo(name, group, range_,
+				extra, assert_, default, meaning)
+		if disable is not None:
+			cinfo.setDisableComment(disable=="comment")
+		CardInfo._db[tag] = cinfo
+
+	# Create bodies cards
+	BODY_NOVXL_TAGS = [ x.tag for x in list(CardInfo._db.values())
+			if "Geometry" in x.group and len(x.tag)==3 and x.tag!="END" ]
+	BODY_TAGS = BODY_NOVXL_TAGS[:]
+	BODY_TAGS.append("VOXELS")
+
+	BODY_NOVXL_TAGS.sort()
+	BODY_TAGS.sort()
+
+	# Geometry transformation tags
+	TRANSFORM_TAGS = [ x.tag for x in list(CardInfo._db.values()) if x.tag[0]=="$" ]
+	TRANSFORM_TAGS.sort()
+
+	# Create flair tags
+	FLAIR_TAGS = [ x.tag for x in list(CardInfo._db.values()) if "Flair" in x.group ]
+	FLAIR_TAGS.sort()
+	FLAIR_TAGS.remove("!coffee")
+
+	# Object tags = Flair tags + ROT-DEFI
+	OBJECT_TAGS = FLAIR_TAGS[:]
+	OBJECT_TAGS.append("ROT-DEFI")
+	OBJECT_TAGS.append("BEAM")
+
+	# Particles
+	for id, name, mass, comment, pdg in db["particles"]:
+		Particle.add(id, name, mass, comment, pdg)
+	Particle.makeLists()
+
+	# Create fake MATERIAL card's for the default and ICRU materials
+	for i, name, desc, Amass, Z, rho in db["materials"]:
+		if i>0:
+			mat = Card("MATERIAL",[name, Z, Amass, rho, i],desc)
+			mat["@n"] = i
+			_defaultMaterials.append(mat)
+			_defaultMatDict[name] = mat
+		else:
+			mat = Card("MATERIAL",[name, Z, Amass, rho],desc)
+			mat["@n"] = i
+			_icruMaterials.append(mat)
+			_icruMatDict[name] = mat
+
+	# Low neutrons energy groups
+	if db["ngroups"] is None:
+		say("ERROR! No neutron energy groups defined")
+	else:
+		NGROUPS = db["ngroups"]
+
+	for g, (groupsList, groupsListS) in db["energies"].items():
+		_neutronGroups[g]  = groupsList
+		_neutronGroupsS[g] = groupsListS
+
+	# Low neutrons energy groups
+	for g, lst in db["lowneut"].items():
+		materials = []
+		for item in lst:
+			mat = LowNeutMaterial()
+			mat.__dict__.update(item)
+			materials.append(mat)
 		_lowMaterials[g] = materials
 
 	# Read user routines
-	section = "usermvax"
-	for routine, desc in cardini.items(section):
+	for routine, desc in db["usermvax"]:
 		_usermvax[routine] = desc
 
-	del cardini
+	if not cached: _saveDatabase(filename, db)
 
 #===============================================================================
 if __first:
@@ -1116,6 +1116,7 @@ class MaterialList(Toplevel):
 		sb.config(command=self.listbox.yview)
 		sb.pack(side=RIGHT, fill=Y)
 
+		Materials.load()
 		lst = list(Materials.materials.keys())
 		lst.sort()
 		sel = 0
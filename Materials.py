@@ -71,6 +71,7 @@ import FlairRibbon
 groups    = []
 materials = {}
 changed   = False
+_pending  = None	# database files to be read on first use
 
 _COMPOSITION = ["atom", "mass", "volume"]
 _STATE       = ["solid", "liquid", "gas"]
@@ -289,6 +290,7 @@ def insertMaterial(flair, mat):
 # Insert the material list to input
 #-------------------------------------------------------------------------------
 def insert2Input(flair, mats):
+	load()
 	if isinstance(mats,list):
 		matnames = []
 		elements = set()
@@ -543,6 +545,7 @@ class MaterialPage(FlairRibbon.FlairPage):
 	# Create Project page
 	#----------------------------------------------------------------------
 	def createPage(self):
+		load()
 		FlairRibbon.FlairPage.createPage(self)
 
 		self.list_widgets = []
@@ -1885,9 +1888,24 @@ class InPlaceElement(tkExtra.InPlaceEdit):
 			self.edit.insert(0, element.symbol)
 
 #-------------------------------------------------------------------------------
-# Initialize
+# Initialize, the database files are read on the first use with load()
 #-------------------------------------------------------------------------------
 def init(filenames):
+	global _pending
+	_pending = filenames
+
+#-------------------------------------------------------------------------------
+# Read the database files if not already loaded
+#-------------------------------------------------------------------------------
+def load():
+	global _pending
+	if _pending is None: return
+	filenames = _pending
+	_pending  = None
+	_read(filenames)
+
+#-------------------------------------------------------------------------------
+def _read(filenames):
 	global materials, groups
 
 	# read card database and prepare CardInfo classes
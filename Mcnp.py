@@ -618,8 +618,7 @@ class Mcnp:
 			say("Warning: Region \"%s\" contains parentheses. Expanded!"%(region.sdum()))
 			exp = csg.tokenize(region_expr)
 			csg.exp2rpn(exp)
-			csg.rpnorm(exp)
-			region_expr = csg.rpn2exp(exp)
+			region_expr = csg.normalize(exp)
 		else:
 			region_expr = region_expr.replace("+", " + ")
 			region_expr = region_expr.replace("-", " - ")
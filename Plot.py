@@ -54,6 +54,11 @@ import Input
 import Project
 import Palette
 
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
 DEFAULT_FORMAT = ".eps"
 
 GEO_NO    = "-No-"
@@ -171,6 +176,21 @@ SCATTER   = "Scatter"
 
 USERDUMP_CASE = ["Continuous", "Point", "Source"]
 
+# -----------------------------------------------------------------------------
+# Return an array with the mass of every particle id in ptype
+# @param unknown	mass of unknown particles, if None raise KeyError
+# -----------------------------------------------------------------------------
+def _particleMass(ptype, unknown=None):
+	mass = numpy.zeros(len(ptype))
+	for t in numpy.unique(ptype).tolist():
+		try:
+			m = Input.Particle._db[t].mass
+		except KeyError:
+			if unknown is None: raise KeyError(t)
+			m = unknown
+		mass[ptype==t] = m
+	return mass
+
 # -----------------------------------------------------------------------------
 # perform a flood fill algorithm to determine regions
 # -----------------------------------------------------------------------------
@@ -1417,15 +1437,13 @@ class Plot:
 		# if a geometry is provided then superimpose the data on
 		# the geometry
 		try:
-			data = usr.readData(d-1)
-			stat = usr.readStat(d-1)
-		except IOError:
+			fdata = usr.array(d-1).ravel()
+			edata = usr.errors(d-1)
+		except (IOError, ValueError, ImportError):
 			return "Error reading data file %s"%(d)
-
-		fdata  = Data.unpackArray(data)
-		edata  = Data.unpackArray(stat)
-		del data
-		del stat
+		if edata is None:
+			return "Error no statistical errors found in data file"
+		edata = edata.ravel()
 
 		# Find regions
 		cardlist   = self.project.input["REGION"]
@@ -1714,90 +1732,91 @@ class Plot:
 
 		i = 0
 		startTime = time.time()
-		last = startTime
 		try:
-			while True:
+			batches = mg.batches(type=case)
+			while i <= to_:
 				try:
-					t = mg.readEvent(case)
-				except:
+					batch = next(batches, None)
+				except (IOError, ValueError, IndexError):
 					return "ERROR not a valid MGREAD file"
-
-				if t is None: break
-				elif t != case: continue
+				if batch is None: break
+				rows = batch[case]
+				if rows is None or len(rows)==0: continue
 
 				if case == 0:		# Tracking
-					n      = mg.ntrack
-					ptype  = mg.jtrack
-					weight = mg.wtrack
-					try:
-						mass = Input.Particle._db[int(ptype)].mass
-					except:
-						# FIXME XXX XXX
-						# for ptype < -6!!!!!
-						# or ptype == -2
-						# only kinetic energy is possible
-						mass = 0.0
-
-					ekin   = mg.etrack - mass
-					if emin and ekin < emin: continue
-					if emax and ekin > emax: continue
-					if particles and ptype not in particles:
-						continue
-
-					i += 1
-					if i < from_: continue
-					elif i > to_: break
-
-					j = 0
-					while j < n:
-						x = mg.data[j];	j += 1
-						y = mg.data[j];	j += 1
-						z = mg.data[j];	j += 1
-						fout.write("%d %g %g %g %g %g\n" % \
-							(ptype, ekin, weight, x, y, z))
-					fout.write("\n")
-
+					# FIXME XXX XXX
+					# for ptype < -6!!!!!
+					# or ptype == -2
+					# only kinetic energy is possible
+					ptype = rows["jtrack"]
+					ekin  = rows["etrack"] - _particleMass(ptype, 0.0)
 				elif case == 2:		# Source particles
-					(ptype, etot, weight, x, y, z, tx, ty, tz) \
-							= mg.data
+					ptype = rows["ptype"]
 					try:
-						mass = Input.Particle._db[int(ptype)].mass
+						mass = _particleMass(ptype)
 					except KeyError:
-						return "Error: Unknown particle id=%d"%(int(ptype))
-					ekin = etot - mass
-					if ekin < 0.0: ekin = 0.0
-					if emin and ekin < emin: continue
-					if emax and ekin > emax: continue
-					if particles and ptype not in particles:
-						continue
-
-					i += 1
-					if   i < from_: continue
-					elif i > to_: break
-
-					pmom = math.sqrt(ekin*(etot+mass))
-					fout.write("%d %g %g %g %g %g %g %g %g %g %g\n" % \
-						(ptype, etot, weight, \
-							x, y, z, tx, ty, tz, ekin, pmom))
-
-					for d in range(9):
-						dmin[d] = min(dmin[d], mg.data[d])
-						dmax[d] = max(dmax[d], mg.data[d])
-					dmin[ 9] = min(dmin[ 9], ekin)
-					dmin[10] = min(dmin[10], pmom)
-					dmax[ 9] = max(dmin[ 9], ekin)
-					dmax[10] = max(dmin[10], pmom)
+						return "Error: Unknown particle id=%s"%(sys.exc_info()[1])
+					ekin = numpy.maximum(rows["etot"] - mass, 0.0)
+				else:
+					continue
+
+				sel = numpy.ones(len(rows), bool)
+				if emin: sel &= ekin >= emin
+				if emax: sel &= ekin <= emax
+				if particles: sel &= numpy.isin(ptype, particles)
+
+				# number every accepted event (tracking) or particle (source)
+				if case == 0:
+					event = rows["event"]
+					accepted = numpy.unique(event[sel])
+					number = numpy.searchsorted(accepted, event) + i + 1
+					i += len(accepted)
+				else:
+					number = numpy.cumsum(sel) + i
+					i += int(sel.sum())
+				sel &= (number >= from_) & (number <= to_)
+				rows  = rows[sel]
+				ekin  = ekin[sel]
+				if len(rows)==0: continue
+
+				if case == 0:
+					# write as before the first ceil(ntrack/3) points
+					# of every event
+					event = rows["event"]
+					first = numpy.ones(len(rows), bool)
+					first[1:] = event[1:] != event[:-1]
+					start = numpy.flatnonzero(first)
+					count = numpy.diff(numpy.append(start, len(rows)))
+					point = numpy.arange(len(rows)) - numpy.repeat(start, count)
+					sel   = 3*point < numpy.repeat(count, count)-1
+					rows  = rows[sel]
+					ekin  = ekin[sel]
+					last  = numpy.ones(len(rows), bool)
+					last[:-1] = rows["event"][1:] != rows["event"][:-1]
+					for r,e,l in zip(rows.tolist(), ekin.tolist(), last):
+						fout.write("%d %g %g %g %g %g\n" % \
+							(r[1], e, r[3], r[4], r[5], r[6]))
+						if l: fout.write("\n")
 
-				#if time.time() - last > 2.0:
-				#	last = time.time()
-					#self.processed.config(text="%d"%(i))
-					#self.processed.update_idletasks()
+				else:
+					mass = _particleMass(rows["ptype"])
+					pmom = numpy.sqrt(ekin*(rows["etot"]+mass))
+					for r,e,p in zip(rows.tolist(), ekin.tolist(), pmom.tolist()):
+						fout.write("%d %g %g %g %g %g %g %g %g %g %g\n" % \
+							(tuple(r[2:]) + (e, p)))
+
+					for d,name in enumerate(Data.MGDRAW_SOURCE.names[2:]):
+						dmin[d] = min(dmin[d], float(rows[name].min()))
+						dmax[d] = max(dmax[d], float(rows[name].max()))
+					dmin[ 9] = min(dmin[ 9], float(ekin.min()))
+					dmin[10] = min(dmin[10], float(pmom.min()))
+					dmax[ 9] = max(dmax[ 9], float(ekin.max()))
+					dmax[10] = max(dmax[10], float(pmom.max()))
 
 		except KeyboardInterrupt:
 			self.log("*** Interrupted after %s s ***")
 		else:
 			self.log("Processing finished in %g s"%(time.time()-startTime))
-#		self.processed.config(text="%d"%(i))
 		mg.close()
 		fout.close()
 
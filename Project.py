@@ -49,10 +49,13 @@ import subprocess
 import tempfile
 from log import say
 from fnmatch import fnmatch
+from concurrent.futures import ThreadPoolExecutor
 
 import bmath
 import Input
 import Utils
+import Scheduler
+import RunTemplate
 
 __first = True
 section  = "Project"
@@ -69,6 +72,7 @@ STATUS_RUNNING      = 2
 STATUS_FINISHED     = 3
 STATUS_FINISHED_ERR = 4
 STATUS_TIMEOUT      = 5
+STATUS_QUEUED       = 6
 
 MAX_TIME            = 1.0E100
 
@@ -78,7 +82,8 @@ _statusColor = {
 	STATUS_RUNNING      : "DarkGreen",
 	STATUS_FINISHED     : "DarkBlue",
 	STATUS_FINISHED_ERR : "Red",
-	STATUS_TIMEOUT      : "Purple"
+	STATUS_TIMEOUT      : "Purple",
+	STATUS_QUEUED       : "Gray"
 }
 
 BOLD   = "\033[1m"
@@ -105,6 +110,7 @@ flukaDir        = ""			# Override fluka directory
 flukaExe        = DEFAULT_EXE		# Default fluka executable
 ccprogram       = "/usr/bin/cc"		# C compiler
 cppprogram      = "/usr/bin/c++"	# C++ compiler
+compileJobs     = 0			# parallel compilations (0=number of cpus)
 
 _checkedVar     = None			# Is directory already checked?
 
@@ -254,6 +260,7 @@ def initGlobalLayers():
 def loadConfig(config):
 	global tmpPrefix, cleanup, timeThreshold, refreshInterval, keepBackup
 	global editor, terminal, debugger, kill, flukaVar, flufor, flukaExe
+	global compileJobs
 	from tkFlair import getStr, getBool, getInt
 
 	tmpPrefi        = getStr(section, "tmpprefix",       tmpPrefix)
@@ -267,6 +274,7 @@ def loadConfig(config):
 	kill            = getStr(section, "kill",            kill)
 	flukaVar        = getStr(section, "flukavar",        flukaVar)
 	flufor          = getStr(section, "flufor",          flufor)
+	compileJobs     = getInt(section, "compilejobs",     compileJobs)
 
 	setCmd("rfluka",  getStr(section, "rfluka",  ""))
 	setCmd("rfluka",  getStr(section, "rfluka",  ""))
@@ -356,6 +364,26 @@ def _readBlock(f):
 			block += line
 	return block
 
+#-------------------------------------------------------------------------------
+def _makeDirs(path):
+	try:
+		os.makedirs(path)
+	except OSError:
+		pass
+
+#-------------------------------------------------------------------------------
+# write text to file keeping a backup of the old one
+#-------------------------------------------------------------------------------
+def _writeFile(filename, text):
+	_makeDirs(os.path.dirname(filename))
+	backupname = filename+"~"
+	try: os.remove(backupname)
+	except: pass
+	try: os.rename(filename, backupname)
+	except: pass
+	with open(filename, "w") as f:
+		f.write(text)
+
 #-------------------------------------------------------------------------------
 def setFlukaDir(path=""):
 	global flukaDir
@@ -1272,6 +1300,10 @@ class RunInfo:
 		self.maxtime   = MAX_TIME
 		self.exclude   = None
 		self.spawnName = ""	# Spawn pattern name (if not defined use default)
+		self.priority  = 0	# Scheduler priority
+		self.nice      = 0	# Scheduler nice level
+		self.cpus      = ""	# Scheduler cpus to pin the run e.g. 0-3
+		self.job       = 0	# Scheduler job id
 
 		self.parent    = ""	# parent name
 		self.family    = []	# other members of the family
@@ -1304,6 +1336,10 @@ class RunInfo:
 		f.write("\tPid:      %d\n" % (self.pid))
 		f.write("\tStartRun: %d\n" % (self.startRun))
 		if self.spawnName:      Input.utfWrite(f,"\tSpawnName: %s\n" % (self.spawnName))
+		if self.priority:	f.write("\tPriority: %d\n" % (self.priority))
+		if self.nice:		f.write("\tNice:     %d\n" % (self.nice))
+		if self.cpus:		f.write("\tCpus:     %s\n" % (self.cpus))
+		if self.job:		f.write("\tJob:      %d\n" % (self.job))
 		if self.parent:		Input.utfWrite(f,"\tParent:    %s\n" % (self.parent))
 		if len(self.family) > 0: f.write("\tFamily:  %s\n" \
 					% (" ".join(self.family)))
@@ -1331,6 +1367,10 @@ class RunInfo:
 			elif tag=="Pid":      self.pid       = int(val)
 			elif tag=="StartRun": self.startRun  = int(val)
 			elif tag=="SpawnName":self.spawnName = val
+			elif tag=="Priority": self.priority  = int(val)
+			elif tag=="Nice":     self.nice      = int(val)
+			elif tag=="Cpus":     self.cpus      = val
+			elif tag=="Job":      self.job       = int(val)
 			elif tag=="Parent":   self.parent    = val
 			elif tag=="Child":    child          = bool(int(val))
 			elif tag=="Defines":
@@ -1392,6 +1432,10 @@ class RunInfo:
 		self.startTime   = src.startTime
 		self.timeperprim = src.timeperprim
 		self.exclude     = src.exclude
+		self.priority    = src.priority
+		self.nice        = src.nice
+		self.cpus        = src.cpus
+		self.job         = src.job
 		self.usrinfo     = [x.clone() for x in src.usrinfo]
 		for u in self.usrinfo: u.run = self	# update run pointer
 
@@ -1572,8 +1616,10 @@ class RunInfo:
 
 	# ----------------------------------------------------------------------
 	# Start the run and try to attach
+	# errors: if not None the input was already written (Project.writeInputs)
+	#         and errors is the list of errors while writing it
 	# ----------------------------------------------------------------------
-	def start(self, cwd=None, defines=None, log=None):
+	def start(self, cwd=None, defines=None, log=None, errors=None):
 		if cwd is not None:
 			self._runDir = cwd
 		else:
@@ -1602,7 +1648,8 @@ class RunInfo:
 
 		# Prepare input file
 		rc = 0
-		errors = self.project.writeInput(self, cwd, defines)
+		if errors is None:
+			errors = self.project.writeInput(self, cwd, defines)
 		if errors:
 			for card,err in errors:
 				log(card)
@@ -1625,15 +1672,35 @@ class RunInfo:
 				"Please verify that the FLUKA directory\n" \
 				" %s=%s\nor the submit command are correct!" \
 				% (cmd[0], flukaVar, flukaDir))
+		if RunTemplate.enabled:
+			cmd = self._template(cmd, cwd, log)
 
-		stdout = open("%s.out"%(self.getInputBaseName()), "w")
+		outname = os.path.abspath("%s.out"%(self.getInputBaseName()))
+		stdout = open(outname, "w")
 		stdout.write("Dir: %s\n"%(cwd))
 		stdout.write("Cmd: %s\n"%(" ".join(list(cmd))))
 		log("Dir: %s"%(cwd))
 		log("Cmd: %s"%(" ".join(list(cmd))))
 
-		# Exclude existing directories
-		self.exclude = [d for d,f in self.findFlukaDirs(check_core=False)]
+		# Exclude existing directories, only the names are needed
+		# as the new run cannot be in any of them
+		self.exclude = [d for d in Utils.listdir(cwd) if _PAT_DIR.match(d)]
+
+		if self.project.submit == Scheduler.QUEUE:
+			# queue it, the scheduler spawns it when a slot is free
+			stdout.close()
+			self._popen = None
+			try:
+				cpus = Scheduler.parseCpus(self.cpus)
+			except ValueError:
+				raise RunException("Invalid cpu list \"%s\"" % (self.cpus))
+			self.job = Scheduler.scheduler().submit(Scheduler.KIND_RUN,
+					self.getInputBaseName(), cmd, cwd, outname,
+					self.priority, self.nice or None, cpus)
+			self.status = STATUS_QUEUED
+			self.checkQueue()
+			log("Job: %d"%(self.job))
+			return rc
 
 		# spawn in the background
 		self._popen = subprocess.Popen(cmd,
@@ -1644,14 +1711,88 @@ class RunInfo:
 					preexec_fn=os.setpgrp)	# start a new session, detach from the father
 
 		# Change status to reflect changes
+		self.job        = 0
+		self._started(time.time())
+		return rc
+
+	# ----------------------------------------------------------------------
+	# Use the run template: the user executable is replaced by its
+	# snapshot and the read-only files are linked in the run directory
+	# ----------------------------------------------------------------------
+	def _template(self, cmd, cwd, log):
+		cmd = list(cmd)
+		try:
+			# skip the submit command arguments
+			i = cmd.index("-e", cmd.index(command("rfluka"))+1) + 1
+		except ValueError:
+			i = 0
+		try:
+			if i:
+				tmpl = RunTemplate.template(self.project.dir, cmd[i],
+						self.project.input)
+				cmd[i] = tmpl.executable
+			else:
+				tmpl = RunTemplate.template(self.project.dir,
+						self.project.executable(self),
+						self.project.input, False)
+			tmpl.overlay(cwd)
+		except OSError:
+			log("WARNING: Cannot prepare run template: %s"%(sys.exc_info()[1]))
+		return tuple(cmd)
+
+	# ----------------------------------------------------------------------
+	def _started(self, t):
 		self.status     = STATUS_WAIT2ATTACH	# Wait for the second update
-		self.startRun   = time.time()
-		self.attachTime = self.startRun
+		self.startRun   = t
+		self.attachTime = time.time()
 		self.initime    = 0
 		self.maxtime    = MAX_TIME
 		self._lastOut   = None			# last output file opened
 		self._lastPos   = 0			# last output file position scanned
-		return rc
+
+	# ----------------------------------------------------------------------
+	# Check a queued run if it was started by the scheduler
+	# @param jobs	optional Scheduler.snapshot() to check many runs
+	# @return True if status changed
+	# ----------------------------------------------------------------------
+	def checkQueue(self, jobs=None):
+		if self.status != STATUS_QUEUED: return False
+		if jobs is None:
+			job = Scheduler.scheduler().job(self.job)
+		else:
+			job = jobs.get(self.job)
+		if job is None or job.status == Scheduler.JOB_CANCELLED:
+			self.status = STATUS_NOT_RUNNING
+		elif job.status == Scheduler.JOB_QUEUED:
+			return False
+		else:
+			self._started(job.started)
+		return True
+
+	# ----------------------------------------------------------------------
+	# Remove the run from the scheduler queue
+	# ----------------------------------------------------------------------
+	def dequeue(self):
+		runs = [self]
+		runs.extend([self.project.getRunByName(child, self.name)
+				for child in self.family])
+		for run in runs:
+			if run is None or run.status != STATUS_QUEUED: continue
+			if run.job: Scheduler.scheduler().cancel(run.job)
+			run.status = STATUS_NOT_RUNNING
+
+	# ----------------------------------------------------------------------
+	# Wait for the process spawned by start() to finish
+	# @return exit code or None if not started from this session
+	# ----------------------------------------------------------------------
+	def wait(self):
+		if self.job:
+			rc = Scheduler.scheduler().wait(self.job)
+			self.checkQueue()
+			return rc
+		popen = getattr(self, "_popen", None)
+		if popen is None: return None
+		return popen.wait()
 
 	# ----------------------------------------------------------------------
 	# Attach to a process
@@ -1721,7 +1862,9 @@ class RunInfo:
 			return False
 
 		errors = False
-		for fn in Utils.listdir(rundir):
+		files  = Utils.listdir(rundir)
+		RunTemplate.purge(rundir, files)
+		for fn in files:
 			if exclude:
 				if isinstance(exclude,list):
 					skip = False
@@ -1750,7 +1893,7 @@ class RunInfo:
 				if found:
 					say("Remove folder: "+fn)
 					try:
-						shutil.rmtree(dfn)
+						RunTemplate.remove(dfn)
 					except OSError:
 						say(sys.exc_info()[1])
 						errors = True
@@ -1761,8 +1904,6 @@ class RunInfo:
 	# @param output	if True check the running output for # events handled
 	# ----------------------------------------------------------------------
 	def refresh(self, output=False):
-		inpname = self.getInputBaseName()
-
 		# Check directory if it exists
 		rundir = "%s/fluka_%d" % (self._getRunDir(), self.pid)
 		try:
@@ -1773,22 +1914,7 @@ class RunInfo:
 			return
 
 		# find if cycle still exist
-		found = False
-		for self.cycle in range(self.cycle, self.last+1):
-			try:
-				fnout = "%s/%s%03d.out" % (rundir, inpname, self.cycle)
-				outstat = os.stat(fnout)
-				found = True
-				break
-			except OSError:
-				pass
-			try:
-				logstat = os.stat("%s/%s%03d.log" \
-					% (rundir, inpname, self.cycle))
-				found = True
-				break
-			except OSError:
-				pass
+		fnout = self.findCycle(rundir)
 
 		# Check if a core.### file exists
 		maxtime = 0
@@ -1815,19 +1941,58 @@ class RunInfo:
 
 		# No output, log file and no core try to re-attach
 		# FIXME Should have a counter, how many times to attach
-		if not found:
-			self.status    = STATUS_WAIT2ATTACH
-			self.pid       = 0
-			self.cycle     = 0
-			self.handled   = 0
-			self.startTime = 0
+		if fnout is None:
+			self.lost()
 			return
 
 		# Running
 		self.status = STATUS_RUNNING
 		if not output: return
 
-		# Find progress
+		self.scanOutput(fnout)
+
+		# Get the starting time from when the fort.2 file was modified
+		try:
+			self.startTime = os.lstat("%s/fort.1"%(rundir)).st_mtime
+		except:
+			self.startTime = 0
+
+	# ----------------------------------------------------------------------
+	# Find the running cycle starting from the current one
+	# @return the output filename of the cycle or None if no output or log
+	#         file exists
+	# ----------------------------------------------------------------------
+	def findCycle(self, rundir):
+		inpname = self.getInputBaseName()
+		for self.cycle in range(self.cycle, self.last+1):
+			fnout = "%s/%s%03d.out" % (rundir, inpname, self.cycle)
+			try:
+				os.stat(fnout)
+				return fnout
+			except OSError:
+				pass
+			try:
+				os.stat("%s/%s%03d.log" % (rundir, inpname, self.cycle))
+				return fnout
+			except OSError:
+				pass
+		return None
+
+	# ----------------------------------------------------------------------
+	# Output and log files disappeared, try to re-attach
+	# ----------------------------------------------------------------------
+	def lost(self):
+		self.status    = STATUS_WAIT2ATTACH
+		self.pid       = 0
+		self.cycle     = 0
+		self.handled   = 0
+		self.startTime = 0
+
+	# ----------------------------------------------------------------------
+	# Scan the output file of the cycle for the progress, continuing from
+	# the last position scanned
+	# ----------------------------------------------------------------------
+	def scanOutput(self, fnout):
 		if fnout != self._lastOut:
 			# New file reset information
 			self._lastOut    = fnout
@@ -1849,7 +2014,7 @@ class RunInfo:
 
 		if self._lastPos: f.seek(self._lastPos)
 		nextseed = prev = ""
-		offset=0
+		offset = self._lastPos
 		for line in f:
 			offset += len(line)
 			if line.startswith(" NEXT SEEDS:"):
@@ -1876,12 +2041,6 @@ class RunInfo:
 			except:
 				pass
 
-		# Get the starting time from when the fort.2 file was modified
-		try:
-			self.startTime = os.lstat("%s/fort.1"%(rundir)).st_mtime
-		except:
-			self.startTime = 0
-
 	# ----------------------------------------------------------------------
 	def _stop(self, stopfile):
 		def _stopRun(run):
@@ -2649,13 +2808,19 @@ class Project:
 				filename = os.path.basename(filename)
 			self.inputFile = self.relativePath(filename)
 			self.inputName, ext = os.path.splitext(self.inputFile)
+		elif self.inputFile != "" and not self.isInputModified() and \
+		     self.input.filename == self.inputFile and self.reloadInput():
+			return
 		self.setInputModified(False)
 		del self.input
 		self.input = Input.Input()
 		if self.inputFile != "":
+			cachefile = self.inputCacheFile()
 			try:
-				self.input.read(self.inputFile)
-				self.input.convert2Names()
+				if not self.input.loadCache(cachefile, self.inputFile):
+					self.input.read(self.inputFile)
+					self.input.convert2Names()
+					self.input.saveCache(cachefile)
 			except (IOError, OSError):
 				say("ERROR:",sys.exc_info()[1])
 			if len(self.title)==0:
@@ -2665,6 +2830,35 @@ class Project:
 				except:
 					pass
 
+	# ----------------------------------------------------------------------
+	# Reload the input re-parsing only the #include files that changed
+	# ----------------------------------------------------------------------
+	def reloadInput(self):
+		"""Reload only the modified #include files of the input,
+		   return False if the whole input has to be loaded"""
+		try:
+			ranges = self.input.reload()
+		except (IOError, OSError):
+			return False
+		if ranges is None: return False
+		for fromPos, toPos in ranges:
+			self.input.convert2Names(fromPos, toPos)
+		if ranges:
+			self.input.saveCache(self.inputCacheFile())
+		self.setInputModified(False)
+		return True
+
+	# ----------------------------------------------------------------------
+	# Binary cache of the parsed input, kept next to the project file
+	# ----------------------------------------------------------------------
+	def inputCacheFile(self):
+		"""return the filename of the parsed input cache"""
+		if self.projFile:
+			path, name = os.path.split(self.projFile)
+		else:
+			path, name = os.path.split(os.path.abspath(self.inputFile))
+		return os.path.join(path, ".%s.cache"%(name))
+
 	# ----------------------------------------------------------------------
 	# Save input file
 	# ----------------------------------------------------------------------
@@ -2908,29 +3102,126 @@ class Project:
 	def writeInput(self, run=None, cwd=None, defines=None):
 		"""Write the input file with the info in Run"""
 
-		# If default input
-		if run is None or run.name == DEFAULT_INPUT:
-			# if we are writing the default input in the default directory
-			# ---> use the standard writing routine
-			if (cwd is None or cwd == self.dir) and defines is None:
-				if self.isInputModified(): self.saveInput()
-				return
-			else:
-				# else create a clone of the input
-				defaultDefines = False
-				run = self.runs[0]
+		# If we are writing the default input in the default directory
+		# ---> use the standard writing routine
+		if self._isSourceInput(run, cwd):
+			if self.isInputModified(): self.saveInput()
+			return
 
-		else:
-			# Create a clone and override parameters if necessary
-			defaultDefines = False
-			if run.parent != "":
-				parent = self.findParentRun(run)
-				if parent is not None and parent.name == DEFAULT_INPUT:
-					defaultDefines = True
+		run, defines = self._runDefines(run, defines)
 
 		# Special Run override in needed
 		runInput = self.input.clone()
+		self._runOverride(runInput, run)
+		if defines is not None:
+			self._runOverrideDefines(runInput, defines)
+
+		if cwd is not None:
+			inpfile = "%s/%s.inp"%(cwd, run.getInputBaseName())
+		else:
+			inpfile = "%s.inp"%(run.name)
+		errors = runInput.preprocess()
+		runInput.write(inpfile)
+		del runInput
+		return errors
 
+	# ----------------------------------------------------------------------
+	# Write the input files of many runs at once. Runs sharing the same
+	# defines are preprocessed and written only once, the cards that
+	# differ (TITLE, RANDOMIZ, START) are patched for each run and the
+	# files are written in parallel
+	# @param runs	list of runs
+	# @param cwds	list of directories to write to (default run.getDir())
+	# @return list of preprocessing errors for each run, None for the
+	#	runs using the project input file which is never overwritten
+	# ----------------------------------------------------------------------
+	def writeInputs(self, runs, cwds=None, defines=None, workers=None):
+		"""Write the input files of many runs"""
+		if cwds is None: cwds = [run.getDir() for run in runs]
+
+		# Group runs with the same defines
+		groups = {}
+		for i,run in enumerate(runs):
+			if self._isSourceInput(run, cwds[i]):
+				if self.isInputModified(): self.saveInput()
+				continue
+			run, defs = self._runDefines(run, defines)
+			key = defs if defs is None else tuple(map(tuple,defs))
+			try:
+				groups[key][1].append(i)
+			except KeyError:
+				groups[key] = (defs, [i])
+
+		errors = [None]*len(runs)
+		files  = []
+		for defs, idx in groups.values():
+			runInput = self.input.clone()
+			if defs is not None:
+				self._runOverrideDefines(runInput, defs)
+			err = runInput.preprocess()
+
+			cards = []
+			for tag in ("TITLE", "RANDOMIZ", "START"):
+				cards.extend(runInput[tag])
+			template = runInput.writeSpans(cards)
+
+			for i in idx:
+				errors[i] = err[:]
+				run = runs[i]
+				if run.name == DEFAULT_INPUT: run = self.runs[0]
+				inpfile = "%s/%s.inp"%(cwds[i], run.getInputBaseName())
+
+				saved = [(card, card.whats()[:], card.extra()) for card in cards]
+				self._runOverride(runInput, run)
+				if template is not None:
+					files.append((inpfile, runInput.patchSpans(*template)))
+				else:
+					# Cannot be written as a single text
+					_makeDirs(cwds[i])
+					runInput.write(inpfile)
+				for card, whats, extra in saved:
+					card.setWhats(whats)
+					card.setExtra(extra)
+			del runInput
+
+		# Write all files
+		if files:
+			if workers is None: workers = os.cpu_count() or 1
+			workers = min(len(files), workers)
+			with ThreadPoolExecutor(workers) as pool:
+				for _ in pool.map(lambda x: _writeFile(*x), files): pass
+		return errors
+
+	# ----------------------------------------------------------------------
+	# Return True if the input of the run written in cwd would be
+	# the project input file
+	# ----------------------------------------------------------------------
+	def _isSourceInput(self, run, cwd):
+		if run is None or run.name == DEFAULT_INPUT:
+			run = self.runs[0]
+		if cwd is None: cwd = self.dir
+		inpfile = os.path.join(cwd, "%s.inp"%(run.getInputBaseName()))
+		return os.path.abspath(inpfile) == \
+			os.path.abspath(os.path.join(self.dir, self.inputFile))
+
+	# ----------------------------------------------------------------------
+	# Return the run and the defines to use when writing its input.
+	# defines is None if the #define cards should be left as in the input
+	# ----------------------------------------------------------------------
+	def _runDefines(self, run, defines):
+		if run is None or run.name == DEFAULT_INPUT:
+			run = self.runs[0]
+		elif run.parent != "":
+			parent = self.findParentRun(run)
+			if parent is not None and parent.name == DEFAULT_INPUT:
+				return run, None
+		if defines is None: defines = run.defines
+		return run, defines
+
+	# ----------------------------------------------------------------------
+	# Override title, random seed, primaries and time of the run input
+	# ----------------------------------------------------------------------
+	def _runOverride(self, runInput, run):
 		if run.title != "":
 			# Modify title cards
 			for card in runInput["TITLE"]:
@@ -2949,32 +3240,23 @@ class Project:
 				if run.time  != 0:
 					card.setWhat(6, run.time)
 
-		if defines is None: defines = run.defines
-
-		# if there are defines and we unselect all
-		# then the defines will be empty and don't work!!
-		if not defaultDefines: #and defines:
-			# Modify #define cards
-			for card in runInput["#define"]:
-				if card._indent != 0: continue
-				# Search if it exists on defines
-				name = card.sdum()
-				for n,v in defines:
-					if n == name:
-						card.setEnable(True)
-						if v != "": card.setWhat(1,v)
-						break
-				else:
-					card.setEnable(False)
-
-		if cwd is not None:
-			inpfile = "%s/%s.inp"%(cwd, run.getInputBaseName())
-		else:
-			inpfile = "%s.inp"%(run.name)
-		errors = runInput.preprocess()
-		runInput.write(inpfile)
-		del runInput
-		return errors
+	# ----------------------------------------------------------------------
+	# Override the #define cards of the run input
+	# if there are defines and we unselect all
+	# then the defines will be empty and don't work!!
+	# ----------------------------------------------------------------------
+	def _runOverrideDefines(self, runInput, defines):
+		for card in runInput["#define"]:
+			if card._indent != 0: continue
+			# Search if it exists on defines
+			name = card.sdum()
+			for n,v in defines:
+				if n == name:
+					card.setEnable(True)
+					if v != "": card.setWhat(1,v)
+					break
+			else:
+				card.setEnable(False)
 
 	# ----------------------------------------------------------------------
 	# return a tuple to spawn a fluka command
@@ -3150,12 +3432,8 @@ class Project:
 				os.remove(fn)
 
 		if pid is not None:
-			rundir = "fluka_%d" % (pid)
 			try:
-				os.stat(rundir)
-				for f in Utils.listdir(rundir):
-					os.remove("%s/%s"%(rundir,f))
-				os.rmdir(rundir)
+				RunTemplate.remove("fluka_%d" % (pid))
 			except OSError:
 				pass
 
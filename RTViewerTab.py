@@ -758,7 +758,7 @@ class RTViewerTab(FlairRibbon.FlairTab):
 	def _readUsrbin(self,filename):
 		""" read Usrbin variables """
 		usrbin=Data.Usrbin(filename)
-		BinMatrix =Data.unpackArray(usrbin.readData(0)) #there should be only one detector or the first one
+		BinMatrix = usrbin.array(0).T	#there should be only one detector or the first one
 
 		Dim	=[int(usrbin.detector[0].nx),int(usrbin.detector[0].ny),int(usrbin.detector[0].nz)]
 		BinSize =[float(usrbin.detector[0].dx)*10,float(usrbin.detector[0].dy)*10,float(usrbin.detector[0].dz)*10]
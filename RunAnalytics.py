@@ -0,0 +1,456 @@
+# 
+#
+# Copyright and User License
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Copyright 2006-2019 CERN and INFN
+# 
+#
+# Please consult the LICENSE file for the license 
+#
+# DISCLAIMER
+# ~~~~~~~~~~
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT
+# NOT LIMITED TO, IMPLIED WARRANTIES OF MERCHANTABILITY, OF
+# SATISFACTORY QUALITY, AND FITNESS FOR A PARTICULAR PURPOSE
+# OR USE ARE DISCLAIMED. THE COPYRIGHT HOLDERS AND THE
+# AUTHORS MAKE NO REPRESENTATION THAT THE SOFTWARE AND
+# MODIFICATIONS THEREOF, WILL NOT INFRINGE ANY PATENT,
+# COPYRIGHT, TRADE SECRET OR OTHER PROPRIETARY RIGHT.
+#
+# LIMITATION OF LIABILITY
+# ~~~~~~~~~~~~~~~~~~~~~~~
+# THE COPYRIGHT HOLDERS AND THE AUTHORS SHALL HAVE NO
+# LIABILITY FOR DIRECT, INDIRECT, SPECIAL, INCIDENTAL,
+# CONSEQUENTIAL, EXEMPLARY, OR PUNITIVE DAMAGES OF ANY
+# CHARACTER INCLUDING, WITHOUT LIMITATION, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES, LOSS OF USE, DATA OR PROFITS,
+# OR BUSINESS INTERRUPTION, HOWEVER CAUSED AND ON ANY THEORY
+# OF CONTRACT, WARRANTY, TORT (INCLUDING NEGLIGENCE), PRODUCT
+# LIABILITY OR OTHERWISE, ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGES.
+#
+# Date:	18-Oct-2026
+
+__author__ = "Vasilis Vlachoudis"
+__email__  = "Paola.Sala@mi.infn.it"
+
+import os
+import re
+import time
+
+import Utils
+import Project
+
+#-------------------------------------------------------------------------------
+# Run analytics
+#
+# The output files of every cycle are parsed incrementally into a compact
+# time series of the progress. From the series the speed of the run is
+# estimated (median and quartiles of the seconds per primary) giving the
+# remaining time with its bounds, and the runs that stopped progressing
+# or are much slower than the others are spotted, well before the
+# timeThreshold declares them dead.
+#-------------------------------------------------------------------------------
+maxSamples      = 256		# samples kept per cycle
+maxEstimates    = 64		# latest speed estimates used per run
+stallFactor     = 5.0		# stalled: no activity for stallFactor
+stallMinimum    = 60.0		#          x usual interval, and at least [s]
+stragglerFactor = 2.0		# straggler: slower than the median run
+
+STATE_IDLE      = "idle"
+STATE_RUNNING   = "running"
+STATE_STRAGGLER = "straggler"
+STATE_STALLED   = "stalled"
+STATE_FINISHED  = "finished"
+
+_NEXT_SEEDS = " NEXT SEEDS:"
+_INITIME    = " Total time used for initialization:"
+_MAXTIME    = " Maximum cpu-time allocated for this run:"
+
+#-------------------------------------------------------------------------------
+# @return percentile q [0..1] of values with linear interpolation
+#-------------------------------------------------------------------------------
+def percentile(values, q):
+	if not values: return None
+	values = sorted(values)
+	x = q * (len(values)-1)
+	i = int(x)
+	if i+1 >= len(values): return values[-1]
+	return values[i] + (values[i+1]-values[i]) * (x-i)
+
+#===============================================================================
+# Progress of one cycle
+#===============================================================================
+class Cycle:
+	def __init__(self, cycle):
+		self.cycle    = cycle
+		self.initime  = 0.0	# initialization cpu time [s]
+		self.maxtime  = 0.0	# cpu time allocated [s]
+		self.samples  = []	# (time, handled, remaining, cpu time/primary)
+		self.end      = 0.0	# time the cycle finished, 0 if running
+		self.activity = 0.0	# last modification of the .out/.log files
+
+	# ----------------------------------------------------------------------
+	def add(self, t, handled, remaining, timeperprim):
+		if self.samples and handled <= self.samples[-1][1]: return
+		self.samples.append((t, handled, remaining, timeperprim))
+		if len(self.samples) > maxSamples:
+			# keep the series compact, half resolution for the old part
+			last = self.samples[-1]
+			self.samples = self.samples[:-1:2] + [last]
+
+	# ----------------------------------------------------------------------
+	def finished(self):
+		return self.end > 0.0
+
+	# ----------------------------------------------------------------------
+	def handled(self):
+		return self.samples and self.samples[-1][1] or 0
+
+	# ----------------------------------------------------------------------
+	def remaining(self):
+		return self.samples and self.samples[-1][2] or 0
+
+	# ----------------------------------------------------------------------
+	def primaries(self):
+		return self.handled() + self.remaining()
+
+	# ----------------------------------------------------------------------
+	# @return cpu time per primary reported by fluka
+	# ----------------------------------------------------------------------
+	def cpuPerPrimary(self):
+		return self.samples and self.samples[-1][3] or 0.0
+
+	# ----------------------------------------------------------------------
+	# @return list of wall time per primary between the samples
+	# ----------------------------------------------------------------------
+	def wallPerPrimary(self):
+		rates = []
+		for a,b in zip(self.samples, self.samples[1:]):
+			dt = b[0] - a[0]
+			dh = b[1] - a[1]
+			if dt > 0.0 and dh > 0: rates.append(dt/dh)
+		return rates
+
+	# ----------------------------------------------------------------------
+	# @return list of intervals between progress reports
+	# ----------------------------------------------------------------------
+	def intervals(self):
+		return [b[0]-a[0] for a,b in zip(self.samples, self.samples[1:])
+				if b[0] > a[0]]
+
+#===============================================================================
+# Statistics of a run from all its cycles
+#===============================================================================
+class RunStats:
+	def __init__(self, run):
+		self.run     = run
+		self.cycles  = {}	# cycle: Cycle
+		self.state   = STATE_IDLE
+		self._offset = {}	# filename: position parsed
+		self._pat    = re.compile(r"^%s(\d\d\d)\.(out|log)$" \
+				% (re.escape(run.getInputBaseName())))
+
+	# ----------------------------------------------------------------------
+	def cycle(self, n):
+		c = self.cycles.get(n)
+		if c is None:
+			c = self.cycles[n] = Cycle(n)
+		return c
+
+	# ----------------------------------------------------------------------
+	# @return the running cycle or None
+	# ----------------------------------------------------------------------
+	def current(self):
+		running = [c for c in self.cycles.values() if not c.finished()]
+		if not running: return None
+		return max(running, key=lambda c: c.cycle)
+
+	# ----------------------------------------------------------------------
+	# Scan the run directory and parse the new output
+	# ----------------------------------------------------------------------
+	def update(self, now=None):
+		if now is None: now = time.time()
+		rundir = self.run._getRunDir()
+		try:
+			names = Utils.listdir(rundir)
+		except OSError:
+			names = []
+
+		files = []	# (path, cycle, finished)
+		for name in names:
+			m = self._pat.match(name)
+			if m:
+				files.append((os.path.join(rundir,name), int(m.group(1)), True))
+			elif Project._PAT_DIR.match(name):
+				path = os.path.join(rundir, name)
+				try:
+					sub = Utils.listdir(path)
+				except OSError:
+					continue
+				for n in sub:
+					m = self._pat.match(n)
+					if m:
+						files.append((os.path.join(path,n), int(m.group(1)), False))
+
+		# parse the running cycles first, the moved files finish them
+		files.sort(key=lambda x: (x[1], x[2]))
+		for path, n, finished in files:
+			try:
+				st = os.stat(path)
+			except OSError:
+				continue
+			c = self.cycle(n)
+			c.activity = max(c.activity, st.st_mtime)
+			if finished and path.endswith(".out"):
+				c.end = max(c.end, st.st_mtime)
+			if path.endswith(".out"):
+				self._parse(path, c, st)
+
+		self.state = self._state(now)
+
+	# ----------------------------------------------------------------------
+	# Parse the complete lines appended to an output file
+	# ----------------------------------------------------------------------
+	def _parse(self, path, c, st):
+		offset = self._offset.get(path, 0)
+		if st.st_size <= offset: return
+		try:
+			with open(path, "rb") as f:
+				f.seek(offset)
+				data = f.read(st.st_size - offset)
+		except (OSError, IOError):
+			return
+		end = data.rfind(b"\n")
+		if end < 0: return
+		self._offset[path] = offset + end + 1
+
+		prev = ""
+		for line in data[:end].decode(errors="ignore").splitlines():
+			if line.startswith(_NEXT_SEEDS):
+				fields = prev.split()
+				try:
+					c.add(st.st_mtime, int(fields[0]), int(fields[1]),
+						float(fields[3]))
+				except (IndexError, ValueError):
+					pass
+			elif line.startswith(_INITIME):
+				try: c.initime = float(line.split()[-2])
+				except (IndexError, ValueError): pass
+			elif line.startswith(_MAXTIME):
+				try: c.maxtime = float(line.split()[-2])
+				except (IndexError, ValueError): pass
+			prev = line
+
+	# ----------------------------------------------------------------------
+	# @return list of wall (or cpu when not available) seconds per primary
+	#         from the latest cycles
+	# ----------------------------------------------------------------------
+	def estimates(self):
+		wall = []
+		cpu  = []
+		cycles = sorted(self.cycles.values(), key=lambda c: c.cycle)
+		for prev, c in zip([None]+cycles, cycles):
+			wall.extend(c.wallPerPrimary())
+			if c.finished() and prev is not None and prev.finished() \
+			   and c.handled() > 0 and prev.cycle == c.cycle-1:
+				# whole cycle, from the end of the previous one
+				dt = c.end - prev.end - c.initime
+				if dt > 0.0: wall.append(dt / c.handled())
+			# the samples read at once share the same time, the spread
+			# of the reported cpu time per primary gives the bounds
+			cpu.extend(s[3] for s in c.samples if s[3] > 0.0)
+		return (wall or cpu)[-maxEstimates:]
+
+	# ----------------------------------------------------------------------
+	# @return seconds per primary as (median, 1st quartile, 3rd quartile)
+	#         or None if unknown
+	# ----------------------------------------------------------------------
+	def speed(self):
+		values = self.estimates()
+		if not values: return None
+		return percentile(values,0.5), percentile(values,0.25), percentile(values,0.75)
+
+	# ----------------------------------------------------------------------
+	# @return remaining seconds as (eta, low, high) or None if unknown
+	# ----------------------------------------------------------------------
+	def eta(self):
+		if self.state == STATE_FINISHED: return 0.0, 0.0, 0.0
+		speed = self.speed()
+		if speed is None: return None
+
+		run  = self.run
+		cur  = self.current()
+		done = [c for c in self.cycles.values() if c.finished()]
+		last = max([c for c in self.cycles.values()], key=lambda c: c.cycle)
+		primaries = last.primaries() or run.primaries
+		initime   = percentile([c.initime for c in self.cycles.values()
+					if c.initime>0.0], 0.5) or 0.0
+
+		if cur is not None:
+			left   = cur.remaining()
+			cycles = run.last - cur.cycle
+		else:
+			left   = 0
+			cycles = run.last - max([c.cycle for c in done] + [run.prev])
+		left += cycles * primaries
+		init  = cycles * initime
+		return tuple(left*s + init for s in speed)
+
+	# ----------------------------------------------------------------------
+	def _state(self, now):
+		cur = self.current()
+		if cur is None:
+			done = [c.cycle for c in self.cycles.values() if c.finished()]
+			if done and max(done) >= self.run.last:
+				return STATE_FINISHED
+			return STATE_IDLE
+
+		interval = percentile(cur.intervals() or
+				[i for c in self.cycles.values() for i in c.intervals()], 0.5)
+		if interval:
+			limit = max(stallMinimum, stallFactor*interval)
+			limit = min(limit, Project.timeThreshold)
+		else:
+			# no history of the reporting interval, e.g. a single scan
+			limit = Project.timeThreshold
+		if now - cur.activity > limit:
+			return STATE_STALLED
+		return STATE_RUNNING
+
+	# ----------------------------------------------------------------------
+	# @return dictionary with the analysis of the run
+	# ----------------------------------------------------------------------
+	def info(self):
+		cur   = self.current()
+		speed = self.speed()
+		eta   = self.eta()
+		d = {	"run"      : self.run.name,
+			"state"    : self.state,
+			"cycle"    : cur and cur.cycle or 0,
+			"finished" : len([c for c in self.cycles.values() if c.finished()]),
+			"last"     : self.run.last }
+		if cur is not None:
+			d["handled"]   = cur.handled()
+			d["remaining"] = cur.remaining()
+			d["cputime"]   = cur.cpuPerPrimary()
+			d["initime"]   = cur.initime
+		if speed is not None:
+			d["rate"] = speed[0]>0.0 and 1.0/speed[0] or 0.0
+		if eta is not None:
+			d["eta"], d["eta_low"], d["eta_high"] = eta
+		return d
+
+#===============================================================================
+# Analytics of the runs of a project
+#===============================================================================
+class Analytics:
+	def __init__(self, project):
+		self.project = project
+		self._stats  = {}	# (parent, name): RunStats
+
+	# ----------------------------------------------------------------------
+	# @return the RunStats of a single run
+	# ----------------------------------------------------------------------
+	def stats(self, run):
+		key = (run.parent, run.name)
+		s = self._stats.get(key)
+		if s is None or s.run is not run:
+			s = self._stats[key] = RunStats(run)
+		return s
+
+	# ----------------------------------------------------------------------
+	# @return list of the runs that do the work, families expanded
+	# ----------------------------------------------------------------------
+	def runs(self, runs=None):
+		result = []
+		for run in runs or self.project.runs:
+			if run.family:
+				for child in run.family:
+					r = self.project.getRunByName(child, run.name)
+					if r is not None and r not in result:
+						result.append(r)
+			elif run not in result:
+				result.append(run)
+		return result
+
+	# ----------------------------------------------------------------------
+	# Parse the new output of the runs and mark the stragglers
+	# ----------------------------------------------------------------------
+	def update(self, runs=None, now=None):
+		if now is None: now = time.time()
+		stats = [self.stats(r) for r in self.runs(runs)]
+		for s in stats: s.update(now)
+
+		# runs much slower than the median of the running ones
+		running = [s for s in stats if s.state == STATE_RUNNING]
+		speeds  = [(s, s.speed()) for s in running]
+		speeds  = [(s, v[0]) for s,v in speeds if v is not None]
+		if len(speeds) >= 3:
+			median = percentile([v for s,v in speeds], 0.5)
+			for s,v in speeds:
+				if v > stragglerFactor * median:
+					s.state = STATE_STRAGGLER
+		return stats
+
+	# ----------------------------------------------------------------------
+	# @return (eta, low, high) remaining seconds of a run or a family,
+	#         or None if unknown
+	# ----------------------------------------------------------------------
+	def eta(self, run):
+		etas = [self.stats(r).eta() for r in self.runs([run])]
+		if not etas or None in etas: return None
+		# the children run in parallel
+		return tuple(max(x) for x in zip(*etas))
+
+	# ----------------------------------------------------------------------
+	# @return list of the runs stalled or straggling
+	# ----------------------------------------------------------------------
+	def suspicious(self):
+		return [s.run for s in self._stats.values()
+				if s.state in (STATE_STALLED, STATE_STRAGGLER)]
+
+	# ----------------------------------------------------------------------
+	# @return report as a list of dictionaries
+	# ----------------------------------------------------------------------
+	def report(self, runs=None):
+		result = []
+		for run in runs or self.project.runs:
+			if run.family:
+				d = {"run": run.name,
+				     "children": [self.stats(r).info()
+						for r in self.runs([run])]}
+				eta = self.eta(run)
+				if eta is not None:
+					d["eta"], d["eta_low"], d["eta_high"] = eta
+				result.append(d)
+			else:
+				result.append(self.stats(run).info())
+		return result
+
+	# ----------------------------------------------------------------------
+	# Write a text table of the report
+	# ----------------------------------------------------------------------
+	def write(self, out, runs=None):
+		fmt = "%-24s %-10s %7s %10s %10s %24s\n"
+		out(fmt%("Run","State","Cycle","Prim/s","CPU/prim","ETA [low-high]"))
+		def line(d, indent=""):
+			eta = ""
+			if "eta" in d:
+				eta = "%s [%s-%s]"%(Utils.friendlyTime(round(d["eta"])),
+						Utils.friendlyTime(round(d["eta_low"])),
+						Utils.friendlyTime(round(d["eta_high"])))
+			if "children" in d:
+				cycle = ""
+			else:
+				cycle = "%d/%d"%(d["finished"], d["last"])
+			out(fmt%(indent+d["run"], d.get("state",""), cycle,
+				"rate" in d and "%.4g"%(d["rate"]) or "",
+				"cputime" in d and "%.4g"%(d["cputime"]) or "",
+				eta))
+			for child in d.get("children",[]):
+				line(child, "  ")
+		for d in self.report(runs):
+			line(d)
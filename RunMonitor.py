@@ -0,0 +1,414 @@
+# 
+#
+# Copyright and User License
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Copyright 2006-2019 CERN and INFN
+# 
+#
+# Please consult the LICENSE file for the license 
+#
+# DISCLAIMER
+# ~~~~~~~~~~
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT
+# NOT LIMITED TO, IMPLIED WARRANTIES OF MERCHANTABILITY, OF
+# SATISFACTORY QUALITY, AND FITNESS FOR A PARTICULAR PURPOSE
+# OR USE ARE DISCLAIMED. THE COPYRIGHT HOLDERS AND THE
+# AUTHORS MAKE NO REPRESENTATION THAT THE SOFTWARE AND
+# MODIFICATIONS THEREOF, WILL NOT INFRINGE ANY PATENT,
+# COPYRIGHT, TRADE SECRET OR OTHER PROPRIETARY RIGHT.
+#
+# LIMITATION OF LIABILITY
+# ~~~~~~~~~~~~~~~~~~~~~~~
+# THE COPYRIGHT HOLDERS AND THE AUTHORS SHALL HAVE NO
+# LIABILITY FOR DIRECT, INDIRECT, SPECIAL, INCIDENTAL,
+# CONSEQUENTIAL, EXEMPLARY, OR PUNITIVE DAMAGES OF ANY
+# CHARACTER INCLUDING, WITHOUT LIMITATION, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES, LOSS OF USE, DATA OR PROFITS,
+# OR BUSINESS INTERRUPTION, HOWEVER CAUSED AND ON ANY THEORY
+# OF CONTRACT, WARRANTY, TORT (INCLUDING NEGLIGENCE), PRODUCT
+# LIABILITY OR OTHERWISE, ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGES.
+#
+# Date:	18-Oct-2026
+
+__author__ = "Vasilis Vlachoudis"
+__email__  = "Paola.Sala@mi.infn.it"
+
+import os
+import re
+import time
+import struct
+import ctypes
+import ctypes.util
+
+from log import say
+
+import Utils
+import Project
+
+#-------------------------------------------------------------------------------
+# Run monitor
+#
+# Instead of scanning all run directories every refresh interval, the
+# fluka_<pid> directories of the running runs are watched with inotify
+# (or with a stat of the directory and the output file as a fallback).
+# Only the runs with changed files are updated, the output files are
+# scanned from the last position, and the runs that changed are queued
+# for the RunTab to display.
+#-------------------------------------------------------------------------------
+section = "Project"
+backend = "auto"	# auto, inotify or poll
+BACKENDS = ("auto", "inotify", "poll")
+
+# inotify events
+IN_MODIFY      = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM  = 0x00000040
+IN_MOVED_TO    = 0x00000080
+IN_CREATE      = 0x00000100
+IN_DELETE      = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF   = 0x00000800
+IN_Q_OVERFLOW  = 0x00004000
+IN_IGNORED     = 0x00008000
+
+_MASK  = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | \
+	 IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+_EVENT = struct.Struct("iIII")	# wd, mask, cookie, len
+
+_libc = None
+
+#===============================================================================
+# Watch files by comparing their stat on every read()
+#===============================================================================
+class PollWatcher:
+	perFile = True		# files inside a directory has to be added
+
+	def __init__(self):
+		self._paths = {}	# path: last stat
+
+	# ----------------------------------------------------------------------
+	@staticmethod
+	def _stat(path):
+		try:
+			s = os.stat(path)
+		except OSError:
+			return None
+		return s.st_ino, s.st_size, s.st_mtime_ns
+
+	# ----------------------------------------------------------------------
+	def fileno(self):
+		return None
+
+	# ----------------------------------------------------------------------
+	def add(self, path):
+		self._paths[path] = self._stat(path)
+
+	# ----------------------------------------------------------------------
+	def remove(self, path):
+		self._paths.pop(path, None)
+
+	# ----------------------------------------------------------------------
+	# @return list of (path, name) changed. name is None if the path
+	#         itself or an unknown entry of the directory changed
+	# ----------------------------------------------------------------------
+	def read(self):
+		changes = []
+		for path, old in list(self._paths.items()):
+			new = self._stat(path)
+			if new != old:
+				self._paths[path] = new
+				changes.append((path, None))
+		return changes
+
+	# ----------------------------------------------------------------------
+	def close(self):
+		self._paths.clear()
+
+#===============================================================================
+# Watch directories with the Linux inotify
+#===============================================================================
+class InotifyWatcher:
+	perFile = False		# directory events cover its files
+
+	def __init__(self):
+		global _libc
+		if _libc is None:
+			_libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+		self._fd = _libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+		if self._fd < 0:
+			err = ctypes.get_errno()
+			raise OSError(err, os.strerror(err))
+		self._wd   = {}	# wd: path
+		self._path = {}	# path: wd
+
+	# ----------------------------------------------------------------------
+	def fileno(self):
+		return self._fd
+
+	# ----------------------------------------------------------------------
+	def add(self, path):
+		if path in self._path: return
+		wd = _libc.inotify_add_watch(self._fd, os.fsencode(path), _MASK)
+		if wd < 0:
+			err = ctypes.get_errno()
+			raise OSError(err, os.strerror(err), path)
+		self._wd[wd]     = path
+		self._path[path] = wd
+
+	# ----------------------------------------------------------------------
+	def remove(self, path):
+		wd = self._path.pop(path, None)
+		if wd is None: return
+		del self._wd[wd]
+		_libc.inotify_rm_watch(self._fd, wd)
+
+	# ----------------------------------------------------------------------
+	def read(self):
+		changes = []
+		while True:
+			try:
+				buf = os.read(self._fd, 65536)
+			except BlockingIOError:
+				break
+			if not buf: break
+			pos = 0
+			while pos < len(buf):
+				wd, mask, cookie, length = _EVENT.unpack_from(buf, pos)
+				pos += _EVENT.size
+				name = buf[pos:pos+length].rstrip(b"\0")
+				pos += length
+				if mask & IN_Q_OVERFLOW:
+					# events lost, everything is suspicious
+					changes.extend((p, None) for p in self._path)
+					continue
+				if mask & IN_IGNORED:
+					# watch removed, directory deleted
+					path = self._wd.pop(wd, None)
+					if path is None: continue
+					del self._path[path]
+					changes.append((path, None))
+					continue
+				path = self._wd.get(wd)
+				if path is None: continue
+				changes.append((path, name and os.fsdecode(name) or None))
+		return changes
+
+	# ----------------------------------------------------------------------
+	def close(self):
+		if self._fd >= 0: os.close(self._fd)
+		self._fd = -1
+		self._wd.clear()
+		self._path.clear()
+
+#-------------------------------------------------------------------------------
+# @return the best watcher available
+#-------------------------------------------------------------------------------
+def watcher():
+	if backend != "poll":
+		try:
+			return InotifyWatcher()
+		except (OSError, AttributeError, TypeError):
+			if backend == "inotify":
+				say("Warning: inotify not available, polling run directories")
+	return PollWatcher()
+
+#===============================================================================
+# Watched run
+#===============================================================================
+class _Watch:
+	def __init__(self, run):
+		self.run  = run
+		self.pid  = run.pid
+		self.dir  = "%s/fluka_%d" % (run._getRunDir(), run.pid)
+		self.out  = None			# output file watched
+		self.last = time.time()			# last activity
+		self.pat  = re.compile(r"^%s\d\d\d\.(out|log)$" \
+				% (re.escape(run.getInputBaseName())))
+
+	# ----------------------------------------------------------------------
+	def state(self):
+		run = self.run
+		return (run.status, run.pid, run.cycle, run.handled, run.remaining,
+			run.timeperprim, run.initime, run.maxtime, run.startTime)
+
+#===============================================================================
+# Monitor running runs
+#===============================================================================
+class RunMonitor:
+	def __init__(self):
+		self.watcher = watcher()
+		self._runs   = {}	# id(run): watch
+		self._dirs   = {}	# directory: watch
+		self._queue  = {}	# id(run): run changed, in order
+
+	# ----------------------------------------------------------------------
+	# @return file descriptor to wait for events or None if polling
+	# ----------------------------------------------------------------------
+	def fileno(self):
+		return self.watcher.fileno()
+
+	# ----------------------------------------------------------------------
+	def watching(self, run):
+		w = self._runs.get(id(run))
+		return w is not None and w.run is run and w.pid == run.pid
+
+	# ----------------------------------------------------------------------
+	# Bring a running run up to date. The first time the run is fully
+	# refreshed, afterwards only its changes are processed in update()
+	# ----------------------------------------------------------------------
+	def watch(self, run):
+		if self.watching(run): return
+		self.unwatch(run)
+		run.refresh(True)
+		self._push(run)
+		if run.pid <= 0 or \
+		   run.status not in (Project.STATUS_RUNNING, Project.STATUS_TIMEOUT):
+			return
+
+		w = _Watch(run)
+		try:
+			self.watcher.add(w.dir)
+		except OSError:
+			return
+		self._runs[id(run)] = w
+		self._dirs[w.dir]   = w
+		self._watchOutput(w)
+
+	# ----------------------------------------------------------------------
+	def unwatch(self, run):
+		w = self._runs.pop(id(run), None)
+		if w is None: return
+		self._dirs.pop(w.dir, None)
+		self.watcher.remove(w.dir)
+		if w.out is not None:
+			self._dirs.pop(w.out, None)
+			self.watcher.remove(w.out)
+
+	# ----------------------------------------------------------------------
+	# Follow the output file of the current cycle
+	# ----------------------------------------------------------------------
+	def _watchOutput(self, w):
+		out = w.run._lastOut
+		if out == w.out or not self.watcher.perFile: return
+		if w.out is not None:
+			self._dirs.pop(w.out, None)
+			self.watcher.remove(w.out)
+		w.out = out
+		if out is not None:
+			self._dirs[out] = w
+			self.watcher.add(out)
+
+	# ----------------------------------------------------------------------
+	def _push(self, run):
+		self._queue[id(run)] = run
+
+	# ----------------------------------------------------------------------
+	# @return the runs that changed since the last call
+	# ----------------------------------------------------------------------
+	def drain(self):
+		runs = list(self._queue.values())
+		self._queue.clear()
+		return runs
+
+	# ----------------------------------------------------------------------
+	# Process the events of the watched directories
+	# @param runs	if not None forget the runs not in the list
+	# @return number of runs in the queue
+	# ----------------------------------------------------------------------
+	def update(self, runs=None):
+		# forget runs no longer running
+		if runs is not None:
+			alive = set(id(r) for r in runs)
+		for w in list(self._runs.values()):
+			if (runs is not None and id(w.run) not in alive) or \
+			   w.pid != w.run.pid or \
+			   w.run.status not in (Project.STATUS_RUNNING, Project.STATUS_TIMEOUT):
+				self.unwatch(w.run)
+
+		changed = {}	# id(watch): (watch, names)
+		for path, name in self.watcher.read():
+			w = self._dirs.get(path)
+			if w is None: continue
+			if path != w.dir:	# output file watch
+				name = os.path.basename(path)
+			changed.setdefault(id(w), (w, set()))[1].add(name)
+
+		now = time.time()
+		for w, names in changed.values():
+			w.last = now
+			self._process(w, names)
+
+		# runs without any activity appear dead
+		for w in self._runs.values():
+			if w.run.status == Project.STATUS_RUNNING and \
+			   now - w.last > Project.timeThreshold:
+				w.run.status = Project.STATUS_TIMEOUT
+				self._push(w.run)
+		return len(self._queue)
+
+	# ----------------------------------------------------------------------
+	# Update run from the names changed in its directory
+	# ----------------------------------------------------------------------
+	def _process(self, w, names):
+		run = w.run
+		old = w.state()
+
+		if None in names:
+			# unknown change, check the whole directory
+			try:
+				names = set(Utils.listdir(w.dir))
+			except OSError:
+				names = None
+			full = True
+		else:
+			full = False
+
+		if names is None or not os.path.isdir(w.dir):
+			run.status = Project.STATUS_FINISHED
+			run.pid    = 0
+		elif any((n=="core" or Project._PAT_CORE.match(n)) and
+			   os.path.exists(os.path.join(w.dir,n)) for n in names):
+			run.status = Project.STATUS_FINISHED_ERR
+			run.pid    = 0
+		else:
+			fnout = run._lastOut
+			if full or any(w.pat.match(n) for n in names):
+				fnout = run.findCycle(w.dir)
+			if fnout is None:
+				run.lost()
+			else:
+				run.status = Project.STATUS_RUNNING
+				if full or fnout != run._lastOut or \
+				   os.path.basename(fnout) in names:
+					run.scanOutput(fnout)
+					self._watchOutput(w)
+				if full or "fort.1" in names:
+					try:
+						run.startTime = os.lstat("%s/fort.1"%(w.dir)).st_mtime
+					except OSError:
+						run.startTime = 0
+
+		if run.status not in (Project.STATUS_RUNNING, Project.STATUS_TIMEOUT):
+			self.unwatch(run)
+		if w.state() != old:
+			self._push(run)
+
+	# ----------------------------------------------------------------------
+	def close(self):
+		self.watcher.close()
+		self._runs.clear()
+		self._dirs.clear()
+		self._queue.clear()
+
+#-------------------------------------------------------------------------------
+# Load configuration
+#-------------------------------------------------------------------------------
+def loadConfig(config):
+	global backend
+	from tkFlair import getStr
+
+	backend = getStr(section, "monitor", backend).lower()
+	if backend not in BACKENDS: backend = BACKENDS[0]
@@ -72,7 +72,8 @@ STATUS_STR = [
 	"Running",
 	"Finished OK",
 	"Finished with ERRORS",
-	"*** TIMED-OUT ***" ]
+	"*** TIMED-OUT ***",
+	"Queued" ]
 
 #===============================================================================
 # Run Frame
@@ -60,6 +60,8 @@ import Manual
 import Ribbon
 import Project
 import RunList
+import RunMonitor
+import Scheduler
 import tkFlair
 import FlairRibbon
 import bFileDialog
@@ -74,7 +76,8 @@ STATUS_STR = [
 	"Running",
 	"Finished OK",
 	"Finished with ERRORS",
-	"*** TIMED-OUT ***" ]
+	"*** TIMED-OUT ***",
+	"Queued" ]
 
 _ON    = Unicode.BALLOT_BOX_WITH_X
 _OFF   = Unicode.BALLOT_BOX
@@ -310,6 +313,16 @@ class RunTab(FlairRibbon.FlairTab):
 		self.pprim_perc   = (0.0, 0.0)
 		self.timer	  = None
 		self._updating	  = False	# Semaphore for updating the values
+		self._monitorId   = None
+
+		# Watch the running directories, refresh when something changes
+		self.monitor = RunMonitor.RunMonitor()
+		fd = self.monitor.fileno()
+		if fd is not None:
+			try:
+				self.tk.createfilehandler(fd, READABLE, self._monitorEvent)
+			except (AttributeError, TclError):
+				pass
 		self._varSetting  = True	# Semaphore for setting the cycles
 
 	# ----------------------------------------------------------------------
@@ -987,16 +1000,35 @@ class RunTab(FlairRibbon.FlairTab):
 		for r in self.page.runList.curselection():
 			run = self.page.runList.getRun(r)
 			if run.family:
-				for child in run.family:
-					r = self.project.getRunByName(child, run.name)
+				children = [self.project.getRunByName(child, run.name)
+						for child in run.family]
+				children = [r for r in children
+						if r.status not in (Project.STATUS_WAIT2ATTACH,
+								    Project.STATUS_RUNNING,
+								    Project.STATUS_QUEUED)]
+				if self.project.inputName != "":
+					# Write all inputs at once
 					try:
-						rc = self._startRun(r)
+						errors = self.project.writeInputs(children)
 					except (OSError, IOError):
 						self.flair.notify("Error",
 							sys.exc_info()[1],
 							tkFlair.NOTIFY_ERROR)
-						rc = 1
 						break
+				else:
+					errors = [None]*len(children)
+				rc = 0
+				# submit the whole family at once to the scheduler
+				with Scheduler.transaction(self.project.submit):
+					for r,err in zip(children, errors):
+						try:
+							rc = self._startRun(r, err)
+						except (OSError, IOError):
+							self.flair.notify("Error",
+								sys.exc_info()[1],
+								tkFlair.NOTIFY_ERROR)
+							rc = 1
+							break
 			else:
 				try:
 					rc = self._startRun(run)
@@ -1024,9 +1056,10 @@ class RunTab(FlairRibbon.FlairTab):
 	# ----------------------------------------------------------------------
 	# Start one run and try to attach
 	# ----------------------------------------------------------------------
-	def _startRun(self, run):
-		if run.status == Project.STATUS_WAIT2ATTACH or \
-		   run.status == Project.STATUS_RUNNING: return
+	def _startRun(self, run, errors=None):
+		if run.status in (Project.STATUS_WAIT2ATTACH,
+				  Project.STATUS_RUNNING,
+				  Project.STATUS_QUEUED): return
 
 		if self.project.inputName == "":
 			messagebox.showerror("Input file not saved",
@@ -1036,7 +1069,7 @@ class RunTab(FlairRibbon.FlairTab):
 
 		try:
 			log = self.flair.newLog("Run", run.getInputBaseName())
-			rc = run.start(log=log)
+			rc = run.start(log=log, errors=errors)
 			if rc:
 				self.flair.notify("Run Errors",
 					"Errors or warnings during writing run input.",
@@ -1084,7 +1117,9 @@ class RunTab(FlairRibbon.FlairTab):
 
 	# ----------------------------------------------------------------------
 	def _cleanRun(self, run, log):
-		if run.status in (Project.STATUS_WAIT2ATTACH, Project.STATUS_RUNNING):
+		if run.status in (Project.STATUS_WAIT2ATTACH,
+				  Project.STATUS_RUNNING,
+				  Project.STATUS_QUEUED):
 			messagebox.showwarning("Running",
 				"Input '%s' is running. Please stop before deleting all files"%(run.name),
 				parent=self.ribbon)
@@ -1132,6 +1167,10 @@ class RunTab(FlairRibbon.FlairTab):
 			return
 		for r in self.page.runList.curselection():
 			run = self.page.runList.getRun(r)
+			# Queued runs are only removed from the scheduler
+			if run.status == Project.STATUS_QUEUED:
+				run.dequeue()
+				continue
 			# Check status, if not running start the run
 			if run.status == Project.STATUS_RUNNING and run.pid>0:
 				# Create a file fluka.stop
@@ -1185,9 +1224,15 @@ class RunTab(FlairRibbon.FlairTab):
 		self.prunremain["text"] = ""
 
 		# Scan status of all runs
-		changed = False
+		self.monitor.update(self.project.runs)
+		changed = bool(self.monitor.drain())
+		jobs = None
 		for run in self.project.runs:
 			s = run.status
+			if run.status == Project.STATUS_QUEUED:
+				# a single look at the scheduler for all the runs
+				if jobs is None: jobs = Scheduler.snapshot()
+				run.checkQueue(jobs)
 			if run.status == Project.STATUS_WAIT2ATTACH or \
 			  (run.status == Project.STATUS_RUNNING and run.pid==0):
 				if run.family:
@@ -1206,9 +1251,9 @@ class RunTab(FlairRibbon.FlairTab):
 					changed = True
 					for child in run.family:
 						rchild = self.project.getRunByName(child, run.name)
-						rchild.refresh()
+						self.monitor.watch(rchild)
 				else:
-					run.refresh()
+					self.monitor.watch(run)
 			if run.status != s: changed = True
 
 		def setRunStatus(run, status):
@@ -1254,7 +1299,7 @@ class RunTab(FlairRibbon.FlairTab):
 
 		# Find information
 		if not run.family and (run.pid>0 or run.status in (Project.STATUS_RUNNING, Project.STATUS_TIMEOUT)):
-			run.refresh(True)
+			self.monitor.watch(run)
 
 		self.pstatus["text"] = STATUS_STR[run.status]
 		self.pinput["text"]  = run.getInputName()
@@ -1406,6 +1451,19 @@ class RunTab(FlairRibbon.FlairTab):
 		if not self.winfo_ismapped(): return
 		self.timer = self.after(Project.refreshInterval, self._timer)
 
+	# ----------------------------------------------------------------------
+	# Files changed in the running directories
+	# ----------------------------------------------------------------------
+	def _monitorEvent(self, fd, mask):
+		if self.monitor.update(self.project.runs) and \
+		   self._monitorId is None and self.winfo_ismapped():
+			self._monitorId = self.after(1000, self._monitorRefresh)
+
+	# ----------------------------------------------------------------------
+	def _monitorRefresh(self):
+		self._monitorId = None
+		self.refresh()
+
 	# ----------------------------------------------------------------------
 	# update progress bars
 	# ----------------------------------------------------------------------
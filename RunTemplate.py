@@ -0,0 +1,343 @@
+# 
+#
+# Copyright and User License
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Copyright 2006-2019 CERN and INFN
+# 
+#
+# Please consult the LICENSE file for the license 
+#
+# DISCLAIMER
+# ~~~~~~~~~~
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT
+# NOT LIMITED TO, IMPLIED WARRANTIES OF MERCHANTABILITY, OF
+# SATISFACTORY QUALITY, AND FITNESS FOR A PARTICULAR PURPOSE
+# OR USE ARE DISCLAIMED. THE COPYRIGHT HOLDERS AND THE
+# AUTHORS MAKE NO REPRESENTATION THAT THE SOFTWARE AND
+# MODIFICATIONS THEREOF, WILL NOT INFRINGE ANY PATENT,
+# COPYRIGHT, TRADE SECRET OR OTHER PROPRIETARY RIGHT.
+#
+# LIMITATION OF LIABILITY
+# ~~~~~~~~~~~~~~~~~~~~~~~
+# THE COPYRIGHT HOLDERS AND THE AUTHORS SHALL HAVE NO
+# LIABILITY FOR DIRECT, INDIRECT, SPECIAL, INCIDENTAL,
+# CONSEQUENTIAL, EXEMPLARY, OR PUNITIVE DAMAGES OF ANY
+# CHARACTER INCLUDING, WITHOUT LIMITATION, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES, LOSS OF USE, DATA OR PROFITS,
+# OR BUSINESS INTERRUPTION, HOWEVER CAUSED AND ON ANY THEORY
+# OF CONTRACT, WARRANTY, TORT (INCLUDING NEGLIGENCE), PRODUCT
+# LIABILITY OR OTHERWISE, ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGES.
+#
+# Date:	18-Oct-2026
+
+__author__ = "Vasilis Vlachoudis"
+__email__  = "Paola.Sala@mi.infn.it"
+
+import os
+import time
+import shutil
+import hashlib
+import threading
+
+from log import say
+
+import Utils
+import Scheduler
+
+#-------------------------------------------------------------------------------
+# Run template
+#
+# rfluka creates its own fluka_<pid> scratch directory for every cycle, what
+# flair controls is the run directory around it. Everything a run needs that
+# is the same for all the runs of the project, the executable and the
+# read-only files opened with the OPEN card, is prepared once per executable
+# version in a read-only template directory inside the project. Every run
+# directory receives an overlay of hard (or symbolic) links to the template,
+# so starting hundreds of runs only creates a few links each, and a
+# recompilation does not change the executable of the runs already queued.
+#
+# Directories are removed by renaming them to a hidden trash name, which is
+# O(1) for the caller, and deleting them in a background thread.
+#-------------------------------------------------------------------------------
+section  = "Project"
+enabled  = True		# use run templates
+keep     = 3		# templates kept per project
+
+TEMPLATE = ".flair_template"
+TRASH    = ".flair_trash_"
+STAMP    = "stamp"
+FILES    = "files"
+
+_READONLY = ("OLD", "READONLY")
+_CYCLE    = "fluka_0"	# any rfluka cycle directory, to resolve the ../ paths
+
+_templates = {}
+_counter   = 0
+_lock      = threading.Lock()
+
+#-------------------------------------------------------------------------------
+# Remove a directory: rename it to a trash name and delete it in the background
+# Raise OSError if the directory cannot be renamed
+#-------------------------------------------------------------------------------
+def remove(path):
+	global _counter
+	path = os.path.normpath(path)
+	with _lock:
+		_counter += 1
+		trash = os.path.join(os.path.dirname(path),
+				"%s%d_%d"%(TRASH, os.getpid(), _counter))
+	os.rename(path, trash)
+	_delete(trash)
+
+#-------------------------------------------------------------------------------
+def _delete(trash):
+	thread = threading.Thread(target=_rmtree, args=(trash,),
+			name="flair-remove")
+	thread.start()
+
+#-------------------------------------------------------------------------------
+def _rmtree(path):
+	# templates are read-only, give back the write permission before deleting
+	for dirpath, dirnames, filenames in os.walk(path):
+		try: os.chmod(dirpath, 0o755)
+		except OSError: pass
+	try:
+		shutil.rmtree(path)
+	except OSError:
+		say("Cannot remove: %s"%(path))
+
+#-------------------------------------------------------------------------------
+# Return True if filename is a trash directory left from a previous session
+#-------------------------------------------------------------------------------
+def isTrash(fn):
+	if not fn.startswith(TRASH): return False
+	try:
+		pid = int(fn[len(TRASH):].split("_")[0])
+	except ValueError:
+		return False
+	if pid == os.getpid(): return False	# still deleting it
+	try:
+		os.kill(pid, 0)
+	except ProcessLookupError:
+		return True
+	except OSError:
+		pass
+	return False
+
+#-------------------------------------------------------------------------------
+# Delete the trash left from a previous session in directory path
+#-------------------------------------------------------------------------------
+def purge(path, files=None):
+	if files is None: files = Utils.listdir(path)
+	for fn in files:
+		if isTrash(fn):
+			_delete(os.path.join(path, fn))
+
+#-------------------------------------------------------------------------------
+# Find the read-only files of the input, as a list of the filenames
+# used in the OPEN cards
+#-------------------------------------------------------------------------------
+def readonlyFiles(input):
+	files = []
+	for card in input["OPEN"]:
+		if card.ignore(): continue
+		if card.sdum() not in _READONLY: continue
+		fn = card.extra().strip()
+		if fn and fn not in files: files.append(fn)
+	return files
+
+#-------------------------------------------------------------------------------
+# Return the path of the file as resolved from a cycle directory of rundir
+# or None if it is not inside rundir
+#-------------------------------------------------------------------------------
+def _resolve(rundir, fn):
+	if os.path.isabs(fn): return None
+	path = os.path.normpath(os.path.join(rundir, _CYCLE, fn))
+	if os.path.dirname(path) == os.path.normpath(os.path.join(rundir, _CYCLE)):
+		return None	# rfluka takes care of the cycle directory
+	rel = os.path.relpath(path, rundir)
+	if rel.startswith(os.pardir): return None
+	return rel
+
+#-------------------------------------------------------------------------------
+# Return the set of template names in top used in the commands of the
+# queued and running scheduler jobs or of the running processes
+#-------------------------------------------------------------------------------
+def _referenced(top):
+	cmds = []
+	if os.path.exists(Scheduler.stateFile):
+		cmds.extend(job.cmd for job in Scheduler.scheduler().active())
+	# rfluka spawns the executable again for every cycle
+	try:
+		pids = [x for x in os.listdir("/proc") if x.isdigit()]
+	except OSError:
+		pids = []
+	for pid in pids:
+		try:
+			with open("/proc/%s/cmdline"%(pid), "rb") as f:
+				cmds.append(f.read().decode(errors="replace").split("\0"))
+		except (OSError, IOError):
+			pass
+
+	prefix = top + os.sep
+	used = set()
+	for cmd in cmds:
+		for arg in cmd:
+			if arg.startswith(prefix):
+				used.add(arg[len(prefix):].split(os.sep)[0])
+	return used
+
+#-------------------------------------------------------------------------------
+# Link src to dst: hard link if possible, otherwise symbolic link
+#-------------------------------------------------------------------------------
+def _link(src, dst):
+	try:
+		os.link(src, dst)
+	except OSError:
+		os.symlink(os.path.abspath(src), dst)
+
+#===============================================================================
+# Run template
+#===============================================================================
+class Template:
+	def __init__(self, projdir, exe, files, snapshot=True):
+		self.projdir = projdir
+		self.exe     = exe
+		self.snapshot= snapshot	# keep a copy of the executable
+		self.files   = []	# relative path of the read-only files
+		self.key     = self._key(files)
+		self.path    = os.path.join(projdir, TEMPLATE, self.key)
+		if snapshot:
+			self.executable = os.path.join(self.path, os.path.basename(exe))
+		else:
+			self.executable = exe
+
+	# ----------------------------------------------------------------------
+	# Key of the template from the version of the executable and files
+	# ----------------------------------------------------------------------
+	def _key(self, files):
+		h = hashlib.sha1()
+		s = os.stat(self.exe)
+		h.update(("%s %d %d %d %d\n"%(os.path.realpath(self.exe),
+				s.st_ino, s.st_size, s.st_mtime_ns,
+				self.snapshot)).encode())
+		for fn in files:
+			rel = _resolve(self.projdir, fn)
+			if rel is None: continue
+			try:
+				s = os.stat(os.path.join(self.projdir, rel))
+			except OSError:
+				continue
+			self.files.append(rel)
+			h.update(("%s %d %d\n"%(rel, s.st_size, s.st_mtime_ns)).encode())
+		return h.hexdigest()[:16]
+
+	# ----------------------------------------------------------------------
+	def exists(self):
+		return os.path.isfile(os.path.join(self.path, STAMP))
+
+	# ----------------------------------------------------------------------
+	# Prepare the template once, build it in a temporary directory and
+	# rename it in place so that concurrent flair sessions never see a
+	# partial one
+	# ----------------------------------------------------------------------
+	def prepare(self):
+		if self.exists(): return
+		top = os.path.dirname(self.path)
+		try: os.makedirs(top)
+		except OSError: pass
+		tmp = "%s.%d"%(self.path, os.getpid())
+		if os.path.isdir(tmp): _rmtree(tmp)
+		os.mkdir(tmp)
+		try:
+			if self.snapshot:
+				exe = os.path.join(tmp, os.path.basename(self.exe))
+				try:
+					os.link(self.exe, exe)
+				except OSError:
+					shutil.copy2(self.exe, exe)
+			for rel in self.files:
+				dst = os.path.join(tmp, FILES, rel)
+				try: os.makedirs(os.path.dirname(dst))
+				except OSError: pass
+				try:
+					os.link(os.path.join(self.projdir, rel), dst)
+				except OSError:
+					shutil.copy2(os.path.join(self.projdir, rel), dst)
+			f = open(os.path.join(tmp, STAMP), "w")
+			f.write("exe: %s\n"%(self.exe))
+			for rel in self.files:
+				f.write("file: %s\n"%(rel))
+			f.write("date: %s\n"%(time.ctime()))
+			f.close()
+			for dirpath, dirnames, filenames in os.walk(tmp, topdown=False):
+				os.chmod(dirpath, 0o555)
+			os.rename(tmp, self.path)
+		except OSError:
+			_delete(tmp)
+			if not self.exists(): raise
+		self.prune()
+
+	# ----------------------------------------------------------------------
+	# Remove the oldest templates keeping only the last ones, and the
+	# ones still used by queued or running jobs
+	# ----------------------------------------------------------------------
+	def prune(self):
+		top = os.path.dirname(self.path)
+		used = _referenced(top)
+		lst = []
+		for fn in os.listdir(top):
+			if fn == self.key or "." in fn or fn in used: continue
+			try:
+				lst.append((os.stat(os.path.join(top, fn)).st_mtime, fn))
+			except OSError:
+				pass
+		lst.sort()
+		for t,fn in lst[:max(0, len(lst)-keep+1)]:
+			try:
+				remove(os.path.join(top, fn))
+			except OSError:
+				pass
+
+	# ----------------------------------------------------------------------
+	# Create the overlay in the run directory: link every read-only file
+	# to the template where the run will look for it
+	# ----------------------------------------------------------------------
+	def overlay(self, rundir):
+		if os.path.normpath(rundir) == os.path.normpath(self.projdir):
+			return 0
+		n = 0
+		for rel in self.files:
+			dst = os.path.join(rundir, rel)
+			if os.path.lexists(dst): continue
+			try: os.makedirs(os.path.dirname(dst))
+			except OSError: pass
+			_link(os.path.join(self.path, FILES, rel), dst)
+			n += 1
+		return n
+
+#-------------------------------------------------------------------------------
+# Return the template for the project and executable, prepared once
+# per executable version. The FLUKA executables (snapshot=False) are
+# only used for the key and they are not copied
+#-------------------------------------------------------------------------------
+def template(projdir, exe, input, snapshot=True):
+	files = readonlyFiles(input)
+	t = Template(projdir, exe, files, snapshot)
+	cached = _templates.get((projdir, exe))
+	if cached is not None and cached.key == t.key:
+		return cached
+	t.prepare()
+	_templates[(projdir, exe)] = t
+	return t
+
+#-------------------------------------------------------------------------------
+def loadConfig(config):
+	global enabled, keep
+	from tkFlair import getBool, getInt
+
+	enabled = getBool(section, "runtemplate",  enabled)
+	keep    = max(1, getInt(section, "templatekeep", keep))
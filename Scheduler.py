@@ -0,0 +1,625 @@
+# 
+#
+# Copyright and User License
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Copyright 2006-2019 CERN and INFN
+# 
+#
+# Please consult the LICENSE file for the license 
+#
+# DISCLAIMER
+# ~~~~~~~~~~
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT
+# NOT LIMITED TO, IMPLIED WARRANTIES OF MERCHANTABILITY, OF
+# SATISFACTORY QUALITY, AND FITNESS FOR A PARTICULAR PURPOSE
+# OR USE ARE DISCLAIMED. THE COPYRIGHT HOLDERS AND THE
+# AUTHORS MAKE NO REPRESENTATION THAT THE SOFTWARE AND
+# MODIFICATIONS THEREOF, WILL NOT INFRINGE ANY PATENT,
+# COPYRIGHT, TRADE SECRET OR OTHER PROPRIETARY RIGHT.
+#
+# LIMITATION OF LIABILITY
+# ~~~~~~~~~~~~~~~~~~~~~~~
+# THE COPYRIGHT HOLDERS AND THE AUTHORS SHALL HAVE NO
+# LIABILITY FOR DIRECT, INDIRECT, SPECIAL, INCIDENTAL,
+# CONSEQUENTIAL, EXEMPLARY, OR PUNITIVE DAMAGES OF ANY
+# CHARACTER INCLUDING, WITHOUT LIMITATION, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES, LOSS OF USE, DATA OR PROFITS,
+# OR BUSINESS INTERRUPTION, HOWEVER CAUSED AND ON ANY THEORY
+# OF CONTRACT, WARRANTY, TORT (INCLUDING NEGLIGENCE), PRODUCT
+# LIABILITY OR OTHERWISE, ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGES.
+#
+# Date:	18-Oct-2026
+
+__author__ = "Vasilis Vlachoudis"
+__email__  = "Paola.Sala@mi.infn.it"
+
+import os
+import sys
+import json
+import time
+import contextlib
+import fcntl
+import shutil
+import signal
+import threading
+import subprocess
+
+from log import say
+
+#-------------------------------------------------------------------------------
+# Local job scheduler
+#
+# Runs submitted on the QUEUE batch queue and the compilation of the
+# executables are kept in a queue, and started as soon as one of the
+# slots becomes free. The queue is stored in the stateFile and shared
+# between all flair sessions (and the batch mode), so the queued jobs
+# survive a restart of flair. There is no daemon, the queue advances
+# every time one of the sessions calls poll()
+#-------------------------------------------------------------------------------
+QUEUE     = "Scheduler"	# batch queue name that submits to the scheduler
+section   = "Scheduler"	# configuration section
+
+slots     = 0		# maximum number of concurrent jobs (0=number of cpus)
+policy    = "fifo"	# fifo or priority
+nice      = 0		# default nice level of the jobs
+pin       = False	# pin every job on its own set of cpus
+history   = 50		# finished jobs to remember
+stateFile = os.path.join(os.path.expanduser("~/.flair"), "scheduler.json")
+
+POLICIES  = ("fifo", "priority")
+
+KIND_RUN     = "run"
+KIND_COMPILE = "compile"
+
+JOB_QUEUED    = "queued"
+JOB_RUNNING   = "running"
+JOB_FINISHED  = "finished"
+JOB_CANCELLED = "cancelled"
+
+_scheduler = None
+
+#-------------------------------------------------------------------------------
+# @return (state, starting time) of process pid as reported by the kernel,
+# the starting time is used to recognize a recycled pid
+#-------------------------------------------------------------------------------
+def _procStat(pid):
+	try:
+		with open("/proc/%d/stat"%(pid)) as f:
+			stat = f.read()
+	except (OSError, IOError):
+		return "", 0
+	# skip the command name, it can contain spaces
+	fields = stat[stat.rfind(")")+2:].split()
+	try:
+		return fields[0], int(fields[19])
+	except (IndexError, ValueError):
+		return "", 0
+
+#-------------------------------------------------------------------------------
+def _procStart(pid):
+	return _procStat(pid)[1]
+
+#-------------------------------------------------------------------------------
+def _alive(pid, ctime=0):
+	if pid <= 0: return False
+	try:
+		os.kill(pid, 0)
+	except ProcessLookupError:
+		return False
+	except PermissionError:
+		pass
+	state, start = _procStat(pid)
+	if state == "Z": return False	# finished, not reaped by its father
+	return not ctime or not start or start == ctime
+
+#-------------------------------------------------------------------------------
+# Convert a cpu list "0-3,8" to a list of integers
+#-------------------------------------------------------------------------------
+def parseCpus(s):
+	cpus = []
+	for item in s.replace(" ","").split(","):
+		if not item: continue
+		if "-" in item:
+			a,b = item.split("-",1)
+			cpus.extend(range(int(a), int(b)+1))
+		else:
+			cpus.append(int(item))
+	return cpus
+
+#-------------------------------------------------------------------------------
+# Convert a list of cpus to the "0-3,8" notation
+#-------------------------------------------------------------------------------
+def formatCpus(cpus):
+	ranges = []
+	for c in sorted(set(cpus)):
+		if ranges and ranges[-1][1] == c-1:
+			ranges[-1][1] = c
+		else:
+			ranges.append([c,c])
+	return ",".join(a==b and str(a) or "%d-%d"%(a,b) for a,b in ranges)
+
+#-------------------------------------------------------------------------------
+# @return available cpus of the process
+#-------------------------------------------------------------------------------
+def availableCpus():
+	try:
+		return sorted(os.sched_getaffinity(0))
+	except AttributeError:
+		return list(range(os.cpu_count() or 1))
+
+#===============================================================================
+# Job in the queue
+#===============================================================================
+class Job:
+	_fields = ("id", "kind", "name", "cmd", "cwd", "stdout",
+		   "priority", "nice", "cpus", "status", "pid", "ctime",
+		   "owner", "submitted", "started", "finished", "rc", "slots")
+
+	def __init__(self, **kw):
+		self.id        = 0
+		self.kind      = KIND_RUN
+		self.name      = ""
+		self.cmd       = []	# command to spawn (runs only)
+		self.cwd       = None
+		self.stdout    = None	# file to append the output
+		self.priority  = 0	# higher starts first with the priority policy
+		self.nice      = None	# nice level, None=default
+		self.cpus      = []	# cpus to pin the job, empty=any or automatic
+		self.status    = JOB_QUEUED
+		self.pid       = 0	# process id when running
+		self.ctime     = 0	# start time of the process (pid recycling)
+		self.owner     = 0	# pid of the flair session submitted the job
+		self.submitted = 0.0
+		self.started   = 0.0
+		self.finished  = 0.0
+		self.rc        = None
+		self.slots     = 1	# slots occupied, requested until started
+		for n,v in kw.items(): setattr(self, n, v)
+
+	# ----------------------------------------------------------------------
+	def __repr__(self):
+		return "Job(%d %s %s %s)"%(self.id, self.kind, self.name, self.status)
+
+	# ----------------------------------------------------------------------
+	def toDict(self):
+		return dict((n, getattr(self,n)) for n in Job._fields)
+
+	# ----------------------------------------------------------------------
+	@staticmethod
+	def fromDict(d):
+		return Job(**dict((n,v) for n,v in d.items() if n in Job._fields))
+
+	# ----------------------------------------------------------------------
+	def active(self):
+		return self.status in (JOB_QUEUED, JOB_RUNNING)
+
+	# ----------------------------------------------------------------------
+	# @return function to be called in the child process before exec
+	# ----------------------------------------------------------------------
+	def preexec(self):
+		session = self.kind == KIND_RUN
+		level   = nice if self.nice is None else self.nice
+		cpus    = self.cpus
+		def _preexec():
+			# start a new session, detach from the father
+			if session: os.setpgrp()
+			if level: os.nice(level)
+			if cpus:
+				try: os.sched_setaffinity(0, cpus)
+				except (AttributeError, OSError): pass
+		return _preexec
+
+	# ----------------------------------------------------------------------
+	# @return command prefix applying the nice level and the cpus, for
+	# the processes spawned from threads where preexec_fn is unsafe
+	# ----------------------------------------------------------------------
+	def prefix(self):
+		level = nice if self.nice is None else self.nice
+		cmd = []
+		if level and shutil.which("nice"):
+			cmd.extend(["nice", "-n", str(level)])
+		if self.cpus and shutil.which("taskset"):
+			cmd.extend(["taskset", "-c", formatCpus(self.cpus)])
+		return cmd
+
+#===============================================================================
+# Scheduler with the queue stored in a file
+#===============================================================================
+class Scheduler:
+	def __init__(self, filename=None):
+		self.filename = filename or stateFile
+		self.jobs     = []
+		self.nextId   = 1
+		self._popen   = {}	# processes spawned by this session
+		self._mutex   = threading.RLock()
+		self._lockfd  = None
+		self._depth   = 0
+		self._stamp   = None	# stamp of the state file loaded or saved
+		self._dirty   = False	# state modified, to be saved
+		self._defer   = False	# poll at the end of the transaction
+
+	# ----------------------------------------------------------------------
+	# Lock the state file against other sessions and load it if it was
+	# modified by another session. Nested with blocks form a single
+	# transaction, where the queue is advanced once at the end
+	# ----------------------------------------------------------------------
+	def __enter__(self):
+		self._mutex.acquire()
+		self._depth += 1
+		if self._depth > 1: return self
+		try:
+			os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+			self._lockfd = open(self.filename+".lock", "w")
+			fcntl.flock(self._lockfd, fcntl.LOCK_EX)
+			self._load()
+		except:
+			self._depth -= 1
+			self._unlock()
+			self._mutex.release()
+			raise
+		return self
+
+	# ----------------------------------------------------------------------
+	def __exit__(self, exc_type, exc_value, tb):
+		try:
+			self._depth -= 1
+			if self._depth == 0:
+				if exc_type is None:
+					if self._defer: self._poll()
+					if self._dirty: self._save()
+				self._defer = False
+				self._unlock()
+		finally:
+			self._mutex.release()
+		return False
+
+	# ----------------------------------------------------------------------
+	def _unlock(self):
+		if self._lockfd is not None:
+			self._lockfd.close()	# releases the flock
+			self._lockfd = None
+
+	# ----------------------------------------------------------------------
+	# The serial written first in the state file identifies every save
+	# ----------------------------------------------------------------------
+	def _fileStamp(self):
+		try:
+			with open(self.filename, "rb") as f:
+				return f.read(80)
+		except (OSError, IOError):
+			return None
+
+	# ----------------------------------------------------------------------
+	def _load(self):
+		stamp = self._fileStamp()
+		if stamp is not None and stamp == self._stamp: return
+		try:
+			with open(self.filename, "r") as f:
+				state = json.load(f)
+		except (OSError, IOError, ValueError):
+			state = {}
+		self.nextId = state.get("next", 1)
+		self.jobs   = [Job.fromDict(d) for d in state.get("jobs",[])]
+		self._stamp = stamp
+		self._dirty = False
+
+	# ----------------------------------------------------------------------
+	def _save(self):
+		# keep only the last finished jobs
+		done = [j for j in self.jobs if not j.active()]
+		if len(done) > history:
+			drop = set(id(j) for j in done[:len(done)-history])
+			self.jobs = [j for j in self.jobs if id(j) not in drop]
+
+		tmp = "%s.%d"%(self.filename, os.getpid())
+		try:
+			with open(tmp, "w") as f:
+				json.dump({"serial": "%d.%d"%(os.getpid(), time.time_ns()),
+					   "next": self.nextId,
+					   "jobs": [j.toDict() for j in self.jobs]},
+					f, indent=1)
+			os.replace(tmp, self.filename)
+		except (OSError, IOError):
+			say("Error: cannot save scheduler state %s"%(self.filename))
+			return
+		self._stamp = self._fileStamp()
+		self._dirty = False
+
+	# ----------------------------------------------------------------------
+	# @return maximum number of concurrent jobs
+	# ----------------------------------------------------------------------
+	@staticmethod
+	def limit():
+		return slots>0 and slots or (os.cpu_count() or 1)
+
+	# ----------------------------------------------------------------------
+	# Add a new job in the queue and start it if a slot is free
+	# @return job id
+	# ----------------------------------------------------------------------
+	def submit(self, kind, name, cmd=None, cwd=None, stdout=None,
+			priority=0, nice=None, cpus=None, slots=1):
+		with self:
+			job = Job(id=self.nextId, kind=kind, name=name,
+				cmd=list(cmd or []), cwd=cwd, stdout=stdout,
+				priority=priority, nice=nice, cpus=list(cpus or []),
+				owner=os.getpid(), submitted=time.time(),
+				slots=max(1, slots))
+			self.nextId += 1
+			self.jobs.append(job)
+			self._dirty = True
+			if self._depth > 1:
+				self._defer = True
+			else:
+				self._poll()
+		return job.id
+
+	# ----------------------------------------------------------------------
+	# Check the running jobs and start the queued ones on the free slots
+	# @return list of jobs that changed status
+	# ----------------------------------------------------------------------
+	def poll(self):
+		with self:
+			return self._poll()
+
+	# ----------------------------------------------------------------------
+	def _poll(self):
+		changed = self._reap()
+		running = [j for j in self.jobs if j.status == JOB_RUNNING]
+		free    = self.limit() - sum(j.slots for j in running)
+		if free <= 0: return changed
+
+		queued = [j for j in self.jobs if j.status == JOB_QUEUED]
+		if policy == "priority":
+			queued.sort(key=lambda j: (-j.priority, j.submitted, j.id))
+		else:
+			queued.sort(key=lambda j: (j.submitted, j.id))
+
+		used = set()
+		for j in running: used.update(j.cpus)
+		for job in queued:
+			if free <= 0: break
+			# a job requesting many slots gets the ones free
+			job.slots = min(job.slots, free)
+			free -= job.slots
+			self._start(job, used)
+			used.update(job.cpus)
+			changed.append(job)
+		return changed
+
+	# ----------------------------------------------------------------------
+	# Update the status of the running jobs
+	# ----------------------------------------------------------------------
+	def _reap(self):
+		changed = []
+		for job in self.jobs:
+			if job.status == JOB_QUEUED:
+				# compile jobs wait in their flair session
+				if job.kind == KIND_COMPILE and not _alive(job.owner):
+					self._finish(job, JOB_CANCELLED)
+					changed.append(job)
+				continue
+			if job.status != JOB_RUNNING: continue
+
+			popen = self._popen.get(job.id)
+			if popen is not None:
+				rc = popen.poll()
+				if rc is None: continue
+				del self._popen[job.id]
+				self._finish(job, JOB_FINISHED, rc)
+			elif not _alive(job.pid, job.ctime):
+				self._finish(job, JOB_FINISHED)
+			else:
+				continue
+			changed.append(job)
+		return changed
+
+	# ----------------------------------------------------------------------
+	def _finish(self, job, status, rc=None):
+		self._dirty  = True
+		job.status   = status
+		job.finished = time.time()
+		job.rc       = rc
+		job.pid      = 0
+
+	# ----------------------------------------------------------------------
+	# Start a job, pinning it on cpus not used by the other jobs
+	# ----------------------------------------------------------------------
+	def _start(self, job, used):
+		if not job.cpus and pin:
+			cpus = availableCpus()
+			n    = max(1, len(cpus) // self.limit()) * job.slots
+			job.cpus = [c for c in cpus if c not in used][:n]
+
+		self._dirty = True
+		job.status  = JOB_RUNNING
+		job.started = time.time()
+		if job.kind == KIND_COMPILE:
+			# the owner session compiles in its own thread
+			job.pid   = job.owner
+			job.ctime = _procStart(job.owner)
+			return
+
+		try:
+			if job.stdout:
+				stdout = open(job.stdout, "a")
+			else:
+				stdout = open(os.devnull, "w")
+		except (OSError, IOError):
+			stdout = open(os.devnull, "w")
+		try:
+			popen = subprocess.Popen(job.cmd,
+					cwd=job.cwd,
+					stdout=stdout,
+					stderr=subprocess.STDOUT,
+					close_fds=True,
+					preexec_fn=job.preexec())
+		except (OSError, ValueError):
+			say("Error: scheduler cannot start %s: %s" \
+				% (" ".join(job.cmd), sys.exc_info()[1]))
+			self._finish(job, JOB_FINISHED, -1)
+			return
+		finally:
+			stdout.close()
+		self._popen[job.id] = popen
+		job.pid   = popen.pid
+		job.ctime = _procStart(popen.pid)
+
+	# ----------------------------------------------------------------------
+	# Remove a queued job, or terminate a running one
+	# @return True if job was found
+	# ----------------------------------------------------------------------
+	def cancel(self, jid):
+		with self:
+			job = self._find(jid)
+			if job is None or not job.active(): return False
+			if job.status == JOB_RUNNING and job.kind == KIND_RUN \
+			   and _alive(job.pid, job.ctime):
+				try:
+					os.killpg(job.pid, signal.SIGTERM)
+				except OSError:
+					pass
+			self._finish(job, JOB_CANCELLED)
+			self._popen.pop(job.id, None)
+			self._poll()
+		return True
+
+	# ----------------------------------------------------------------------
+	# Change the priority of a queued job
+	# ----------------------------------------------------------------------
+	def setPriority(self, jid, priority):
+		with self:
+			job = self._find(jid)
+			if job is None: return False
+			job.priority = priority
+			self._dirty  = True
+		return True
+
+	# ----------------------------------------------------------------------
+	def _find(self, jid):
+		for job in self.jobs:
+			if job.id == jid: return job
+		return None
+
+	# ----------------------------------------------------------------------
+	# @return job jid with its current status, inside a transaction
+	# the status is updated only at the end
+	# ----------------------------------------------------------------------
+	def job(self, jid):
+		with self:
+			if self._depth == 1: self._reap()
+			return self._find(jid)
+
+	# ----------------------------------------------------------------------
+	# Advance the queue
+	# @return dictionary of all the jobs by id
+	# ----------------------------------------------------------------------
+	def snapshot(self):
+		with self:
+			self._poll()
+			return dict((j.id, j) for j in self.jobs)
+
+	# ----------------------------------------------------------------------
+	# @return list of queued and running jobs
+	# ----------------------------------------------------------------------
+	def active(self):
+		with self:
+			self._reap()
+			return [j for j in self.jobs if j.active()]
+
+	# ----------------------------------------------------------------------
+	# Wait until job finishes
+	# @return exit code or None if unknown
+	# ----------------------------------------------------------------------
+	def wait(self, jid, interval=1.0):
+		while True:
+			self.poll()
+			job = self._find(jid)
+			if job is None: return None
+			if not job.active(): return job.rc
+			time.sleep(interval)
+
+	# ----------------------------------------------------------------------
+	# Wait for free slots for a compilation from this session
+	# @param slots	slots requested, the job gets at least one and at
+	#		most the ones free when it starts (job.slots)
+	# @param killed	function returning True to abandon the waiting
+	# @return the running job, or None if abandoned
+	# ----------------------------------------------------------------------
+	def acquire(self, name, priority=0, nice=None, killed=None, interval=0.5,
+			slots=1):
+		jid = self.submit(KIND_COMPILE, name, priority=priority, nice=nice,
+				slots=slots)
+		while True:
+			with self:
+				job = self._find(jid)
+				if job is None or job.status == JOB_CANCELLED:
+					return None
+				if job.status == JOB_RUNNING:
+					return job
+				if killed is not None and killed():
+					self._finish(job, JOB_CANCELLED)
+					return None
+				self._poll()
+				if job.status == JOB_RUNNING:
+					return job
+			time.sleep(interval)
+
+	# ----------------------------------------------------------------------
+	# Release the slot of a compile job
+	# ----------------------------------------------------------------------
+	def release(self, job, rc=None):
+		with self:
+			j = self._find(job.id)
+			if j is not None and j.active():
+				self._finish(j, JOB_FINISHED, rc)
+			self._poll()
+
+#-------------------------------------------------------------------------------
+# @return the scheduler of the session
+#-------------------------------------------------------------------------------
+def scheduler():
+	global _scheduler
+	if _scheduler is None:
+		_scheduler = Scheduler()
+	return _scheduler
+
+#-------------------------------------------------------------------------------
+# Advance the queue if there is one
+#-------------------------------------------------------------------------------
+def poll():
+	if _scheduler is None and not os.path.exists(stateFile):
+		return []
+	return scheduler().poll()
+
+#-------------------------------------------------------------------------------
+# Advance the queue if there is one
+# @return dictionary of the jobs by id, to check many runs at once
+#-------------------------------------------------------------------------------
+def snapshot():
+	if _scheduler is None and not os.path.exists(stateFile):
+		return {}
+	return scheduler().snapshot()
+
+#-------------------------------------------------------------------------------
+# @return context to submit many jobs to the queue in a single locked
+# transaction, or a dummy one for the other batch queues
+#-------------------------------------------------------------------------------
+def transaction(queue):
+	if queue != QUEUE: return contextlib.nullcontext()
+	return scheduler()
+
+#-------------------------------------------------------------------------------
+# Load configuration
+#-------------------------------------------------------------------------------
+def loadConfig(config):
+	global slots, policy, nice, pin
+	from tkFlair import getStr, getBool, getInt
+
+	slots  = getInt(section,  "slots",  slots)
+	policy = getStr(section,  "policy", policy).lower()
+	nice   = getInt(section,  "nice",   nice)
+	pin    = getBool(section, "pin",    pin)
+	if policy not in POLICIES: policy = POLICIES[0]
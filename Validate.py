@@ -54,6 +54,8 @@ class Validate:
 		self.input   = project.input
 		self._log    = log
 		self.skip    = []	# errors/warnings to skip
+		self.timing  = False	# report the time spent on every rule
+		self.timer   = None
 		self.init()
 
 	# ----------------------------------------------------------------------
@@ -97,6 +99,9 @@ class Validate:
 		for card,err in self.input.preprocess(defines):
 			self.addError(card,err)
 
+		# Check the whats of every active card
+		self._checkCards()
+
 		# Check cards out of order
 		self._checkOutOfOrder()
 
@@ -126,6 +131,24 @@ class Validate:
 		# - RESNUCLEi with w/wo evolution on same unit
 		# - USRBDX of region that do not share any common body
 
+	#-----------------------------------------------------------------------
+	# Validate the values of all active cards
+	#-----------------------------------------------------------------------
+	def _checkCards(self):
+		if self.timing:
+			self.timer = Input.RuleTimer()
+		else:
+			self.timer = None
+
+		for card in self.input.validate(self.timer):
+			if card.invalid[0] is None:
+				self.addWarning(card, "No matching case found for card")
+			else:
+				self.addWarning(card, "Invalid what(s)=%s"%(str(card.invalid)))
+
+		if self.timer is not None:
+			self.write(self.timer.report())
+
 	#-----------------------------------------------------------------------
 	# Check for cards out of logical order
 	#-----------------------------------------------------------------------
@@ -43,7 +43,6 @@ import os
 import sys
 import binascii
 import io
-import tkinter as tk
 
 #sys.path.append(os.path.join(os.path.abspath(os.path.dirname(__file__)), 'lib'))
 
@@ -54,6 +53,16 @@ import tkinter as tk
 PRGPATH=os.path.abspath(os.path.dirname(__file__))
 sys.path.append(os.path.join(PRGPATH, 'lib'))
 
+# Headless batch mode, dispatched before tkinter is imported
+if __name__ == "__main__" and len(sys.argv)>1 and sys.argv[1] == "batch":
+	import Batch
+	sys.exit(Batch.main(sys.argv[2:]))
+
+# Startup profiler, must be enabled before any other import
+import startup
+if "--profile" in sys.argv: startup.enable()
+
+import tkinter as tk
 import re
 import bz2
 import time
@@ -105,6 +114,7 @@ import Layout
 import Ribbon
 import Project
 import Updates
+import Scheduler
 import FlairRibbon
 
 # Plot Engines
@@ -112,21 +122,18 @@ import GPPlot
 import MPPlot
 import Gnuplot
 
-# Importers/Exporters
-import Gdml
-import Mcnp
-import Povray
-import OpenSCAD
+# Importers/Exporters, loaded on first use
+Gdml     = startup.lazyImport("Gdml")
+Mcnp     = startup.lazyImport("Mcnp")
+Povray   = startup.lazyImport("Povray")
+OpenSCAD = startup.lazyImport("OpenSCAD")
 
 # Frames
 import Output
 import RunPage
-import PetPage
 import PlotPage
-import DicomPage
 import InputPage
 import Materials
-import Calculator
 import ViewerPage
 import CompilePage
 import ProjectPage
@@ -169,15 +176,16 @@ def garbage_collect(event=None):
 # XXX Maybe combined with Geometry Viewer? But if module do not exists?
 ##		( "Debug"     , "debug"     , Ribbon.FlairPage, False),
 #===============================================================================
+# Pages given as (module, class, name, icon) are imported on first use
 _PAGES =  [	#  Class
-		Calculator.CalculatorPage,
+		("Calculator", "CalculatorPage", "Calculator", "calculator"),
 		CompilePage.CompilePage  ,
-		DicomPage.DicomPage      ,
+		("DicomPage",  "DicomPage",      "Dicom",      "dicom"),
 		ProjectPage.ProjectPage  ,
 		InputPage.InputPage      ,
 		Materials.MaterialPage   ,
 		Output.OutputPage        ,
-		PetPage.PetPage          ,
+		("PetPage",    "PetPage",        "Pet",        "pet"),
 		PlotPage.PlotListPage    ,
 		RunPage.RunPage          ,
 		PeriodicTable.PeriodicTablePage,
@@ -270,13 +278,20 @@ class FlairTabRibbonFrame(Ribbon.TabRibbonFrame):
 		# Create pages
 		#for name, iconname, PageClass in _PAGES:
 		for PageClass in _PAGES:
-			name = PageClass._name_
-			iconname = PageClass._icon_
+			if isinstance(PageClass, tuple):
+				module, classname, name, iconname = PageClass
+			else:
+				name = PageClass._name_
+				iconname = PageClass._icon_
 			if isinstance(iconname,str):
 				icon = tkFlair.icons[iconname]
 			else:
 				icon = iconname
-			page = PageClass(flair, name, icon, False)
+			if isinstance(PageClass, tuple):
+				page = FlairRibbon.LazyPage(flair, module, classname,
+						name, icon, False)
+			else:
+				page = PageClass(flair, name, icon, False)
 			# page settings
 			try:
 				settings = tkFlair.config.get(tkFlair._PAGE_SECTION,name).split()
@@ -627,6 +642,9 @@ class Flair(Toplevel):
 		self.jobs = []	# list of active jobs
 		self._afterJob = None
 
+		# Advance the local run scheduler, also the queue of previous sessions
+		self._afterQueue = self.after(Project.refreshInterval, self._pollQueue)
+
 		if view:
 			self.tabs.changePage("Viewer")
 			for fn in view:
@@ -699,6 +717,16 @@ class Flair(Toplevel):
 		else:
 			self._afterJob = None
 
+	# --------------------------------------------------------------------
+	# Start the queued runs as soon as slots are freed
+	# --------------------------------------------------------------------
+	def _pollQueue(self):
+		try:
+			Scheduler.poll()
+		except (OSError, IOError):
+			log.say(str(sys.exc_info()[1]))
+		self._afterQueue = self.after(Project.refreshInterval, self._pollQueue)
+
 	#----------------------------------------------------------------------
 	# Create a new log entry
 	#----------------------------------------------------------------------
@@ -1856,6 +1884,22 @@ class Flair(Toplevel):
 			self._renumberPos = min(self._renumberPos, pos)
 		return undoinfo
 
+	# ----------------------------------------------------------------------
+	def addCardsUndo(self, cards, pos):
+		"""add a list of cards to input at position pos and return undo info"""
+		undoinfo = ("Add %d cards"%(len(cards)), self.delCardsUndo, pos, len(cards))
+		self.project.input.addCards(cards, pos)
+		self.setInputModified()
+		return undoinfo
+
+	# ----------------------------------------------------------------------
+	def delCardsUndo(self, pos, n):
+		"""delete n cards from input starting at pos and return undo info"""
+		cards = self.project.input.delCards(pos, n)
+		undoinfo = ("Delete %d cards"%(len(cards)), self.addCardsUndo, cards, pos)
+		self.setInputModified()
+		return undoinfo
+
 	# ----------------------------------------------------------------------
 	# Remove all body references
 	# ----------------------------------------------------------------------
@@ -2280,6 +2324,7 @@ def usage(rc=0):
 	sys.stdout.write("Options:\n")
 	sys.stdout.write("\t-1\t\tLoad the first flair file in the folder\n")
 	sys.stdout.write("\t-c | --compile\tCompile executable\n")
+	sys.stdout.write("\t-j | --jobs #\tParallel compilations with -c (Default number of cpus)\n")
 #	sys.stdout.write("\t-d\t\tActivate the beta-development features\n")
 #	sys.stdout.write("\t-D\t\tDeactivate beta-development features (default)\n")
 	sys.stdout.write("\t-i file\t\tAlternative flair ini file\n")
@@ -2290,7 +2335,9 @@ def usage(rc=0):
 	sys.stdout.write("\t-R #\t\tLoad recent project (number 1..10 or filename)\n")
 	sys.stdout.write("\t-l | --list\tList recent projects\n")
 	sys.stdout.write("\t-s\t\tSkip About dialog\n")
+	sys.stdout.write("\t--profile\tPrint the import and initialization times\n")
 	sys.stdout.write("\t-u\tupdate\tRecalculate and save input file variables\n")
+	sys.stdout.write("\tbatch cmd ...\tHeadless execution, see \"batch --help\"\n")
 	sys.stdout.write("\tfilename\tproject file or input file or imported files\n")
 	sys.stdout.write("\t\t\textensions supported: <none|.flair>,  .inp, .fluka,\n")
 	sys.stdout.write("\t\t\t                      .pickle, .mcnp, .gdml\n")
@@ -2314,8 +2361,9 @@ def parseArgs(arglist):
 	project = Project.Project()
 	try:
 		optlist, args = getopt.getopt(arglist,
-			"?hci:e:R:rlsdDg1u",
-			["help", "compile", "ini=", "exe=", "recent", "list", "skip", "update"])
+			"?hci:e:j:R:rlsdDg1u",
+			["help", "compile", "ini=", "exe=", "jobs=", "recent", "list", "skip",
+			 "update", "profile"])
 	except getopt.GetoptError:
 		usage(1)
 
@@ -2329,11 +2377,16 @@ def parseArgs(arglist):
 			pass
 		elif opt in ("-c", "--compile"):
 			compileExe = True
+		elif opt in ("-j", "--jobs"):
+			try:
+				Project.compileJobs = int(val)
+			except ValueError:
+				usage(1)
 		elif opt in ("-s", "--skip"):
 			tkFlair._SKIP_INTRO = True
 		elif opt in ("-e", "--exe"):
 			project.setExecutable(val)
-		elif opt in ("-d","-D"):
+		elif opt in ("-d","-D","--profile"):
 			pass	# It should be already activated
 		elif opt == "-1":
 			for filename in os.listdir("."):
@@ -2498,10 +2551,13 @@ if __name__ == "__main__":
 				pass
 
 	# Initialise options
-	PeriodicTable.init(os.path.join(tkFlair.prgDir, "db/isotopes.ini"))
+	with startup.step("PeriodicTable.init"):
+		PeriodicTable.init(os.path.join(tkFlair.prgDir, "db/isotopes.ini"))
 	loadMaterialIni()
-	Layout.init()
-	tkFlair.init(ini)
+	with startup.step("Layout.init"):
+		Layout.init()
+	with startup.step("tkFlair.init"):
+		tkFlair.init(ini)
 
 	if not GeometryEditor.installed():
 		tkFlair.write("Warning: Geometry Viewer not found\n")
@@ -2514,7 +2570,8 @@ if __name__ == "__main__":
 	# output page is created
 	log.set(tkFlair.write)
 
-	project,view = parseArgs(sys.argv[1:])
+	with startup.step("parseArgs"):
+		project,view = parseArgs(sys.argv[1:])
 
 	tkFlair.addOptions(tkFlair.__name__, root)
 	tkFlair.addOptions(tkFlair._FONT_SECTION, root)
@@ -2525,7 +2582,8 @@ if __name__ == "__main__":
 
 	if project.projFile: addRecent(project.projFile)
 
-	flair = Flair(root, project, view)
+	with startup.step("Flair"):
+		flair = Flair(root, project, view)
 
 	if not tkFlair._SKIP_INTRO: tkFlair.aboutDialog(flair, 2500)
 	if Project.flukaDir == "":
@@ -2534,10 +2592,16 @@ if __name__ == "__main__":
 			"Please set the Fluka Directory in the Preferences Dialog." \
 			% (Project.flukaVar))
 		flair.preferences()
-	Manual.init((tkFlair.prgDir, Project.flukaDir))
+	with startup.step("Manual.init"):
+		Manual.init((tkFlair.prgDir, Project.flukaDir))
 	if Updates.need2Check(): flair.checkUpdates()
-	flair.checkFluka()
+	with startup.step("checkFluka"):
+		flair.checkFluka()
 	GeometryEditor.checkVersion(flair)
+	if startup.enabled():
+		root.update_idletasks()
+		startup.disable()
+		startup.report()
 
 	# Main loop
 	if root is not None: root.mainloop()
@@ -36,11 +36,13 @@
 __author__ = "Vasilis Vlachoudis"
 __email__  = "Paola.Sala@mi.infn.it"
 
+import re
 import math
 import cmath
 from math import *
 import rexx
 import random
+from functools import lru_cache
 
 # Accuracy for comparison operators
 _accuracy = 1E-15
@@ -109,11 +111,192 @@ def d2s(ang, fmt=""):
 
 #-------------------------------------------------------------------------------
 # Format a number to fit in the minimum space
+# The number is converted to a string and the formatting is cached. Numbers
+# written without spaces are formatted by _formatNumber() which computes
+# the length of each representation instead of trying them, anything else
+# goes through the original formatTrials()
 #-------------------------------------------------------------------------------
+_FORMAT_MAXLEN = 22
+_FORMAT_NUMBER = re.compile(r"[-+]?([0-9]+\.?[0-9]*|\.[0-9]+)([ED][-+]?[0-9]+)?$")
+
 def format(number, length=10, useExp=False, useD=False):
 	"""
 	Format a number to fit in the minimum space given by length
 	"""
+	if isinstance(number, float) or isinstance(number, int):
+		# 0.0 and -0.0 are equal but formatted differently
+		if number: return _formatValue(number, length, useExp, useD)
+		s = repr(number).upper()
+	else:
+		s = str(number).strip().upper()
+	if _FORMAT_NUMBER.match(s):
+		return _formatString(s, length, useExp, useD)
+	return formatTrials(number, length, useExp, useD)
+
+#-------------------------------------------------------------------------------
+# Caches of the formatted values, typed since 1, 1.0 and True are equal
+#-------------------------------------------------------------------------------
+@lru_cache(maxsize=65536, typed=True)
+def _formatValue(number, length, useExp, useD):
+	s = repr(number).upper()
+	if _FORMAT_NUMBER.match(s):
+		return _formatNumber(s, length, useExp, useD)
+	return formatTrials(number, length, useExp, useD)
+
+@lru_cache(maxsize=65536)
+def _formatString(s, length, useExp, useD):
+	return _formatNumber(s, length, useExp, useD)
+
+#-------------------------------------------------------------------------------
+# Format a list, tuple or numpy array of numbers
+#-------------------------------------------------------------------------------
+def formatList(values, length=10, useExp=False, useD=False):
+	"""
+	Format a sequence or a numpy array of numbers, return a list of strings
+	"""
+	try:
+		values = values.ravel().tolist()	# numpy scalars to python
+	except AttributeError:
+		pass
+	return [format(x, length, useExp, useD) for x in values]
+
+#-------------------------------------------------------------------------------
+# Same algorithm as formatTrials() for a valid number string s.
+# Instead of creating every candidate representation only its length is
+# calculated, the digits are dropped and rounded one step at a time as in
+# formatTrials() since the rounding is applied on the already rounded digits
+#-------------------------------------------------------------------------------
+def _formatNumber(number, length, useExp, useD):
+	if useD:
+		number = number.replace("E", "D")
+		expE = "D"
+	else:
+		number = number.replace("D", "E")
+		expE = "E"
+
+	if len(number) < length:
+		hasExp = expE in number
+		if useExp:
+			if hasExp: return number
+		elif "." in number or hasExp:
+			return number
+
+	if useExp:
+		zero = "0.%s0" % (expE)
+	else:
+		zero = "0.0"
+	if number=="0": return zero
+
+	if length<5 or length>_FORMAT_MAXLEN: raise Exception("Format invalid length")
+
+	# Dissect the number
+	mantissa, e, exponent = number.partition(expE)
+	exponent = int(exponent) if exponent else 0
+
+	sgn = mantissa[0]=='-'
+	if sgn or mantissa[0]=='+': mantissa = mantissa[1:]
+
+	befo, dot, afte = mantissa.partition(".")
+	integer = befo + afte
+	digits  = integer.lstrip("0")
+	if not digits: return zero
+	exponent += len(befo) - (len(integer) - len(digits))
+	# trailing zeros are kept when only the first digit is non zero
+	integer = digits.rstrip("0")
+	if len(integer)==1: integer = digits
+
+	# Cannot handle more than _FORMAT_MAXLEN digits
+	lint = len(integer)
+	if lint > _FORMAT_MAXLEN:
+		r = integer[_FORMAT_MAXLEN]
+		integer = integer[0:_FORMAT_MAXLEN]
+		if r>='5':
+			integer = str(int(integer)+1)
+			if len(integer) > lint:
+				exponent += 1
+				if len(integer) > _FORMAT_MAXLEN:
+					integer = integer[0:_FORMAT_MAXLEN]
+
+	# Now the number is described by:
+	#	sgn 0.integer "E" exponent
+	if sgn: length -= 1
+
+	while True:
+		# Length of the representation chosen by formatTrials()
+		lint = len(integer)
+		if useExp:
+			mlen = lint + 2 + len(str(exponent-1))
+		elif exponent==-2:
+			mlen = lint + 3
+		elif exponent==-1:
+			mlen = lint + 2
+		elif exponent==0 or exponent==1:
+			mlen = lint + 1
+		elif exponent==length:
+			mlen = max(lint, length)
+		elif exponent>1 and exponent<=lint:
+			mlen = lint + 1
+		elif exponent>1 and exponent<=lint+2:
+			mlen = exponent + 1
+		elif exponent>lint and exponent+1<length:
+			mlen = exponent + 1
+		else:
+			mlen = lint + 2 + len(str(exponent-1))
+
+		diff = mlen-length
+		if diff<=0:
+			break
+		elif diff<=2:
+			r = integer[-1]
+			integer = integer[0:-1]
+		else:
+			r = integer[-diff]
+			integer = integer[0:-diff]
+
+		if r>='5':
+			lint = len(integer)
+			if lint==0: integer = 0
+			integer = str(int(integer)+1)
+			if len(integer) > lint:
+				exponent += 1
+
+		# Remove trailing zeros
+		integer = integer.rstrip("0")
+		if not integer: return zero
+
+	# Create the representation
+	lint = len(integer)
+	if useExp:
+		mNum = "%s.%s%s%d"%(integer[0],integer[1:],expE,exponent-1)
+	elif exponent==-2:
+		mNum = ".00%s"%(integer)
+	elif exponent==-1:
+		mNum = ".0%s"%(integer)
+	elif exponent==0:
+		mNum = ".%s"%(integer)
+	elif exponent==1:
+		mNum = "%s.%s"%(integer[0],integer[1:])
+	elif exponent==length:
+		mNum = "%s%s"%(integer,"0"*(length-lint))
+	elif exponent>1 and exponent<=lint:
+		mNum = "%s.%s"%(integer[:exponent],integer[exponent:])
+	elif exponent>1 and exponent<=lint+2:
+		mNum = "%s%s."%(integer, "0"*(exponent-lint))
+	elif exponent>lint and exponent+1<length:
+		mNum = "%s%s."%(integer, "0"*(exponent-lint))
+	else:
+		mNum = "%s.%s%s%d"%(integer[0],integer[1:],expE,exponent-1)
+
+	if sgn: mNum = "-%s"%(mNum)
+	return mNum
+
+#-------------------------------------------------------------------------------
+# Original formatting by trying successive representations
+#-------------------------------------------------------------------------------
+def formatTrials(number, length=10, useExp=False, useD=False):
+	"""
+	Format a number to fit in the minimum space given by length
+	"""
 
 	_MAXLEN=22
 
@@ -97,7 +97,8 @@ __email__  = "Paola.Sala@mi.infn.it"
 class CSGException(Exception):
 	pass
 
-MAXEXPR = 10000
+MAXEXPR  = 10000
+MAXTERMS = 5000		# Maximum number of products during normalization
 
 # ----------------------------------------------------------------------
 def tokenize(expr):
@@ -318,19 +319,201 @@ def exp2rpn(expr):
 		del expr[i]
 
 # ----------------------------------------------------------------------
-# Subroutine:	rpnorm
-# Author:	Vasilis.Vlachoudis@cern.ch
-# Date:		20/4/2004
-#
 # Normalize a CG expression given in Reverse Polish Notation.
 # Normalized CG expression is an expression given as sum (Boolean OR) of
 # products (Boolean intersection or subtraction).
+# The expression is converted in place to a normalized RPN that can be
+# passed to rpn2exp()
+# ----------------------------------------------------------------------
+def rpnorm(expr, maxterms=MAXTERMS):
+	rpn = []
+	for plus, minus in _Normalizer(maxterms).zones(expr):
+		# First term is always a plus
+		if plus:
+			term = [plus[0]]
+			plus = plus[1:]
+		else:
+			term = ["@"]
+		for x in plus:
+			term.append(x)
+			term.append("+")
+		for x in minus:
+			term.append(x)
+			term.append("-")
+		rpn.extend(term)
+		if len(rpn) > len(term): rpn.append("|")
+	expr[:] = rpn
+
+# ----------------------------------------------------------------------
+# Normalize an RPN expression and return the normalized expression
+# as a list of tokens like rpn2exp()
+# ----------------------------------------------------------------------
+def normalize(expr, maxterms=MAXTERMS):
+	"""return the normalized (sum of products) expression of an rpn list"""
+	norm = []
+	for plus, minus in _Normalizer(maxterms).zones(expr):
+		if norm: norm.append("|")
+		for x in plus:
+			norm.append("+")
+			norm.append(x)
+		for x in minus:
+			norm.append("-")
+			norm.append(x)
+	return norm
+
+# ----------------------------------------------------------------------
+# Normalization using a directed acyclic graph of the expression
+#
+# The rpn expression is converted to a DAG where identical sub-expressions
+# are shared (hash-consing), each node is expanded only once to a sum of
+# products and the complement is expanded only for the nodes found on the
+# right side of a subtraction
+#
+#	X | Y  ->  zones(X) U zones(Y)
+#	X + Y  ->  { x+y : x in zones(X), y in zones(Y) }
+#	X - Y  ->  X + not(Y)
+#	not(X + Y) = not(X) | not(Y)
+#	not(X | Y) = not(X) + not(Y)
+#	not(X - Y) = not(X) | Y
+#
+# A product is a tuple (plus,minus) of frozensets. The products with the
+# same term in plus and minus are removed and the duplicated products
+# are skipped while expanding (like optZone and rmDoubles)
+# ----------------------------------------------------------------------
+_UNIVERSE = (frozenset(), frozenset())
+
+class _Normalizer:
+	def __init__(self, maxterms=MAXTERMS):
+		self.maxterms = maxterms
+		self.nodes    = {}	# hash-consing {key:node id}
+		self.keys     = []	# node keys (op,left,right) or (name,)
+
+	# ----------------------------------------------------------------------
+	# Create the DAG from an rpn list
+	# @return root node id
+	# ----------------------------------------------------------------------
+	def build(self, rpn):
+		stack = []
+		for token in rpn:
+			if token in ("+", "-", "|"):
+				if len(stack) < 2:
+					raise CSGException("Invalid expression")
+				right = stack.pop()
+				key = (token, stack.pop(), right)
+			else:
+				key = (token,)
+			try:
+				node = self.nodes[key]
+			except KeyError:
+				node = self.nodes[key] = len(self.keys)
+				self.keys.append(key)
+			stack.append(node)
+		if len(stack) != 1:
+			raise CSGException("Invalid expression")
+		return stack[0]
+
+	# ----------------------------------------------------------------------
+	# @return list of (plus, minus) sorted lists for every zone
+	# ----------------------------------------------------------------------
+	def zones(self, rpn):
+		if not rpn: return []
+		root = self.build(rpn)
+		keys = self.keys
+
+		# Find which nodes need the expansion and/or the complement
+		pos = [False]*len(keys)
+		neg = [False]*len(keys)
+		pos[root] = True
+		for node in range(root, -1, -1):
+			key = keys[node]
+			if len(key) == 1: continue
+			op, left, right = key
+			if pos[node]:
+				pos[left] = True
+				if op == "-":
+					neg[right] = True
+				else:
+					pos[right] = True
+			if neg[node]:
+				neg[left] = True
+				if op == "-":
+					pos[right] = True
+				else:
+					neg[right] = True
+
+		# Expand the nodes, children have always a lower id
+		sop = [None]*len(keys)
+		nop = [None]*len(keys)
+		for node,key in enumerate(keys):
+			if len(key) == 1:
+				name = key[0]
+				if name == "@":
+					sop[node] = [_UNIVERSE]
+					nop[node] = []
+				else:
+					sop[node] = [(frozenset((name,)), frozenset())]
+					nop[node] = [(frozenset(), frozenset((name,)))]
+				continue
+
+			op, left, right = key
+			if pos[node]:
+				if op == "|":
+					sop[node] = self.union(sop[left], sop[right])
+				elif op == "+":
+					sop[node] = self.product(sop[left], sop[right])
+				else:
+					sop[node] = self.product(sop[left], nop[right])
+			if neg[node]:
+				if op == "|":
+					nop[node] = self.product(nop[left], nop[right])
+				elif op == "+":
+					nop[node] = self.union(nop[left], nop[right])
+				else:
+					nop[node] = self.union(nop[left], sop[right])
+
+		zones = []
+		for plus, minus in sop[root]:
+			if plus or minus:
+				zones.append((sorted(plus), sorted(minus)))
+		return zones
+
+	# ----------------------------------------------------------------------
+	# Union of two sums removing duplicates
+	# ----------------------------------------------------------------------
+	def union(self, a, b):
+		result = dict.fromkeys(a)
+		result.update(dict.fromkeys(b))
+		if len(result) > self.maxterms:
+			raise CSGException("Expansion failed. Too many terms")
+		return list(result)
+
+	# ----------------------------------------------------------------------
+	# Intersection of two sums, expanding the products
+	# ----------------------------------------------------------------------
+	def product(self, a, b):
+		result = {}
+		for aplus, aminus in a:
+			for bplus, bminus in b:
+				plus  = aplus  | bplus
+				minus = aminus | bminus
+				if plus.isdisjoint(minus):
+					result[(plus, minus)] = None
+			if len(result) > self.maxterms:
+				raise CSGException("Expansion failed. Too many terms")
+		return list(result)
+
+# ----------------------------------------------------------------------
+# Subroutine:	rpnormRules
+# Author:	Vasilis.Vlachoudis@cern.ch
+# Date:		20/4/2004
+#
+# Reference normalization by repeatedly applying the production rules
 # The normalization (expansion of parenthesis and operator priorities)
 # should be performed by recursively calling the RPNRULE subroutine.
 # Since Fortran-77 doesn't have recursion, call the RPNRULE for every
 # operator starting from the right-most one, until no rule is found.
 # ----------------------------------------------------------------------
-def rpnorm(expr):
+def rpnormRules(expr):
 	# Loop until there is no any extra change needed
 
 	# Scan to find the first operators
@@ -690,8 +873,7 @@ def rpn2exp(rpn):
 # The product is described by 2 arrays the PLUS,NPLUS and MINUS,NMINUS
 # with all the plus and minus terms of the product
 #
-# WARNING: It doesn't delete the term from the arrays but changes the
-# name to space.
+# The duplicated terms are removed from the arrays
 # ----------------------------------------------------------------------
 def optZone(plus,minus):
 	# Remove Universe @ from PLUS
@@ -725,9 +907,9 @@ def optZone(plus,minus):
 	# Perform the Geometrical optimization in the product
 	#call OptGeo(nplus,plus,nminus,minus)
 
-	# Peform a bubble sort on product terms
-	plus.sort()
-	minus.sort()
+	# Remove the deleted terms and sort the product terms
+	plus[:]  = sorted([x for x in plus  if x is not None])
+	minus[:] = sorted([x for x in minus if x is not None])
 
 # ----------------------------------------------------------------------
 # Subroutine:	rmDoubles
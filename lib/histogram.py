@@ -39,8 +39,30 @@ __email__  = "Paola.Sala@mi.infn.it"
 import sys
 import bmath
 import io
+from bisect import bisect_right
 from math import *
 
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+#-------------------------------------------------------------------------------
+def _checkNumpy():
+	if numpy is None:
+		raise ImportError("Numpy is not available. See http://numpy.scipy.org/ to download and install")
+
+#-------------------------------------------------------------------------------
+# Return the weights as an array matching the shape of x
+#-------------------------------------------------------------------------------
+def _weights(x, w):
+	if numpy.ndim(w)==0:
+		return numpy.full(x.shape, float(w))
+	w = numpy.asarray(w, dtype=numpy.float64).ravel()
+	if w.shape != x.shape:
+		raise ValueError("Histogram fill: values and weights have different lengths")
+	return w
+
 #===============================================================================
 # Histogram 1D
 #===============================================================================
@@ -56,29 +78,31 @@ class Histogram1D:
 		bins can the number of bins, or
 		be a list of bins or a file for a variable binning histogram
 		"""
-		self.under   = 0.0
-		self.over    = 0.0
-		self.total   = 0.0
-		self.entries = 0
-
-		if isinstance(bins,str) or isinstance(bins,file):
+		_checkNumpy()
+		self.under    = 0.0
+		self.over     = 0.0
+		self.total    = 0.0
+		self.entries  = 0
+		self._logstep = None
+
+		if isinstance(bins,str) or hasattr(bins,"read"):
 			self.load(bins)
-		elif isinstance(bins,list):
+		elif isinstance(bins,(list,tuple,numpy.ndarray)):
 			self.nbins  = len(bins)-1	# number of bins
-			self.xbins  = bins		# x bins list
-			self._xlow  = bins[0]		# limits
-			self._xhigh = bins[-1]
+			self.xbins  = numpy.array(bins, dtype=numpy.float64)	# x bins
+			self._xlow  = float(bins[0])	# limits
+			self._xhigh = float(bins[-1])
 			self.xstep  = None		# Step is variable
-			self.h      = [0.0]*self.nbins
-			self.eh     = [0.0]*self.nbins
+			self.h      = numpy.zeros(self.nbins)
+			self.eh     = numpy.zeros(self.nbins)
 		else:
 			self.nbins  = bins
 			self.xbins  = None
 			self._xlow  = xlow
 			self._xhigh = xhigh
 			self.xstep  = (self._xhigh-xlow)/float(bins)
-			self.h      = [0.0]*self.nbins
-			self.eh     = [0.0]*self.nbins
+			self.h      = numpy.zeros(self.nbins)
+			self.eh     = numpy.zeros(self.nbins)
 
 	# ----------------------------------------------------------------------
 	def logBinning(self, bins, xlow, xhigh):
@@ -87,23 +111,25 @@ class Histogram1D:
 		self._xlow  = xlow
 		self._xhigh = xhigh
 		self.xstep  = None
-		self.h      = [0.0]*self.nbins
-		self.eh     = [0.0]*self.nbins
+		self.h      = numpy.zeros(self.nbins)
+		self.eh     = numpy.zeros(self.nbins)
 
-		self.xbins  = []
+		xbins = []
 		x = log10(xlow)
 		s = (log10(xhigh)-x)/float(bins)
+		self._logstep = (x, s)
 		for i in range(bins):
-			self.xbins.append(10.0**x)
+			xbins.append(10.0**x)
 			if abs(x)<1e-15: x = 0.0
 			x += s
-		self.xbins.append(10.0**x)
+		xbins.append(10.0**x)
+		self.xbins = numpy.array(xbins)
 
 	# ----------------------------------------------------------------------
 	def clear(self):
 		"""Delete data"""
-		for i in range(bins):
-			self.h[i] = self.eh[i] = 0.0
+		self.h[:]    = 0.0
+		self.eh[:]   = 0.0
 		self.under   = 0.0
 		self.over    = 0.0
 		self.total   = 0.0
@@ -119,10 +145,11 @@ class Histogram1D:
 		else:
 			close = False
 
-		self.h     = []
-		self.eh    = []
-		self.xbins = []
+		h     = []
+		eh    = []
+		xbins = []
 		self.nbins = 0
+		self._logstep = None
 		first      = True
 		for line in fin:
 			if line[0]=="#":
@@ -136,27 +163,30 @@ class Histogram1D:
 			else:
 				word = line.split()
 				if len(word)==1:
-					self.h.append(float(word[0]))
-					self.eh.append(0.0)
+					h.append(float(word[0]))
+					eh.append(0.0)
 				elif len(word)==2:
-					self.h.append(float(word[1]))
-					self.eh.append(0.0)
+					h.append(float(word[1]))
+					eh.append(0.0)
 				elif len(word)==3:
-					self.h.append(float(word[1]))
-					self.eh.append(float(word[2]))
+					h.append(float(word[1]))
+					eh.append(float(word[2]))
 				elif len(word)==4:
 					if self.nbins==0:
 						if first:
-							self.xbins.append(float(word[0]))
+							xbins.append(float(word[0]))
 							first = False
-						self.xbins.append(float(word[1]))
-					self.h.append(float(word[2]))
-					self.eh.append(float(word[3]))
-
-		if self.xbins:
-			self._xlow  = self.xbins[0]
-			self._xhigh = self.xbins[-1]
-			self.nbins  = len(self.xbins)-1
+						xbins.append(float(word[1]))
+					h.append(float(word[2]))
+					eh.append(float(word[3]))
+
+		self.h  = numpy.array(h,  dtype=numpy.float64)
+		self.eh = numpy.array(eh, dtype=numpy.float64)
+		if xbins:
+			self.xbins  = numpy.array(xbins)
+			self._xlow  = xbins[0]
+			self._xhigh = xbins[-1]
+			self.nbins  = len(xbins)-1
 			self.xstep  = None
 		else:
 			self.xbins = None
@@ -189,18 +219,15 @@ class Histogram1D:
 		x = self._xlow
 
 		if self.xstep is None:
-			for i in range(self.nbins):
-				x  = self.xbins[i]
-				xh = self.xbins[i+1]
-				y  = self.h[i]
-				e  = self.eh[i]
+			xbins = self.xbins.tolist()
+			for x,xh,y,e in zip(xbins, xbins[1:], self.h.tolist(), self.eh.tolist()):
 				fout.write("%15.10g %15.10g %15.10g %15.10g\n"%(x,xh,y,e))
 		else:
-			for y,e in zip(self.h,self.eh):
+			for y,e in zip(self.h.tolist(),self.eh.tolist()):
 				xh = x + self.xstep
 				if abs(xh)<1e-14: xh = 0.0
 				if cols==2:
-					fout.write("%15.10g %15.10g %15.10g\n"%(x,y))
+					fout.write("%15.10g %15.10g\n"%(x,y))
 				elif cols==3:
 					fout.write("%15.10g %15.10g %15.10g\n"%(x,y,e))
 				else:
@@ -230,29 +257,30 @@ class Histogram1D:
 		if hist.xbins is None:
 			self.xbins = None
 		else:
-			self.xbins = hist.xbins[:]
-		self._xlow   = hist._xlow
-		self._xhigh  = hist._xhigh
-		self.xstep   = hist.xstep
-		self.h       = hist.h[:]
-		self.eh      = hist.eh[:]
-		self.under   = hist.under
-		self.over    = hist.over
-		self.entries = hist.entries
-		self.total   = hist.total
+			self.xbins = hist.xbins.copy()
+		self._xlow    = hist._xlow
+		self._xhigh   = hist._xhigh
+		self.xstep    = hist.xstep
+		self._logstep = hist._logstep
+		self.h        = hist.h.copy()
+		self.eh       = hist.eh.copy()
+		self.under    = hist.under
+		self.over     = hist.over
+		self.entries  = hist.entries
+		self.total    = hist.total
 
 	# ----------------------------------------------------------------------
 	def clone(self):
 		"""Return a clone of the current histogram"""
-		hist = Histogram()
+		hist = Histogram(self.nbins, self._xlow, self._xhigh)
 		hist.copy(self)
 		return hist
 
 	# ----------------------------------------------------------------------
 	def empty(self):
 		"""Zero histogram"""
-		self.h       = [0.0] * self.nbins
-		self.eh      = [0.0] * self.nbins
+		self.h       = numpy.zeros(self.nbins)
+		self.eh      = numpy.zeros(self.nbins)
 		self.under   = 0.0
 		self.over    = 0.0
 		self.entries = 0
@@ -279,20 +307,39 @@ class Histogram1D:
 			return Histogram.OVER
 
 		if self.xstep is None:
-			# Perform a binary search to find the correct interval
-			low  = 0
-			high = self.nbins-1
-			while True:
-				mid = (low+high)//2
-				if mid==low: return mid
-				if x > self.xbins[mid]:
-					low = mid
-				elif x < self.xbins[mid]:
-					high = mid
-				else:
-					return mid
+			# binary search for the interval xbins[i] <= x < xbins[i+1]
+			return min(bisect_right(self.xbins, x)-1, self.nbins-1)
+		else:
+			return min(int((x - self._xlow) // self.xstep), self.nbins-1)
+
+	# ----------------------------------------------------------------------
+	def bins(self, x):
+		"""Return the bin index for every value of the array x
+		UNDER and OVER are returned for the values outside the limits
+		"""
+		x = numpy.asarray(x, dtype=numpy.float64)
+		if self._logstep is not None:
+			# equal log10 bins: direct index corrected by one bin
+			# where rounding put x to the wrong side of an edge
+			lx, s = self._logstep
+			with numpy.errstate(divide="ignore", invalid="ignore"):
+				idx = numpy.floor((numpy.log10(x)-lx)/s)
+			idx = numpy.nan_to_num(idx, nan=-1.0, posinf=self.nbins, neginf=-1.0)
+			idx = numpy.clip(idx, 0, self.nbins-1).astype(numpy.intp)
+			idx -= x < self.xbins[idx]
+			idx = numpy.clip(idx, 0, self.nbins-1)
+			idx += x >= self.xbins[idx+1]
+		elif self.xstep is None:
+			idx = numpy.searchsorted(self.xbins, x, side="right")-1
 		else:
-			return int((x - self._xlow) // self.xstep)
+			idx = numpy.floor((x - self._xlow) / self.xstep)
+			idx = numpy.nan_to_num(idx, nan=-1.0, posinf=self.nbins, neginf=-1.0)
+			idx = numpy.clip(idx, -1, self.nbins).astype(numpy.intp)
+		idx = numpy.minimum(idx, self.nbins-1)
+		idx[x <  self._xlow]  = Histogram.UNDER
+		idx[x >= self._xhigh] = Histogram.OVER
+		idx[numpy.isnan(x)]   = Histogram.OVER
+		return idx
 
 	# ----------------------------------------------------------------------
 	def x(self, i=None):
@@ -343,6 +390,20 @@ class Histogram1D:
 		else:
 			return self.xstep
 
+	# ----------------------------------------------------------------------
+	def edges(self):
+		"""return an array with the nbins+1 bin edges"""
+		if self.xstep is None:
+			return self.xbins
+		return self._xlow + self.xstep*numpy.arange(self.nbins+1)
+
+	# ----------------------------------------------------------------------
+	def widths(self):
+		"""return an array with the width of every bin"""
+		if self.xstep is None:
+			return numpy.diff(self.xbins)
+		return numpy.full(self.nbins, self.xstep)
+
 	# ----------------------------------------------------------------------
 	def error(self, i, e=None):
 		"""return or set the error value for the ith bin"""
@@ -354,29 +415,42 @@ class Histogram1D:
 	# ----------------------------------------------------------------------
 	def convertError2Relative(self):
 		"""Convert error to relative in percent"""
-		for i,y in enumerate(self.h):
-			self.eh[i] *= 100.0/y
+		self.eh *= 100.0/self.h
 
 	# ----------------------------------------------------------------------
 	def convertError2Absolute(self):
 		"""Convert errot to absolute value"""
-		for i,y in enumerate(self.h):
-			self.eh[i] *= y/100.0
+		self.eh *= self.h/100.0
 
 	# ----------------------------------------------------------------------
 	def fill(self, x, w=1.0):
-		"""Fill/add to position x weight w"""
-		self.entries += 1
-		self.total += w
-		i = self.bin(x)
-		if i==Histogram.UNDER:
-			self.under += w
+		"""Fill/add to position x weight w
+		x can be a single value or an array of values, and w a single
+		weight or an array of weights with the same length
+		"""
+		if numpy.ndim(x)==0:
+			self.entries += 1
+			self.total += w
+			i = self.bin(x)
+			if i==Histogram.UNDER:
+				self.under += w
 
-		elif i==Histogram.OVER:
-			self.over  += w
+			elif i==Histogram.OVER:
+				self.over  += w
 
-		else:
-			self.h[i] += w
+			else:
+				self.h[i] += w
+			return
+
+		x = numpy.asarray(x, dtype=numpy.float64).ravel()
+		w = _weights(x, w)
+		idx = self.bins(x)
+		self.entries += len(x)
+		self.total   += float(w.sum())
+		self.under   += float(w[idx==Histogram.UNDER].sum())
+		self.over    += float(w[idx==Histogram.OVER].sum())
+		sel = idx>=0
+		self.h += numpy.bincount(idx[sel], w[sel], minlength=self.nbins)
 
 	# ----------------------------------------------------------------------
 	# Normalize histogram with a factor f
@@ -385,14 +459,12 @@ class Histogram1D:
 		"""Normalize histogram. if f is None divide by the bin width,
 		   else multiply with the factor provided"""
 		if f is None:
-			for i in range(self.nbins):
-				dx = self.dx(i)
-				self.h[i]  /= dx
-				self.eh[i] /= dx
+			dx = self.widths()
+			self.h  /= dx
+			self.eh /= dx
 		else:
-			for i in range(self.nbins):
-				self.h[i]  *= f
-				self.eh[i] *= f
+			self.h  *= f
+			self.eh *= f
 	normalize = norm
 
 	# ----------------------------------------------------------------------
@@ -404,75 +476,68 @@ class Histogram1D:
 
 	# ----------------------------------------------------------------------
 	def isSame(self, hist):
-		# FIXME variable binning
 		"""Return true if histograms have the same limits"""
 		if self.nbins != hist.nbins: return False
 		if self._xlow  != hist._xlow:  return False
 		if self._xhigh != hist._xhigh: return False
+		if (self.xbins is None) != (hist.xbins is None): return False
+		if self.xbins is not None:
+			return bool(numpy.allclose(self.xbins, hist.xbins, rtol=1e-12, atol=0.0))
 		return True
 
+	# ----------------------------------------------------------------------
+	def _check(self, a):
+		if not a.isSame(self):
+			raise ValueError("Histograms have different binning")
+
 	# ----------------------------------------------------------------------
 	def __iadd__(self, a):
-		# FIXME variable binning
-		if isinstance(a,float):
-			for i in range(self.nbins):
-				self.h[i]  += a
+		if isinstance(a,(int,float)):
+			self.h += a
 
 		elif isinstance(a,Histogram):
-			if not a.isSame(self): raise
-			for i in range(self.nbins):
-				self.eh[i] = sqrt(self.eh[i]**2 + a.eh[i]**2)
-				self.h[i] += a[i]
+			self._check(a)
+			self.eh = numpy.hypot(self.eh, a.eh)
+			self.h += a.h
 		return self
 
 	# ----------------------------------------------------------------------
 	def __isub__(self, a):
-		# FIXME variable binning
-		if isinstance(a,float):
-			for i in range(self.nbins):
-				self.h[i]  -= a
+		if isinstance(a,(int,float)):
+			self.h -= a
 
 		elif isinstance(a,Histogram):
-			if not a.isSame(self): raise
-			for i in range(self.nbins):
-				self.eh[i] = sqrt(self.eh[i]**2 + a.eh[i]**2)
-				self.h[i] -= a[i]
+			self._check(a)
+			self.eh = numpy.hypot(self.eh, a.eh)
+			self.h -= a.h
 		return self
 
 	# ----------------------------------------------------------------------
 	def __imul__(self, a):
-		# FIXME variable binning
-		if isinstance(a,float):
-			for i in range(self.nbins):
-				self.h[i]  *= a
-				self.eh[i] *= a
+		if isinstance(a,(int,float)):
+			self.h  *= a
+			self.eh *= a
 
 		elif isinstance(a,Histogram):
-			if not a.isSame(self): raise
-			for i in range(self.nbins):
-				self.eh[i] = sqrt((a[i]*self.eh[i])**2 + \
-						(self[i]*a.eh[i])**2)
-				self.h[i] *= a[i]
+			self._check(a)
+			self.eh = numpy.hypot(a.h*self.eh, self.h*a.eh)
+			self.h *= a.h
 		return self
 
 	# ----------------------------------------------------------------------
 	def __idiv__(self, a):
-		# FIXME variable binning
-		if isinstance(a,float):
-			for i in range(self.nbins):
-				self.h[i]  /= a
-				self.eh[i] /= a
+		if isinstance(a,(int,float)):
+			self.h  /= a
+			self.eh /= a
 
 		elif isinstance(a,Histogram):
-			if not a.isSame(self): raise
-			for i in range(self.nbins):
-				try:
-					self.eh[i] = sqrt((self.eh[i]/a[i])**2 + \
-						     (self[i]/a[i]**2*a.eh[i])**2)
-				except:
-					self.eh[i] = 0.0
-				self.h[i] /= a[i]
+			self._check(a)
+			with numpy.errstate(divide="ignore", invalid="ignore"):
+				eh = numpy.hypot(self.eh/a.h, self.h/a.h**2*a.eh)
+				self.h /= a.h
+			self.eh = numpy.where(numpy.isfinite(eh), eh, 0.0)
 		return self
+	__itruediv__ = __idiv__
 
 	# ----------------------------------------------------------------------
 	def __radd__(self, a):
@@ -508,11 +573,8 @@ class Histogram1D:
 	# ----------------------------------------------------------------------
 	def cumulative(self):
 		"""Convert to a running sum(0,n,h(i))"""
-		S = 0.0
-		for i,y in enumerate(self.h):
-			S += y
-			self.h[i] = S
-		return S
+		numpy.cumsum(self.h, out=self.h)
+		return float(self.h[-1]) if self.nbins else 0.0
 
 	# ----------------------------------------------------------------------
 	# Convert to a running integral
@@ -520,45 +582,31 @@ class Histogram1D:
 	# ----------------------------------------------------------------------
 	def integrate(self):
 		"""Convert to a running integral int(0,n,h(i)*dx)"""
-		S = 0.0
-		for i,y in enumerate(self.h):
-			S += y*self.dx(i)
-			self.h[i] = S
-		return S
+		self.h = numpy.cumsum(self.h*self.widths())
+		return float(self.h[-1]) if self.nbins else 0.0
 
 	# ----------------------------------------------------------------------
 	# Calculate the derivative of the histogram
 	# ----------------------------------------------------------------------
 	def derivative(self):
-		for i in range(self.nbins-1,1,-1):
-			self.h[i] = (self.h[i]-self.h[i-1]) / self.dx(i)
+		self.h[2:] = numpy.diff(self.h[1:]) / self.widths()[2:]
 		self.h[0] = 0.0
 
 	# -----------------------------------------------------------------------------
 	def mean(self):
 		"""return mean and rms value"""
-		# FIXME variable binning
-		sy = 0.0
-		sxy = 0.0
-		sx2y = 0.0
-
-		x = self.xmid(0)
-		for y in self.h:
-			sy   += y
-			sxy  += x*y
-			sx2y += x*x*y
-			x += self.xstep
-
+		edges = self.edges()
+		x  = 0.5*(edges[:-1]+edges[1:])
+		sy = self.h.sum()
 		if sy == 0.0: return None,None
 
-		mx  = sxy/sy
-		var = sx2y/sy - mx**2
+		mx  = float(numpy.dot(x, self.h)/sy)
+		var = float(numpy.dot(x*x, self.h)/sy) - mx**2
 		if var<0.0: var = 0.0
 		return mx, sqrt(var)
 
 	# -----------------------------------------------------------------------------
 	def rms(self):
-		# FIXME variable binning
 		return self.mean()[1]
 
 	# -----------------------------------------------------------------------------
@@ -568,8 +616,9 @@ class Histogram1D:
 		"""plot histogram using engine and options"""
 		if options is None:
 			options = "using 1:3 w steps not",
-		engine.plot(options, [(self.xlow(i), self.xhigh(i), self.h[i], self.eh[i])
-						for i in range(self.nbins)])
+		edges = self.edges().tolist()
+		engine.plot(options, list(zip(edges, edges[1:],
+					self.h.tolist(), self.eh.tolist())))
 
 	# -----------------------------------------------------------------------------
 	@staticmethod
@@ -578,34 +627,41 @@ class Histogram1D:
 		ALL HISTOGRAMS MUST WITH THE SAME PARAMETERS
 		and for the same number of events
 		"""
-		#FIXME variable binning
-		h = histograms[0]
-		new = Histogram(h.nbins, h._xlow, h._xhigh)
+		new = histograms[0].clone()
+		new.entries = 0
+		new.total   = 0.0
 
-		n = float(len(histograms))
-		sn = sqrt(n-1.0)
+		n  = float(len(histograms))
+		sn = sqrt(n-1.0) if n>1.0 else 1.0
 
-		for i in range(h.nbins):
-			t = t2 = 0.0
-			for h in histograms:
-				t  += h[i]
-				t2 += h[i]**2
-
-			new[i] = t/n
-			var = t2/n - new[i]**2
-			if var<0.0: var = 0.0
-			new.error(i, sqrt(var) / sn)
+		h = numpy.array([x.h for x in histograms])
+		new.h  = h.mean(axis=0)
+		var = numpy.maximum((h**2).mean(axis=0) - new.h**2, 0.0)
+		new.eh = numpy.sqrt(var) / sn
 
 		# Under, Over
-		u = 0.0
-		o = 0.0
-		for h in histograms:
-			u  += h.under
-			o  += h.over
+		new.under = sum(x.under for x in histograms)/n
+		new.over  = sum(x.over  for x in histograms)/n
 
-		new.under = u/n
-		new.over  = o/n
+		return new
 
+	# -----------------------------------------------------------------------------
+	@staticmethod
+	def merge(histograms):
+		"""
+		create a new histogram with the sum of histograms filled
+		independently (e.g. in parallel workers) on the same binning.
+		Contents, entries and totals are added, errors in quadrature
+		"""
+		new = histograms[0].clone()
+		for h in histograms[1:]:
+			new._check(h)
+			new.h  += h.h
+			new.eh  = numpy.hypot(new.eh, h.eh)
+			new.under   += h.under
+			new.over    += h.over
+			new.entries += h.entries
+			new.total   += h.total
 		return new
 
 # aliases
@@ -624,13 +680,14 @@ class Histogram2D:
 		"""Initialize a 2D histogram with xbins from xlow to xhigh,
 		and ybins from ylow to yhigh
 		"""
+		_checkNumpy()
 		#self.xunder = 0.0
 		#self.yunder = 0.0
 		#self.under  = [0.0]*xbins
 		#self.over   = [0.0]*xbins
 		self.total   = 0.0
 		self.entries = 0
-		if isinstance(xbins,str) or isinstance(xbins,file):
+		if isinstance(xbins,str) or hasattr(xbins,"read"):
 			self.load(xbins)
 		else:
 			self.xbins  = xbins
@@ -643,51 +700,66 @@ class Histogram2D:
 			self.yhigh  = yhigh
 			self.ystep  = (yhigh-ylow)/float(ybins)
 
-			# List of lists
-			self.h = []
-			self.eh = []
-			for i in range(xbins):
-				self.h.append([0.0]*ybins)
-				self.eh.append([0.0]*ybins)
+			# h[i][j] x columns, y rows
+			self.h  = numpy.zeros((xbins, ybins))
+			self.eh = numpy.zeros((xbins, ybins))
 
 	# ----------------------------------------------------------------------
 	def fill(self, x, y, w=1.0):
-		"""Fill/add to position x,y weight w"""
-		self.entries += 1
-		self.total += w
-		if x>=self.xlow and x<self.xhigh and \
-		   y>=self.ylow and y<self.yhigh:
-			i = int((x - self.xlow) // self.xstep)
-			j = int((y - self.ylow) // self.ystep)
-			self.h[i][j] += w
-#		if x<self.xlow:
-#			self.under += w
-#		elif x>self.xhigh:
-#			self.over  += w
-#		else:
-
-#	# ----------------------------------------------------------------------
-#	def copy(self, hist):
-#		self.xbins  = hist.xbins
-#		self.xlow   = hist.xlow
-#		self.xhigh  = hist.xhigh
-#		self.h      = hist.h[:]
-#		self.eh     = hist.eh[:]
-#		self.under  = hist.under
-#		self.over   = hist.over
-#		self.xstep  = hist.xstep
-#		self.entries= hist.entries
-#		self.total  = hist.total
-
-#	# ----------------------------------------------------------------------
-#	def clone(self):
-#		hist = Histogram(self.xbins, self.xlow, self.xhigh)
-#		hist.copy(self)
-#		return hist
-
-	# ----------------------------------------------------------------------
-#	def __getitem__(self, i): return self.h[i]
-#	def __setitem__(self, i, y): self.h[i] = y
+		"""Fill/add to position x,y weight w
+		x,y can be single values or arrays of values, and w a single
+		weight or an array of weights with the same length
+		"""
+		if numpy.ndim(x)==0:
+			self.entries += 1
+			self.total += w
+			if x>=self.xlow and x<self.xhigh and \
+			   y>=self.ylow and y<self.yhigh:
+				i = min(int((x - self.xlow) // self.xstep), self.xbins-1)
+				j = min(int((y - self.ylow) // self.ystep), self.ybins-1)
+				self.h[i,j] += w
+			return
+
+		x = numpy.asarray(x, dtype=numpy.float64).ravel()
+		y = numpy.asarray(y, dtype=numpy.float64).ravel()
+		w = _weights(x, w)
+		self.entries += len(x)
+		self.total   += float(w.sum())
+		sel = (x>=self.xlow) & (x<self.xhigh) & (y>=self.ylow) & (y<self.yhigh)
+		i = numpy.floor((x[sel] - self.xlow) / self.xstep).astype(numpy.intp)
+		j = numpy.floor((y[sel] - self.ylow) / self.ystep).astype(numpy.intp)
+		numpy.minimum(i, self.xbins-1, out=i)
+		numpy.minimum(j, self.ybins-1, out=j)
+		self.h += numpy.bincount(i*self.ybins+j, w[sel],
+				minlength=self.xbins*self.ybins).reshape(self.h.shape)
+
+	# ----------------------------------------------------------------------
+	def copy(self, hist):
+		"""Copy histogram from hist"""
+		self.xbins   = hist.xbins
+		self.xlow    = hist.xlow
+		self.xhigh   = hist.xhigh
+		self.xstep   = hist.xstep
+		self.ybins   = hist.ybins
+		self.ylow    = hist.ylow
+		self.yhigh   = hist.yhigh
+		self.ystep   = hist.ystep
+		self.h       = hist.h.copy()
+		self.eh      = hist.eh.copy()
+		self.entries = hist.entries
+		self.total   = hist.total
+
+	# ----------------------------------------------------------------------
+	def clone(self):
+		"""Return a clone of the current histogram"""
+		hist = Histogram2D(self.xbins, self.xlow, self.xhigh,
+				   self.ybins, self.ylow, self.yhigh)
+		hist.copy(self)
+		return hist
+
+	# ----------------------------------------------------------------------
+	def __getitem__(self, i): return self.h[i]
+	def __setitem__(self, i, y): self.h[i] = y
 
 	# ----------------------------------------------------------------------
 	def x(self, i=None):
@@ -719,142 +791,125 @@ class Histogram2D:
 	def error(self, i, j, e=None):
 		"""return error of [i,j]] or set if e is not None"""
 		if e is None:
-			return self.eh[i][j]
+			return self.eh[i,j]
 		else:
-			self.eh[i][j] = e
+			self.eh[i,j] = e
 
 	# ----------------------------------------------------------------------
 	def norm(self, f=None):
 		"""normalize histogram with a factor f"""
 		if f is None: f = 1.0 / (self.xstep * self.ystep)
-		for i in range(self.xbins):
-			for j in range(self.ybins):
-				self.h[i][j]  *= f
-				self.eh[i][j] *= f
+		self.h  *= f
+		self.eh *= f
 	normalize = norm
 
 	# ----------------------------------------------------------------------
 	def xslice(self, ifrom, ito=None):
 		"""return a x-slice (sum) (Y-histogram) from [ifrom : ito)"""
 		hsum = Histogram1D(self.ybins, self.ylow, self.yhigh)
-		h1   = Histogram1D(self.ybins, self.ylow, self.yhigh)
 		if ito is None: ito = ifrom + 1
-		for i in range(ifrom, ito):
-			for j,(v,e) in enumerate(zip(self.h[i], self.eh[i])):
-				h1[j] = v
-				h1.error(j, e)
-			hsum += h1	# WARNING errors will be WRONG!!!!!!!
+		hsum.h  = self.h[ifrom:ito].sum(axis=0)
+		hsum.eh = numpy.sqrt((self.eh[ifrom:ito]**2).sum(axis=0))
 		return hsum
 
 	# ----------------------------------------------------------------------
 	def rebiny(self, n):
 		"""rebin y every n bins"""
-		for i,yh in enumerate(self.h):
-			row = []
-			s   = 0.0
-			c   = 0.0
-			for val in yh:
-				s += val
-				c += 1.0
-				if c == n:
-					row.append(s/c)
-					s = 0.0
-					c = 0.0
-			if c > 0:
-				# FIXME should I change the limit of yhigh?
-				row.append(s/c)
-
-			self.h[i]  = row
-		self.ybins = len(row)
-
-#	# ----------------------------------------------------------------------
-#	def isSame(self, hist):
-#		"""Return true if histograms have the same limits"""
-#		if self.xbins != hist.xbins: return False
-#		if self.xlow  != hist.xlow:  return False
-#		if self.xhigh != hist.xhigh: return False
-#		return True
-
-#	# ----------------------------------------------------------------------
-#	def __iadd__(self, a):
-#		if isinstance(a,float):
-#			for i in range(self.xbins):
-#				self.h[i]  += a
-#
-#		elif isinstance(a,Histogram):
-#			if not a.isSame(self): raise
-#			for i in range(self.xbins):
-#				self.eh[i] = sqrt(self.eh[i]**2 + a.eh[i]**2)
-#				self.h[i] += a[i]
-#		return self
-
-#	# ----------------------------------------------------------------------
-#	def __isub__(self, a):
-#		if isinstance(a,float):
-#			for i in range(self.xbins):
-#				self.h[i]  -= a
-#
-#		elif isinstance(a,Histogram):
-#			if not a.isSame(self): raise
-#			for i in range(self.xbins):
-#				self.eh[i] = sqrt(self.eh[i]**2 + a.eh[i]**2)
-#				self.h[i] -= a[i]
-#		return self
-
-#	# ----------------------------------------------------------------------
-#	def __imul__(self, a):
-#		if isinstance(a,float):
-#			for i in range(self.xbins):
-#				self.h[i]  *= a
-#				self.eh[i] *= a
-#
-#		elif isinstance(a,Histogram):
-#			if not a.isSame(self): raise
-#			for i in range(self.xbins):
-#				self.eh[i] = sqrt((a[i]*self.eh[i])**2 + (self[i]*a.eh[i])**2)
-#				self.h[i] *= a[i]
-#		return self
-
-#	# ----------------------------------------------------------------------
-#	def __idiv__(self, a):
-#		if isinstance(a,float):
-#			for i in range(self.xbins):
-#				self.h[i]  /= a
-#				self.eh[i] /= a
-#
-#		elif isinstance(a,Histogram):
-#			if not a.isSame(self): raise
-#			for i in range(self.xbins):
-#				try:
-#					self.eh[i] = sqrt((self.eh[i]/a[i])**2 + (self[i]/a[i]**2*a.eh[i])**2)
-#				except:
-#					self.eh[i] = 0.0
-#				self.h[i] /= a[i]
-#		return self
-#
-#	# ----------------------------------------------------------------------
-#	def __radd__(self, a):
-#		hist = a.clone()
-#		hist += self
-#		return hist
-#
-#	# ----------------------------------------------------------------------
-#	def __rsub__(self, a):
-#		hist = a.clone()
-#		hist -= self
-#		return hist
-#
-#	# ----------------------------------------------------------------------
-#	def __rmul__(self, a):
-#		hist = a.clone()
-#		hist *= self
-#		return hist
-#
-#	# ----------------------------------------------------------------------
-#	def __rdiv__(self, a):
-#		hist = a.clone()
-#		hist /= self
-#		return hist
+		# FIXME should I change the limit of yhigh?
+		starts = numpy.arange(0, self.ybins, n)
+		count  = numpy.diff(numpy.append(starts, self.ybins)).astype(numpy.float64)
+		self.h  = numpy.add.reduceat(self.h, starts, axis=1) / count
+		self.eh = numpy.sqrt(numpy.add.reduceat(self.eh**2, starts, axis=1)) / count
+		self.ybins = len(starts)
+
+	# ----------------------------------------------------------------------
+	def isSame(self, hist):
+		"""Return true if histograms have the same limits"""
+		if self.xbins != hist.xbins: return False
+		if self.xlow  != hist.xlow:  return False
+		if self.xhigh != hist.xhigh: return False
+		if self.ybins != hist.ybins: return False
+		if self.ylow  != hist.ylow:  return False
+		if self.yhigh != hist.yhigh: return False
+		return True
+
+	# ----------------------------------------------------------------------
+	def _check(self, a):
+		if not a.isSame(self):
+			raise ValueError("Histograms have different binning")
+
+	# ----------------------------------------------------------------------
+	def __iadd__(self, a):
+		if isinstance(a,(int,float)):
+			self.h += a
+
+		elif isinstance(a,Histogram2D):
+			self._check(a)
+			self.eh = numpy.hypot(self.eh, a.eh)
+			self.h += a.h
+		return self
+
+	# ----------------------------------------------------------------------
+	def __isub__(self, a):
+		if isinstance(a,(int,float)):
+			self.h -= a
+
+		elif isinstance(a,Histogram2D):
+			self._check(a)
+			self.eh = numpy.hypot(self.eh, a.eh)
+			self.h -= a.h
+		return self
+
+	# ----------------------------------------------------------------------
+	def __imul__(self, a):
+		if isinstance(a,(int,float)):
+			self.h  *= a
+			self.eh *= a
+
+		elif isinstance(a,Histogram2D):
+			self._check(a)
+			self.eh = numpy.hypot(a.h*self.eh, self.h*a.eh)
+			self.h *= a.h
+		return self
+
+	# ----------------------------------------------------------------------
+	def __idiv__(self, a):
+		if isinstance(a,(int,float)):
+			self.h  /= a
+			self.eh /= a
+
+		elif isinstance(a,Histogram2D):
+			self._check(a)
+			with numpy.errstate(divide="ignore", invalid="ignore"):
+				eh = numpy.hypot(self.eh/a.h, self.h/a.h**2*a.eh)
+				self.h /= a.h
+			self.eh = numpy.where(numpy.isfinite(eh), eh, 0.0)
+		return self
+	__itruediv__ = __idiv__
+
+	# ----------------------------------------------------------------------
+	def __radd__(self, a):
+		hist = a.clone()
+		hist += self
+		return hist
+
+	# ----------------------------------------------------------------------
+	def __rsub__(self, a):
+		hist = a.clone()
+		hist -= self
+		return hist
+
+	# ----------------------------------------------------------------------
+	def __rmul__(self, a):
+		hist = a.clone()
+		hist *= self
+		return hist
+
+	# ----------------------------------------------------------------------
+	def __rdiv__(self, a):
+		hist = a.clone()
+		hist /= self
+		return hist
 
 	# ----------------------------------------------------------------------
 	def save(self, fout=sys.stdout):
@@ -879,7 +934,7 @@ class Histogram2D:
 		x = self.xlow
 		for i in range(self.xbins):
 			y = self.ylow
-			for v,e in zip(self.h[i],self.eh[i]):
+			for v,e in zip(self.h[i].tolist(),self.eh[i].tolist()):
 				fout.write("%.10g %.10g %.10g %.10g\n"%(x,y,v,e))
 				y += self.ystep
 				if abs(y)<1e-15: y = 0.0
@@ -900,8 +955,8 @@ class Histogram2D:
 		else:
 			close = False
 
-		self.h  = []
-		self.eh = []
+		h  = []
+		eh = []
 		row = []
 		erow = []
 
@@ -909,8 +964,8 @@ class Histogram2D:
 			line = line.strip()
 			if not line:
 				if row:
-					self.h.append(row)
-					self.eh.append(erow)
+					h.append(row)
+					eh.append(erow)
 				row = []
 				erow = []
 			elif line[0]=="#":
@@ -937,9 +992,11 @@ class Histogram2D:
 					erow.append(float(word[-1]))
 
 		if row:
-			self.h.append(row)
-			self.eh.append(erow)
+			h.append(row)
+			eh.append(erow)
 
+		self.h  = numpy.array(h,  dtype=numpy.float64)
+		self.eh = numpy.array(eh, dtype=numpy.float64)
 		self.xstep  = (self.xhigh-self.xlow)/float(self.xbins)
 		self.ystep  = (self.yhigh-self.ylow)/float(self.ybins)
 
@@ -955,31 +1012,34 @@ class Histogram2D:
 		ALL HISTOGRAMS MUST WITH THE SAME PARAMETERS
 		and for the same number of events
 		"""
-		h = histograms[0]
-		new = Histogram2D(h.xbins, h.xlow, h.xhigh, h.ybins, h.ylow, h.yhigh)
-
-		n = float(len(histograms))
-		sn = sqrt(n-1.0)
-
-		for i in range(h.xbins):
-			for j in range(h.ybins):
-				t = t2 = 0.0
-				for h in histograms:
-					t  += h[i][j]
-					t2 += h[i][j]**2
-
-				new[i][j] = t/n
-				new.error(i, j, sqrt(t2/n - new[i][j]**2) / sn)
-
-#		# Under, Over
-#		u = 0.0
-#		o = 0.0
-#		for h in histograms:
-#			u  += h.under
-#			o  += h.over
-#
-#		new.under = u/n
-#		new.over  = o/n
+		new = histograms[0].clone()
+		new.entries = 0
+		new.total   = 0.0
+
+		n  = float(len(histograms))
+		sn = sqrt(n-1.0) if n>1.0 else 1.0
+
+		h = numpy.array([x.h for x in histograms])
+		new.h  = h.mean(axis=0)
+		var = numpy.maximum((h**2).mean(axis=0) - new.h**2, 0.0)
+		new.eh = numpy.sqrt(var) / sn
+		return new
+
+	# -----------------------------------------------------------------------------
+	@staticmethod
+	def merge(histograms):
+		"""
+		create a new histogram with the sum of histograms filled
+		independently (e.g. in parallel workers) on the same binning.
+		Contents, entries and totals are added, errors in quadrature
+		"""
+		new = histograms[0].clone()
+		for h in histograms[1:]:
+			new._check(h)
+			new.h  += h.h
+			new.eh  = numpy.hypot(new.eh, h.eh)
+			new.entries += h.entries
+			new.total   += h.total
 		return new
 
 # Aliases
@@ -42,14 +42,43 @@ import sys
 import math
 import bmath
 from math import *
+from functools import reduce
+from itertools import islice
 from collections import namedtuple
 
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+CHUNK = 1<<20		# rows read at once from text files
+
 # Populate math functions on the local dict
 _globalDict = {}
 for name in dir(math):
 	if name[0]=="_": continue
 	_globalDict[name] = getattr(math, name)
 
+# Same functions working on numpy arrays for the columnar ntuple
+_numpyDict = {}
+if numpy is not None:
+	_numpyDict.update(_globalDict)
+	for name in _globalDict:
+		if isinstance(getattr(numpy, name, None), numpy.ufunc):
+			_numpyDict[name] = getattr(numpy, name)
+	for name, npname in (("acos","arccos"), ("asin","arcsin"), ("atan","arctan"),
+			("atan2","arctan2"), ("acosh","arccosh"), ("asinh","arcsinh"),
+			("atanh","arctanh"), ("pow","power"), ("fabs","fabs")):
+		_numpyDict[name] = getattr(numpy, npname)
+	_numpyDict["abs"] = numpy.abs
+	# element-wise min/max of any number of arguments, the ufuncs
+	# would take the third one as the output array
+	_numpyDict["min"] = lambda *args: reduce(numpy.minimum, args)
+	_numpyDict["max"] = lambda *args: reduce(numpy.maximum, args)
+
+# numpy type of the ntuple variable types
+_DTYPE = {"f": "f8", "i": "i8", "s": "U64"}
+
 #===============================================================================
 # NTuple
 #===============================================================================
@@ -257,6 +286,221 @@ class NTuple:
 			output.append(eval(exprc, _globalDict, row._asdict()))
 		return output
 
+#===============================================================================
+# Columnar NTuple
+# Every variable is stored as a typed numpy array and expressions are
+# evaluated once over the whole columns instead of row by row
+#===============================================================================
+class ColumnNTuple(NTuple):
+	"""NTuple storing each variable as a numpy array"""
+
+	# ----------------------------------------------------------------------
+	def __init__(self, variables):
+		"""
+		Initialize the columnar Ntuple with the variables, same as NTuple
+
+		Example:
+			t = ColumnNTuple("n/i x y z xp yp")
+			t.load("psblack001_dump")
+			h = t.project(H1(100,-2.0,2.0), "x*1000", "n==1")
+
+			# Out of core, for files larger than memory
+			h = H1(100,-2.0,2.0)
+			for chunk in t.stream("psblack001_dump"):
+				chunk.project(h, "x")
+		"""
+		if numpy is None:
+			raise ImportError("Numpy is not available. See http://numpy.scipy.org/ to download and install")
+		NTuple.__init__(self, variables)
+		self.dtype = numpy.dtype([(n,_DTYPE.get(t,"f8"))
+				for n,t in zip(self.names, self.types)])
+		del self.rows
+		self.clear()
+
+	# ----------------------------------------------------------------------
+	def __getitem__(self, i):
+		"""return ith row of data"""
+		return self.Record(*[self.data[n][i].item() for n in self.names])
+
+	# ----------------------------------------------------------------------
+	def events(self):
+		"""return number of events in Ntuple"""
+		return len(self.data[self.names[0]])
+	__len__ = events
+
+	# ----------------------------------------------------------------------
+	def column(self, name):
+		"""return the numpy array of a column by name or index"""
+		if isinstance(name,int): name = self.names[name]
+		return self.data[name]
+
+	# ----------------------------------------------------------------------
+	def append(self, values):
+		"""append a new record"""
+		self.extend(numpy.array([tuple(values)], self.dtype))
+
+	# ----------------------------------------------------------------------
+	def extend(self, table):
+		"""append a structured array or a dictionary of columns"""
+		for n in self.names:
+			self.data[n] = numpy.concatenate((self.data[n], table[n]))
+
+	# ----------------------------------------------------------------------
+	def clear(self):
+		"""Delete data"""
+		self.data = dict([(n, numpy.zeros(0, self.dtype[n]))
+				for n in self.names])
+
+	# ----------------------------------------------------------------------
+	# Read a text file in chunks of rows as structured arrays
+	# ----------------------------------------------------------------------
+	def _chunks(self, filename, delimiter=None, usecols=None, skiprows=0, chunk=CHUNK):
+		if isinstance(filename,str):
+			f = open(filename,"r")
+		else:
+			f = filename
+		if isinstance(usecols,int): usecols = (usecols,)
+		for line in islice(f, skiprows): pass
+		while True:
+			lines = list(islice(f, chunk))
+			if not lines: break
+			table = numpy.loadtxt(lines, dtype=self.dtype,
+					delimiter=delimiter, usecols=usecols,
+					comments=("#","*"), ndmin=1)
+			if len(table): yield table
+		if f is not filename: f.close()
+
+	# ----------------------------------------------------------------------
+	# Load an ascii file
+	# ----------------------------------------------------------------------
+	def load(self, filename, delimiter=None, usecols=None, skiprows=0):
+		"""Load text file in tuple"""
+		n0 = self.events()
+		tables = list(self._chunks(filename, delimiter, usecols, skiprows))
+		if tables:
+			self.extend(numpy.concatenate(tables))
+		return self.events()-n0
+	readFile = load
+
+	# ----------------------------------------------------------------------
+	# Load a binary file of fixed size records, one field per variable
+	# The file is memory mapped and never read completely in memory
+	# ----------------------------------------------------------------------
+	def loadBinary(self, filename, dtype=None, offset=0):
+		"""Map a binary file of records with the variables as fields.
+		dtype is the numpy type of the fields or a structured type
+		"""
+		if dtype is None:
+			dtype = self.dtype
+		elif not isinstance(dtype, numpy.dtype) or dtype.names is None:
+			dtype = numpy.dtype([(n,dtype) for n in self.names])
+		table = numpy.memmap(filename, dtype=dtype, mode="r", offset=offset)
+		for n in self.names:
+			self.data[n] = table[n]
+		return self.events()
+
+	# ----------------------------------------------------------------------
+	# Out of core reading
+	# ----------------------------------------------------------------------
+	def stream(self, filename, delimiter=None, usecols=None, skiprows=0, chunk=CHUNK):
+		"""Yield ColumnNTuple's of up to chunk rows read from filename"""
+		for table in self._chunks(filename, delimiter, usecols, skiprows, chunk):
+			t = ColumnNTuple(list(zip(self.names, self.types)))
+			for n in self.names:
+				t.data[n] = table[n]
+			yield t
+
+	# ----------------------------------------------------------------------
+	def min(self, column):
+		"""return minimum value of column"""
+		c = self.column(column)
+		if len(c)==0: return 1e999
+		return c.min().item()
+
+	# ----------------------------------------------------------------------
+	def max(self, column):
+		"""return maximum value of column"""
+		c = self.column(column)
+		if len(c)==0: return -1e999
+		return c.max().item()
+
+	# ----------------------------------------------------------------------
+	def dump(self):
+		"""dump NTuple on stdout"""
+		print("#","\t".join(["%d:%s/%s"%(i,n,t)
+			for i,(n,t) in enumerate(zip(self.names,self.types))]))
+		for i in range(self.events()):
+			print(i,"\t".join(map(str,self[i])))
+
+	# ----------------------------------------------------------------------
+	@staticmethod
+	def _compile(expr, weight=None):
+		if ":" in expr:
+			# Multi dimensional
+			expry, exprx = expr.split(":")
+			exprx = compile(exprx,"<exprx>","eval")
+			expry = compile(expry,"<expry>","eval")
+		else:
+			exprx = None
+			expry = compile(expr,"<expry>","eval")
+
+		if isinstance(weight,str):
+			weightc = compile(weight,"<weight>","eval")
+		else:
+			weightc = None
+		return exprx, expry, weightc
+
+	# ----------------------------------------------------------------------
+	# Evaluate a compiled expression over all columns in [from_:to_]
+	# ----------------------------------------------------------------------
+	def _eval(self, code, from_=0, to_=None):
+		columns = dict([(n,c[from_:to_]) for n,c in self.data.items()])
+		n = len(columns[self.names[0]])
+		value = eval(code, _numpyDict, columns)
+		return numpy.broadcast_to(numpy.asarray(value, numpy.float64), (n,))
+
+	# ----------------------------------------------------------------------
+	# Evaluate x, y and weight with only the positive weights
+	# ----------------------------------------------------------------------
+	def _evalWeighted(self, expr, weight, from_, to_):
+		exprx, expry, weightc = ColumnNTuple._compile(expr, weight)
+		if weightc is not None:
+			w = self._eval(weightc, from_, to_)
+		else:
+			w = numpy.full(len(self._eval(expry, from_, to_)), float(weight))
+		sel = w > 0.0
+		y = self._eval(expry, from_, to_)[sel]
+		if exprx is None:
+			x = None
+		else:
+			x = self._eval(exprx, from_, to_)[sel]
+		return x, y, w[sel]
+
+	# ----------------------------------------------------------------------
+	# Project to a histogram the expression, applying a weight
+	# ----------------------------------------------------------------------
+	def project(self, hist, expr, weight=1.0, from_=0, to_=-1):
+		"""fill 1D or2D histogram hist with the expression expr"""
+		x, y, w = self._evalWeighted(expr, weight, from_, to_)
+		if x is None:
+			hist.fill(y, w)
+		else:
+			hist.fill(x, y, w)
+		return hist
+
+	# ----------------------------------------------------------------------
+	def scatter(self, expr, weight=1.0, from_=0, to_=-1):
+		"""return a list of two columns with the scatter data for plotting"""
+		x, y, w = self._evalWeighted(expr, weight, from_, to_)
+		if x is None:
+			return list(zip(y.tolist(), w.tolist()))
+		return list(zip(x.tolist(), y.tolist(), w.tolist()))
+
+	# ----------------------------------------------------------------------
+	def evaluate(self, expr):
+		"""return a numpy array with the evaluation of the expression expr"""
+		return self._eval(compile(expr,"<expr>","eval")).copy()
+
 #-------------------------------------------------------------------------------
 if __name__ == "__main__":
 	from Gnuplot import Gnuplot
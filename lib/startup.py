@@ -0,0 +1,155 @@
+# 
+#
+# Copyright and User License
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Copyright 2006-2019 CERN and INFN
+# 
+#
+# Please consult the LICENSE file for the license 
+#
+# DISCLAIMER
+# ~~~~~~~~~~
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT
+# NOT LIMITED TO, IMPLIED WARRANTIES OF MERCHANTABILITY, OF
+# SATISFACTORY QUALITY, AND FITNESS FOR A PARTICULAR PURPOSE
+# OR USE ARE DISCLAIMED. THE COPYRIGHT HOLDERS AND THE
+# AUTHORS MAKE NO REPRESENTATION THAT THE SOFTWARE AND
+# MODIFICATIONS THEREOF, WILL NOT INFRINGE ANY PATENT,
+# COPYRIGHT, TRADE SECRET OR OTHER PROPRIETARY RIGHT.
+#
+# LIMITATION OF LIABILITY
+# ~~~~~~~~~~~~~~~~~~~~~~~
+# THE COPYRIGHT HOLDERS AND THE AUTHORS SHALL HAVE NO
+# LIABILITY FOR DIRECT, INDIRECT, SPECIAL, INCIDENTAL,
+# CONSEQUENTIAL, EXEMPLARY, OR PUNITIVE DAMAGES OF ANY
+# CHARACTER INCLUDING, WITHOUT LIMITATION, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES, LOSS OF USE, DATA OR PROFITS,
+# OR BUSINESS INTERRUPTION, HOWEVER CAUSED AND ON ANY THEORY
+# OF CONTRACT, WARRANTY, TORT (INCLUDING NEGLIGENCE), PRODUCT
+# LIABILITY OR OTHERWISE, ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGES.
+#
+# Date:	18-Oct-2026
+
+__author__ = "Vasilis Vlachoudis"
+__email__  = "Paola.Sala@mi.infn.it"
+
+import sys
+import time
+import builtins
+import importlib.util
+
+#-------------------------------------------------------------------------------
+# Startup profiler: time of every module imported and initialization step
+#-------------------------------------------------------------------------------
+_enabled  = False
+_import   = builtins.__import__
+_start    = time.time()
+_records  = []		# [kind, name, depth, total, self]
+_stack    = []		# records of the imports in progress
+
+#-------------------------------------------------------------------------------
+def _timedImport(name, globals=None, locals=None, fromlist=(), level=0):
+	# Only the first import of a module is of interest
+	if level or name in sys.modules:
+		return _import(name, globals, locals, fromlist, level)
+
+	record = ["import", name, len(_stack), 0.0, 0.0]
+	_records.append(record)
+	_stack.append(record)
+	t0 = time.time()
+	try:
+		return _import(name, globals, locals, fromlist, level)
+	finally:
+		_stack.pop()
+		record[3] = time.time() - t0
+		record[4] += record[3]
+		if _stack: _stack[-1][4] -= record[3]
+
+#-------------------------------------------------------------------------------
+# Start recording the imports
+#-------------------------------------------------------------------------------
+def enable():
+	global _enabled
+	if _enabled: return
+	_enabled = True
+	builtins.__import__ = _timedImport
+
+#-------------------------------------------------------------------------------
+def disable():
+	global _enabled
+	_enabled = False
+	builtins.__import__ = _import
+
+#-------------------------------------------------------------------------------
+def enabled():
+	return _enabled
+
+#-------------------------------------------------------------------------------
+# Time an initialization step
+#	with startup.step("Materials"):
+#		...
+#-------------------------------------------------------------------------------
+class step:
+	def __init__(self, name):
+		self.name = name
+
+	def __enter__(self):
+		if not _enabled: return self
+		self.record = ["init", self.name, len(_stack), 0.0, 0.0]
+		_records.append(self.record)
+		_stack.append(self.record)
+		self.t0 = time.time()
+		return self
+
+	def __exit__(self, *args):
+		if not _enabled: return False
+		_stack.pop()
+		record = self.record
+		record[3] = time.time() - self.t0
+		record[4] += record[3]
+		if _stack: _stack[-1][4] -= record[3]
+		return False
+
+#-------------------------------------------------------------------------------
+# Print the breakdown of the recorded times
+# @param limit	do not show entries with a total time less than limit [s]
+#-------------------------------------------------------------------------------
+def report(out=None, limit=0.001):
+	if out is None: out = sys.stderr
+	out.write("\nStartup profile  (total/self in ms)\n")
+	out.write("%-8s %9s %9s  %s\n"%("Kind","Total","Self","Name"))
+	for kind, name, depth, total, self_ in _records:
+		if total < limit: continue
+		out.write("%-8s %9.1f %9.1f  %s%s\n" \
+			% (kind, total*1000.0, self_*1000.0, "  "*depth, name))
+
+	# Summary sorted by self time
+	out.write("\nSlowest modules and steps (self time in ms)\n")
+	for kind, name, depth, total, self_ in \
+			sorted(_records, key=lambda x:x[4], reverse=True)[:20]:
+		out.write("%-8s %9.1f  %s\n"%(kind, self_*1000.0, name))
+	out.write("\nImports: %.1f ms, steps: %.1f ms, elapsed: %.1f ms\n\n" \
+		% (sum([x[4] for x in _records if x[0]=="import"])*1000.0,
+		   sum([x[4] for x in _records if x[0]=="init"])*1000.0,
+		   (time.time()-_start)*1000.0))
+
+#-------------------------------------------------------------------------------
+# Return the module name, loaded on the first access of an attribute
+#-------------------------------------------------------------------------------
+def lazyImport(name):
+	try:
+		return sys.modules[name]
+	except KeyError:
+		pass
+	spec = importlib.util.find_spec(name)
+	if spec is None:
+		raise ImportError("No module named %s"%(name), name=name)
+	loader = importlib.util.LazyLoader(spec.loader)
+	spec.loader = loader
+	module = importlib.util.module_from_spec(spec)
+	sys.modules[name] = module
+	loader.exec_module(module)
+	return module
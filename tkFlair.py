@@ -87,6 +87,9 @@ builtins.N_ = lambda message: message
 
 import Input
 import Project
+import Scheduler
+import RunMonitor
+import RunTemplate
 import Gnuplot
 import RichText
 
@@ -529,6 +532,9 @@ def readIni():
 	Project.Command.loadConfig(config)
 	Project.UsrInfo.loadConfig(config)
 	Project.RunInfo.loadConfig(config)
+	Scheduler.loadConfig(config)
+	RunMonitor.loadConfig(config)
+	RunTemplate.loadConfig(config)
 
 	# Printer
 	tkDialogs.Printer.cmd   = getStr(_FLAIR_SECTION, "printercmd", "lpr")
@@ -0,0 +1,132 @@
+# 
+#
+# Copyright and User License
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Copyright 2006-2019 CERN and INFN
+# 
+#
+# Please consult the LICENSE file for the license 
+#
+# DISCLAIMER
+# ~~~~~~~~~~
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT
+# NOT LIMITED TO, IMPLIED WARRANTIES OF MERCHANTABILITY, OF
+# SATISFACTORY QUALITY, AND FITNESS FOR A PARTICULAR PURPOSE
+# OR USE ARE DISCLAIMED. THE COPYRIGHT HOLDERS AND THE
+# AUTHORS MAKE NO REPRESENTATION THAT THE SOFTWARE AND
+# MODIFICATIONS THEREOF, WILL NOT INFRINGE ANY PATENT,
+# COPYRIGHT, TRADE SECRET OR OTHER PROPRIETARY RIGHT.
+#
+# LIMITATION OF LIABILITY
+# ~~~~~~~~~~~~~~~~~~~~~~~
+# THE COPYRIGHT HOLDERS AND THE AUTHORS SHALL HAVE NO
+# LIABILITY FOR DIRECT, INDIRECT, SPECIAL, INCIDENTAL,
+# CONSEQUENTIAL, EXEMPLARY, OR PUNITIVE DAMAGES OF ANY
+# CHARACTER INCLUDING, WITHOUT LIMITATION, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES, LOSS OF USE, DATA OR PROFITS,
+# OR BUSINESS INTERRUPTION, HOWEVER CAUSED AND ON ANY THEORY
+# OF CONTRACT, WARRANTY, TORT (INCLUDING NEGLIGENCE), PRODUCT
+# LIABILITY OR OTHERWISE, ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGES.
+#
+# Date:	18-Oct-2026
+#
+# Benchmark the CSG normalization of the region expressions
+# comparing the DAG normalizer with the rule based one
+#
+# usage: python utils/csgbench.py [-n repeat] [input files or directories]
+#        by default all inputs under examples/ are used
+
+import os
+import sys
+import time
+import getopt
+
+_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [_DIR, os.path.join(_DIR, "lib")]
+
+import csg
+import Input
+
+#-------------------------------------------------------------------------------
+def findInputs(paths):
+	files = []
+	for path in paths:
+		if os.path.isdir(path):
+			for dirpath, dirnames, filenames in os.walk(path):
+				dirnames.sort()
+				for fn in sorted(filenames):
+					if fn.endswith(".inp"):
+						files.append(os.path.join(dirpath, fn))
+		else:
+			files.append(path)
+	return files
+
+#-------------------------------------------------------------------------------
+def zoneSet(expr):
+	zones = set()
+	for zone in csg.split(expr):
+		plus  = tuple(sorted([zone[i+1] for i in range(0,len(zone)-1,2) if zone[i]=="+"]))
+		minus = tuple(sorted([zone[i+1] for i in range(0,len(zone)-1,2) if zone[i]=="-"]))
+		if plus or minus: zones.add((plus, minus))
+	return zones
+
+#-------------------------------------------------------------------------------
+def normRules(rpn):
+	rpn = rpn[:]
+	csg.rpnormRules(rpn)
+	return csg.rpn2exp(rpn)
+
+#-------------------------------------------------------------------------------
+def timeit(func, rpn, repeat):
+	start = time.time()
+	try:
+		for i in range(repeat):
+			result = func(rpn)
+	except csg.CSGException:
+		result = None
+	return result, time.time()-start
+
+#-------------------------------------------------------------------------------
+def benchmark(files, repeat):
+	total = [0, 0.0, 0.0]
+	worst = (0.0, None, None)
+	print("%-40s %7s %10s %10s %6s"%("Input","Regions","Rules [s]","DAG [s]","Diff"))
+	for fn in files:
+		inp = Input.Input(fn)
+		nregions = 0
+		trules = tdag = 0.0
+		ndiff = 0
+		for card in inp["REGION"]:
+			if card.sdum() == "&": continue
+			rpn = csg.tokenize(card.extra())
+			try:
+				csg.exp2rpn(rpn)
+			except csg.CSGException:
+				continue
+			nregions += 1
+			old, t1 = timeit(normRules, rpn, repeat)
+			new, t2 = timeit(csg.normalize, rpn, repeat)
+			trules += t1
+			tdag   += t2
+			if old is not None and zoneSet(old) != zoneSet(new):
+				ndiff += 1
+			if t1 > worst[0]: worst = (t1, fn, card.sdum())
+		print("%-40s %7d %10.4f %10.4f %6d"%(fn[-40:], nregions, trules, tdag, ndiff))
+		total[0] += nregions
+		total[1] += trules
+		total[2] += tdag
+	print("%-40s %7d %10.4f %10.4f"%("Total", total[0], total[1], total[2]))
+	if worst[1] is not None:
+		print("Slowest region with rules: %s in %s %.4fs"%(worst[2], worst[1], worst[0]))
+
+#-------------------------------------------------------------------------------
+if __name__ == "__main__":
+	optlist, args = getopt.getopt(sys.argv[1:], "n:")
+	repeat = 10
+	for opt, val in optlist:
+		if opt == "-n": repeat = int(val)
+	if not args: args = [os.path.join(_DIR, "examples")]
+	benchmark(findInputs(args), repeat)
@@ -0,0 +1,134 @@
+# 
+#
+# Copyright and User License
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Copyright 2006-2019 CERN and INFN
+# 
+#
+# Please consult the LICENSE file for the license 
+#
+# DISCLAIMER
+# ~~~~~~~~~~
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT
+# NOT LIMITED TO, IMPLIED WARRANTIES OF MERCHANTABILITY, OF
+# SATISFACTORY QUALITY, AND FITNESS FOR A PARTICULAR PURPOSE
+# OR USE ARE DISCLAIMED. THE COPYRIGHT HOLDERS AND THE
+# AUTHORS MAKE NO REPRESENTATION THAT THE SOFTWARE AND
+# MODIFICATIONS THEREOF, WILL NOT INFRINGE ANY PATENT,
+# COPYRIGHT, TRADE SECRET OR OTHER PROPRIETARY RIGHT.
+#
+# LIMITATION OF LIABILITY
+# ~~~~~~~~~~~~~~~~~~~~~~~
+# THE COPYRIGHT HOLDERS AND THE AUTHORS SHALL HAVE NO
+# LIABILITY FOR DIRECT, INDIRECT, SPECIAL, INCIDENTAL,
+# CONSEQUENTIAL, EXEMPLARY, OR PUNITIVE DAMAGES OF ANY
+# CHARACTER INCLUDING, WITHOUT LIMITATION, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES, LOSS OF USE, DATA OR PROFITS,
+# OR BUSINESS INTERRUPTION, HOWEVER CAUSED AND ON ANY THEORY
+# OF CONTRACT, WARRANTY, TORT (INCLUDING NEGLIGENCE), PRODUCT
+# LIABILITY OR OTHERWISE, ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGES.
+#
+#
+# Conformance check of bmath.format() against the original trial
+# formatting bmath.formatTrials() on random numbers, integers and strings
+#
+# usage: python utils/fmtcheck.py [-n count] [-s seed]
+
+import os
+import sys
+import time
+import random
+import getopt
+
+_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [_DIR, os.path.join(_DIR, "lib")]
+
+import bmath
+
+#-------------------------------------------------------------------------------
+# Random number as float, int or string
+#-------------------------------------------------------------------------------
+def randomNumber(rnd):
+	kind = rnd.randint(0,7)
+	if kind == 0:
+		return rnd.uniform(-1000.0, 1000.0)
+	elif kind == 1:
+		return rnd.choice((-1,1)) * 10.0**rnd.uniform(-30.0, 30.0)
+	elif kind == 2:
+		# few significant digits e.g. 0.25, 1200.0
+		return round(rnd.uniform(-100.0,100.0), rnd.randint(0,4)) \
+			* 10.0**rnd.randint(-8,8)
+	elif kind == 3:
+		return rnd.randint(-10**rnd.randint(1,25), 10**rnd.randint(1,25))
+	elif kind == 4:
+		return rnd.choice((0, 0.0, -0.0, 1, 1.0, -1.0, 0.1, 1e-5))
+
+	# string representation
+	sign = rnd.choice(("", "", "-", "+"))
+	befo = "".join([rnd.choice("0123456789") for i in range(rnd.randint(0,25))])
+	afte = "".join([rnd.choice("0123456789") for i in range(rnd.randint(0,25))])
+	if kind == 5:
+		# runs of zeros and nines to exercise the rounding
+		befo = befo.replace("1","0").replace("2","9")
+		afte = afte.replace("1","0").replace("2","9")
+	s = sign + befo
+	if afte or rnd.random()<0.3: s += "." + afte
+	if rnd.random() < 0.4:
+		s += rnd.choice("eEdD") + rnd.choice(("", "-", "+")) \
+			+ str(rnd.randint(0,120))
+	if rnd.random() < 0.02:
+		s = rnd.choice(("abc", "1.2.3", "- 1", " 12 ", "", "$x", "1e", "inf"))
+	return s
+
+#-------------------------------------------------------------------------------
+def call(func, number, length, useExp, useD):
+	try:
+		return func(number, length, useExp, useD)
+	except Exception as e:
+		return "Exception: %s"%(e)
+
+#-------------------------------------------------------------------------------
+def check(count, seed):
+	rnd = random.Random(seed)
+	cases = []
+	for i in range(count):
+		cases.append((randomNumber(rnd), rnd.randint(4,23),
+			rnd.random()<0.2, rnd.random()<0.3))
+
+	start = time.time()
+	for number, length, useExp, useD in cases:
+		call(bmath.formatTrials, number, length, useExp, useD)
+	told = time.time() - start
+
+	start = time.time()
+	for number, length, useExp, useD in cases:
+		call(bmath.format, number, length, useExp, useD)
+	tnew = time.time() - start
+
+	errors = 0
+	for number, length, useExp, useD in cases:
+		old = call(bmath.formatTrials, number, length, useExp, useD)
+		new = call(bmath.format, number, length, useExp, useD)
+		if old != new:
+			errors += 1
+			if errors <= 20:
+				print("ERROR: format(%r, %d, %s, %s) = %r expected %r" \
+					% (number, length, useExp, useD, new, old))
+
+	print("Cases:  %d"%(count))
+	print("Errors: %d"%(errors))
+	print("Time formatTrials: %.3fs  format: %.3fs"%(told, tnew))
+	return errors
+
+#-------------------------------------------------------------------------------
+if __name__ == "__main__":
+	optlist, args = getopt.getopt(sys.argv[1:], "n:s:")
+	count = 1000000
+	seed  = 0
+	for opt, val in optlist:
+		if opt == "-n": count = int(val)
+		if opt == "-s": seed  = int(val)
+	sys.exit(check(count, seed) != 0)
@@ -0,0 +1,100 @@
+# 
+#
+# Copyright and User License
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Copyright 2006-2019 CERN and INFN
+# 
+#
+# Please consult the LICENSE file for the license 
+#
+# DISCLAIMER
+# ~~~~~~~~~~
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT
+# NOT LIMITED TO, IMPLIED WARRANTIES OF MERCHANTABILITY, OF
+# SATISFACTORY QUALITY, AND FITNESS FOR A PARTICULAR PURPOSE
+# OR USE ARE DISCLAIMED. THE COPYRIGHT HOLDERS AND THE
+# AUTHORS MAKE NO REPRESENTATION THAT THE SOFTWARE AND
+# MODIFICATIONS THEREOF, WILL NOT INFRINGE ANY PATENT,
+# COPYRIGHT, TRADE SECRET OR OTHER PROPRIETARY RIGHT.
+#
+# LIMITATION OF LIABILITY
+# ~~~~~~~~~~~~~~~~~~~~~~~
+# THE COPYRIGHT HOLDERS AND THE AUTHORS SHALL HAVE NO
+# LIABILITY FOR DIRECT, INDIRECT, SPECIAL, INCIDENTAL,
+# CONSEQUENTIAL, EXEMPLARY, OR PUNITIVE DAMAGES OF ANY
+# CHARACTER INCLUDING, WITHOUT LIMITATION, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES, LOSS OF USE, DATA OR PROFITS,
+# OR BUSINESS INTERRUPTION, HOWEVER CAUSED AND ON ANY THEORY
+# OF CONTRACT, WARRANTY, TORT (INCLUDING NEGLIGENCE), PRODUCT
+# LIABILITY OR OTHERWISE, ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGES.
+#
+#
+#
+# Regression check of the incremental Input.preprocess(): repeated calls
+# with and without run defines must give the same active cards as a full
+# processing of the input
+#
+# usage: python utils/ppcheck.py [input.inp ...]
+
+import os
+import sys
+
+_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [_DIR, os.path.join(_DIR, "lib")]
+
+import Input
+
+#-------------------------------------------------------------------------------
+# Small input with an #if on its own #define
+#-------------------------------------------------------------------------------
+def sampleInput():
+	inp = Input.Input()
+	for tag, what in (	("#define", ["FOO"]),
+				("#if",     ["FOO"]),
+				("BEAM",    ["", -10.0]),
+				("#else",   [""]),
+				("BEAM",    ["", -20.0]),
+				("#endif",  [""])):
+		inp.addCard(Input.Card(tag, what))
+	return inp
+
+#-------------------------------------------------------------------------------
+def activeCards(inp):
+	return [card.active for card in inp.cardlist]
+
+#-------------------------------------------------------------------------------
+# Preprocess with every define set twice and compare with a full processing
+#-------------------------------------------------------------------------------
+def check(name, inp):
+	names = sorted(set(card.what(0) for card in inp.cardlist
+				if card.tag == "#define"))
+	sequence = [None, None, None]
+	for var in names:
+		sequence.extend([[(var,"")], [(var,"")], None])
+	sequence.append([(var,"") for var in names])
+	sequence.extend([None, None])
+
+	errors = 0
+	for i, defines in enumerate(sequence):
+		inp.preprocess(defines)
+		incremental = activeCards(inp)
+		inp._preprocessed = None
+		inp.preprocess(defines)
+		if incremental != activeCards(inp):
+			errors += 1
+			print("ERROR: %s call %d defines=%s differs from a full preprocess" \
+				% (name, i+1, defines))
+	print("%s: %d calls, %d errors"%(name, len(sequence), errors))
+	return errors
+
+#-------------------------------------------------------------------------------
+if __name__ == "__main__":
+	errors = check("sample", sampleInput())
+	for fn in sys.argv[1:]:
+		inp = Input.Input()
+		inp.read(fn)
+		errors += check(fn, inp)
+	sys.exit(errors != 0)
@@ -0,0 +1,142 @@
+# 
+#
+# Copyright and User License
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Copyright 2006-2019 CERN and INFN
+# 
+#
+# Please consult the LICENSE file for the license 
+#
+# DISCLAIMER
+# ~~~~~~~~~~
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT
+# NOT LIMITED TO, IMPLIED WARRANTIES OF MERCHANTABILITY, OF
+# SATISFACTORY QUALITY, AND FITNESS FOR A PARTICULAR PURPOSE
+# OR USE ARE DISCLAIMED. THE COPYRIGHT HOLDERS AND THE
+# AUTHORS MAKE NO REPRESENTATION THAT THE SOFTWARE AND
+# MODIFICATIONS THEREOF, WILL NOT INFRINGE ANY PATENT,
+# COPYRIGHT, TRADE SECRET OR OTHER PROPRIETARY RIGHT.
+#
+# LIMITATION OF LIABILITY
+# ~~~~~~~~~~~~~~~~~~~~~~~
+# THE COPYRIGHT HOLDERS AND THE AUTHORS SHALL HAVE NO
+# LIABILITY FOR DIRECT, INDIRECT, SPECIAL, INCIDENTAL,
+# CONSEQUENTIAL, EXEMPLARY, OR PUNITIVE DAMAGES OF ANY
+# CHARACTER INCLUDING, WITHOUT LIMITATION, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES, LOSS OF USE, DATA OR PROFITS,
+# OR BUSINESS INTERRUPTION, HOWEVER CAUSED AND ON ANY THEORY
+# OF CONTRACT, WARRANTY, TORT (INCLUDING NEGLIGENCE), PRODUCT
+# LIABILITY OR OTHERWISE, ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGES.
+#
+#
+#
+# Regression check of the _tab.lis written by the native USRBDX merge:
+# the detectors with angular bins must be listed by the Usr2Plot parser
+# and the index it returns must point to the double differential dataset
+#
+# usage: python utils/tabcheck.py
+
+import os
+import re
+import sys
+import shutil
+import struct
+import tempfile
+
+_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [_DIR, os.path.join(_DIR, "lib")]
+
+import numpy
+
+import fortran
+import DataMerge
+import Usr2Plot
+
+# name, number of energy and angular intervals of the detectors
+DETECTORS = (("bdx1", 5, 3), ("bdx2", 4, 1), ("bdx3", 6, 2))
+
+#-------------------------------------------------------------------------------
+# Write a USRBDX cycle file with random data
+#-------------------------------------------------------------------------------
+def writeCycle(filename, weight, rng):
+	f = open(filename, "wb")
+	DataMerge.writeHeader(f, b"tabcheck".ljust(80), b"time".ljust(32),
+			weight, int(weight), 1)
+	for i,(name, ne, na) in enumerate(DETECTORS):
+		fortran.write(f, struct.pack("=i10siiiifiiiffifffif",
+				i+1, name.encode().ljust(10), -1, 1, 1, 2, 1.0,
+				0, 1, 0, 1e-3, 1.0, ne, 0.0, 0.0, 6.28, na, 0.0))
+		fortran.write(f, rng.random(ne*na).astype(numpy.float32).tobytes())
+	f.close()
+
+#-------------------------------------------------------------------------------
+# Listbox replacement collecting the detectors found by Usr2Plot
+#-------------------------------------------------------------------------------
+class _Combo(list):
+	def clear(self):	del self[:]
+	def insert(self, pos, item):	self.append(item)
+	def set(self, item):	pass
+
+class _Frame:
+	def __init__(self):
+		self.det = _Combo()
+
+#-------------------------------------------------------------------------------
+def check():
+	errors = 0
+	tmp = tempfile.mkdtemp()
+	try:
+		rng   = numpy.random.default_rng(1)
+		files = []
+		for k in range(3):
+			fn = os.path.join(tmp, "c%d.bnx"%(k))
+			writeCycle(fn, 100.0*(k+1), rng)
+			files.append(fn)
+		output = os.path.join(tmp, "sum.bnx")
+		if not DataMerge.UsrbdxMerger(files, output).merge():
+			print("Error: merge failed")
+			return 1
+		tab = os.path.join(tmp, "sum_tab.lis")
+
+		frame = _Frame()
+		Usr2Plot.Usr2DPlotFrame.loadDataFile(frame, tab)
+		expected = [name for name, ne, na in DETECTORS if na > 1]
+		found    = [item.split()[1] for item in frame.det]
+		if found != expected:
+			print("Error: detectors %s expected %s"%(found, expected))
+			errors += 1
+
+		# gnuplot datasets are separated by two empty lines
+		datasets = re.split(r"\n\n\n", open(tab).read())
+		for item in frame.det:
+			index = int(item.split()[0])-1	# Usr2DPlotFrame.detector()
+			name  = item.split()[1]
+			if index >= len(datasets) or \
+			   "double differential" not in datasets[index] or \
+			   "Detector n:" not in datasets[index-1] or \
+			   name not in datasets[index-1]:
+				print("Error: index %d of %s is not its double differential" \
+					% (index, name))
+				errors += 1
+				continue
+			na = dict((n,a) for n,e,a in DETECTORS)[name]
+			ne = dict((n,e) for n,e,a in DETECTORS)[name]
+			rows = [line for line in datasets[index].splitlines()
+					if line and not line.startswith(" #")]
+			if len(rows) != ne*na:
+				print("Error: %s has %d rows, expected %d" \
+					% (name, len(rows), ne*na))
+				errors += 1
+	finally:
+		shutil.rmtree(tmp)
+
+	print("%d errors"%(errors))
+	return errors
+
+#-------------------------------------------------------------------------------
+if __name__ == "__main__":
+	errors = check()
+	sys.exit(errors != 0)